@@ -0,0 +1,166 @@
+"""
+Headless HTTP API for the learning pipeline.
+
+Runs are submitted to the shared background job runner (`core.jobs`), so
+requests return at once with a job id that can be polled. Identical
+submissions coalesce onto the job already in flight, and once too many jobs
+are unfinished new submissions get HTTP 429 with a Retry-After header.
+OpenAI calls inside the jobs are still bounded by `core.rate_limit`.
+
+Usage:
+    uvicorn api:app --host 0.0.0.0 --port 8000
+    python api.py
+
+Endpoints:
+    POST /jobs                 Submit a run: {"youtube_url" | "transcript_text", "question_count", ...}
+    GET  /jobs/{job_id}        Status and per-stage progress (?wait=N long-polls up to N seconds)
+    GET  /jobs/{job_id}/result Summary and quiz items of a finished job
+    GET  /jobs/{job_id}/pdf    The quiz PDF of a finished job
+    GET  /health               Liveness and queue depth
+"""
+# Base libraries
+import asyncio
+import os
+import time
+from contextlib import asynccontextmanager
+from typing import Optional
+
+# 3rd party packages
+from fastapi import FastAPI, HTTPException, Query
+from fastapi.responses import FileResponse, JSONResponse
+from pydantic import BaseModel, Field
+
+# Local modules
+from utils.logger import get_logger, setup_logging
+from core.jobs import (
+    get_job, get_job_runner, load_job_artifacts, JobQueueFull, FINISHED_STATES, SUCCEEDED
+)
+from core.setup import create_directories
+from core.sources import normalize_source
+from core.stage_manifest import STAGES
+
+logger = get_logger(__name__)
+
+# Seconds clients are asked to wait after a 429, and between long-poll checks
+RETRY_AFTER_SECONDS = 5
+POLL_INTERVAL = 0.5
+MAX_WAIT_SECONDS = 60
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    setup_logging()
+    create_directories()
+    yield
+
+app = FastAPI(
+    title="Learning Pipeline",
+    description="Generate quizzes, PDFs and Anki decks from videos or text.",
+    lifespan=lifespan,
+)
+
+
+class JobRequest(BaseModel):
+    youtube_url: Optional[str] = None
+    transcript_text: Optional[str] = None
+    question_count: int = Field(20, ge=1, le=500)
+    source_id: Optional[str] = None
+    force: bool = False
+    from_stage: Optional[str] = None
+
+
+def _job_status(job: dict) -> dict:
+    """The public view of a job row."""
+    return {
+        "job_id": job["job_id"],
+        "status": job["status"],
+        "source_id": job["source_id"],
+        "stage": job["stage"],
+        "progress": job["progress"],
+        "error": job["error"],
+        "created_at": job["created_at"],
+        "started_at": job["started_at"],
+        "finished_at": job["finished_at"],
+    }
+
+async def _require_job(job_id: str) -> dict:
+    job = await asyncio.to_thread(get_job, job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Job {job_id} not found")
+    return job
+
+async def _require_succeeded(job_id: str) -> dict:
+    job = await _require_job(job_id)
+    if job["status"] not in FINISHED_STATES:
+        raise HTTPException(status_code=409, detail=f"Job {job_id} is still {job['status']}")
+    if job["status"] != SUCCEEDED:
+        raise HTTPException(status_code=409, detail=f"Job {job_id} {job['status']}: {job['error']}")
+    return job
+
+@app.post("/jobs", status_code=202)
+async def submit_job(request: JobRequest) -> dict:
+    """Queue a pipeline run, or join the identical one already in flight."""
+    if request.from_stage and request.from_stage not in STAGES:
+        raise HTTPException(status_code=422, detail=f"from_stage must be one of {', '.join(STAGES)}")
+    try:
+        source = normalize_source({
+            "youtube_url": request.youtube_url,
+            "transcript_text": request.transcript_text,
+            "source_id": request.source_id,
+            "question_count": request.question_count,
+        })
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+
+    params = {**source, "force": request.force, "from_stage": request.from_stage}
+    runner = get_job_runner()
+    try:
+        job_id = await asyncio.to_thread(runner.submit, **params)
+    except JobQueueFull as e:
+        logger.warning(f"Rejected submission: {e}")
+        return JSONResponse(
+            status_code=429,
+            content={"detail": str(e)},
+            headers={"Retry-After": str(RETRY_AFTER_SECONDS)},
+        )
+    return _job_status(await _require_job(job_id))
+
+@app.get("/jobs/{job_id}")
+async def job_status(job_id: str, wait: float = Query(0, ge=0, le=MAX_WAIT_SECONDS)) -> dict:
+    """Current status of a job; with `wait`, hold the request until it finishes or the wait ends."""
+    job = await _require_job(job_id)
+    deadline = time.monotonic() + wait
+    while job["status"] not in FINISHED_STATES and time.monotonic() < deadline:
+        await asyncio.sleep(POLL_INTERVAL)
+        job = await _require_job(job_id)
+    return _job_status(job)
+
+@app.get("/jobs/{job_id}/result")
+async def job_result(job_id: str) -> dict:
+    """Run summary and quiz items of a finished job."""
+    job = await _require_succeeded(job_id)
+    artifacts = await asyncio.to_thread(load_job_artifacts, job)
+    return {
+        **_job_status(job),
+        "result": job["result"],
+        "quiz_data": artifacts["quiz_data"],
+        "pdf_available": artifacts["pdf_path"] is not None,
+    }
+
+@app.get("/jobs/{job_id}/pdf")
+async def job_pdf(job_id: str) -> FileResponse:
+    """Download the quiz PDF of a finished job."""
+    job = await _require_succeeded(job_id)
+    artifacts = await asyncio.to_thread(load_job_artifacts, job)
+    if artifacts["pdf_path"] is None:
+        raise HTTPException(status_code=404, detail=f"No PDF for job {job_id}")
+    return FileResponse(artifacts["pdf_path"], media_type="application/pdf", filename=f"{job['source_id']}.pdf")
+
+@app.get("/health")
+async def health() -> dict:
+    runner = get_job_runner()
+    return {"status": "ok", "pending_jobs": runner.pending(), "max_pending_jobs": runner.max_pending}
+
+if __name__ == "__main__":
+    import uvicorn
+
+    uvicorn.run(app, host=os.getenv("API_HOST", "127.0.0.1"), port=int(os.getenv("API_PORT", "8000")))
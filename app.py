@@ -85,11 +85,18 @@
 
 
 # app.py
-from pathlib import Path
+import time
 import streamlit as st
-from main import run_app_pipeline
+from main import submit_app_pipeline
+from core.jobs import get_job, list_jobs, load_job_artifacts, FINISHED_STATES, SUCCEEDED
+from core.search_index import search, KINDS
+from core.setup import create_directories
+from utils.logger import setup_logging
 
 st.set_page_config(page_title="🎓 Learning Pipeline", layout="wide")
+# Streamlit re-runs this script on every interaction; only the first calls do anything
+setup_logging()
+create_directories()
 
 st.title("🎓 Learning Pipeline")
 st.write("Automatically generate quizzes and flashcards from videos or text.")
@@ -115,46 +122,93 @@ else:
 # --------------------------------
 # Trigger
 # --------------------------------
+# Runs happen on a background job runner; the job id lives in the URL so a
+# refresh (or another tab) reconnects to the same job
 if st.button("Generate Quiz"):
     if not youtube_url and not transcript_text:
         st.warning("Please provide either a YouTube URL or some text.")
         st.stop()
 
-    with st.spinner("Running pipeline... this may take a moment ⏳"):
-        try:
-            result = run_app_pipeline(
-                input_type="youtube" if youtube_url else "text",
-                youtube_url=youtube_url,
-                transcript_text=transcript_text,
-                question_count=question_count
+    st.query_params["job"] = submit_app_pipeline(
+        input_type="youtube" if youtube_url else "text",
+        youtube_url=youtube_url,
+        transcript_text=transcript_text,
+        question_count=question_count
+    )
+
+# --------------------------------
+# Recent Jobs
+# --------------------------------
+st.sidebar.header("Recent Jobs")
+for recent in list_jobs(limit=10):
+    label = recent["source_id"] or recent["params"].get("youtube_url") or recent["job_id"]
+    st.sidebar.markdown(f"[{label}](?job={recent['job_id']}) · {recent['status']}")
+
+# --------------------------------
+# Job Progress & Results
+# --------------------------------
+job_id = st.query_params.get("job")
+job = get_job(job_id) if job_id else None
+
+if job_id and job is None:
+    st.warning(f"Job `{job_id}` was not found.")
+
+elif job:
+    st.markdown(f"**Job:** `{job['job_id']}` · **Status:** {job['status']}")
+    stages = job["progress"].get("stages", {})
+    if stages:
+        st.write(" → ".join(f"{name}: {info['status']}" for name, info in stages.items()))
+
+    if job["status"] not in FINISHED_STATES:
+        # Questions are shown here as soon as the model finishes writing each one
+        with st.spinner("Running pipeline... this may take a moment ⏳"):
+            for i, question in enumerate(job["progress"].get("questions", []), start=1):
+                st.write(f"**Q{i}:** {question}")
+            time.sleep(1)
+        st.rerun()
+
+    elif job["status"] == SUCCEEDED:
+        artifacts = load_job_artifacts(job)
+        st.success("✅ Quiz generated successfully!")
+
+        # Display summary
+        st.markdown(f"**Source ID:** `{job['source_id']}`")
+        st.markdown(f"**Questions generated:** {len(artifacts['quiz_data'])}")
+
+        # Display sample questions
+        with st.expander("Preview Questions"):
+            for i, q in enumerate(artifacts["quiz_data"], start=1):
+                st.write(f"**Q{i}:** {q['question']}")
+                st.caption(f"Answer: {q['answer']}")
+
+        # Download PDF
+        if artifacts["pdf_path"]:
+            st.download_button(
+                label="📄 Download PDF",
+                data=artifacts["pdf_path"].read_bytes(),
+                file_name=f"{job['source_id']}.pdf",
+                mime="application/pdf"
             )
 
-            st.success("✅ Quiz generated successfully!")
-
-            # Display summary
-            st.markdown(f"**Source ID:** `{result['source_id']}`")
-            st.markdown(f"**Questions generated:** {len(result['quiz_data'])}")
-
-            # Display sample questions
-            with st.expander("Preview Questions"):
-                for i, q in enumerate(result["quiz_data"], start=1):
-                    st.write(f"**Q{i}:** {q['question']}")
-                    st.caption(f"Answer: {q['answer']}")
-
-            # Download PDF
-            pdf_path = Path(f"outputs/pdf/{result['source_id']}.pdf")
-            if pdf_path.exists():
-                with open(pdf_path, "rb") as pdf_file:
-                    st.download_button(
-                        label="📄 Download PDF",
-                        data=pdf_file.read(),
-                        file_name=f"{result['source_id']}.pdf",
-                        mime="application/pdf"
-                    )
-
-        except Exception as e:
-            st.error("❌ An error occurred during generation.")
-            st.exception(e)
+    else:
+        st.error(f"❌ An error occurred during generation: {job['error']}")
+
+# --------------------------------
+# Search Past Runs
+# --------------------------------
+st.divider()
+st.subheader("🔎 Search Your Library")
+search_col, kind_col = st.columns([4, 1])
+search_query = search_col.text_input("Find transcripts, videos and questions by topic:")
+search_kind = kind_col.selectbox("Search in", ["everything", *KINDS])
+
+if search_query:
+    hits = search(search_query, limit=20, kind=None if search_kind == "everything" else search_kind)
+    if not hits:
+        st.info("No matches found.")
+    for hit in hits:
+        st.markdown(f"**{hit['title']}** · `{hit['source_id']}` · {hit['kind']}")
+        st.caption(hit["snippet"])
 
 ## TO DO:
 # When youtube videos are ran, the deck in Anki should be the youtube channels name and the subdeck should be the title of the specific video
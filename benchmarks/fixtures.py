@@ -0,0 +1,68 @@
+"""
+Deterministic fixtures for the offline benchmarks: canned transcripts of
+several sizes and recorded-style OpenAI completions for them.
+
+Everything is generated from a fixed seed, so a fixture is identical across
+runs and machines and results can be compared against a stored baseline.
+"""
+# Base libraries
+import random
+
+# Local modules
+from utils.fake_openai import build_completion
+
+# Transcript sizes in words, keyed by the question counts they are paired with.
+# The larger ones exceed CHUNK_MAX_TOKENS, so the map-reduce path is exercised.
+TRANSCRIPT_WORDS = {
+    5: 1_500,
+    20: 6_000,
+    50: 15_000,
+    500: 60_000,
+}
+
+_VOCABULARY = (
+    "neuron synapse dopamine memory retrieval practice attention focus sleep "
+    "learning recall spacing interleaving testing feedback hippocampus cortex "
+    "plasticity motivation habit protocol exercise light circadian rhythm stress "
+    "cortisol adrenaline nutrition caffeine hydration breathing meditation vision "
+    "behaviour reward prediction error signal consolidation encoding forgetting "
+    "curve repetition context environment performance fatigue recovery study"
+).split()
+_FILLER = "the a of and to in is that it for with as on this we you".split()
+
+
+def make_transcript(words: int, seed: int = 0) -> str:
+    """Build a transcript-like text of roughly `words` words."""
+    rng = random.Random(seed)
+    sentences = []
+    count = 0
+    while count < words:
+        length = rng.randint(8, 20)
+        sentence = [
+            rng.choice(_VOCABULARY) if rng.random() < 0.45 else rng.choice(_FILLER)
+            for _ in range(length)
+        ]
+        sentences.append(" ".join(sentence).capitalize() + ".")
+        count += length
+    return " ".join(sentences)
+
+def transcript_for(question_count: int, seed: int = 0) -> str:
+    """The canned transcript used for a given question count."""
+    return make_transcript(TRANSCRIPT_WORDS.get(question_count, 1_500), seed=seed)
+
+def make_completion(question_count: int, seed: int = 0) -> dict:
+    """A chat completion response for `question_count` questions, as the API returns it."""
+    from core.prompt_manager import build_quiz_prompt
+
+    prompt = build_quiz_prompt(make_transcript(1_500, seed=seed), question_count)
+    return build_completion({
+        "model": "gpt-4o",
+        "messages": [{"role": "user", "content": prompt}],
+    })
+
+def make_quiz(question_count: int, seed: int = 0) -> list[dict]:
+    """The parsed quiz items for `question_count` questions."""
+    from core.parser import parse_quiz_output
+
+    completion = make_completion(question_count, seed=seed)
+    return parse_quiz_output(completion["choices"][0]["message"]["content"])
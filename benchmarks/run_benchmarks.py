@@ -0,0 +1,391 @@
+"""
+Offline benchmarks for the learning pipeline.
+
+Every scenario runs in its own subprocess against a local fake OpenAI
+server (`utils.fake_openai`) and a fake AnkiConnect (`utils.fake_anki_connect`),
+with throwaway data and logs directories, so nothing touches YouTube, OpenAI or Anki
+and peak RSS is measured per scenario.
+
+Usage:
+    python -m benchmarks.run_benchmarks                   # run and print a report
+    python -m benchmarks.run_benchmarks --only pdf anki   # scenarios matching a prefix
+    python -m benchmarks.run_benchmarks --save-baseline   # store results as the baseline
+    python -m benchmarks.run_benchmarks --compare         # exit 1 on a regression
+    python -m benchmarks.run_benchmarks --only startup    # cold-start time of the CLI, worker and API
+"""
+# Base libraries
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Optional
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+
+BASE_DIR = Path(__file__).resolve().parents[1]
+BASELINE_PATH = Path(__file__).resolve().parent / "baseline.json"
+
+QUESTION_COUNTS = (5, 20, 50, 500)
+SOURCE_COUNTS = (1, 10, 100)
+PDF_BATCH_SIZES = (100,)
+DEDUP_INDEX_SIZES = (10_000, 200_000)
+SEARCH_INDEX_SIZES = (20_000,)
+BATCH_QUESTION_COUNT = 5
+
+# Module each entry point imports at startup, for the cold-start scenarios
+STARTUP_MODULES = {
+    "cli": "learning_pipeline",
+    "worker": "core.pipeline",
+    "api": "api",
+}
+
+# Timed iterations per scenario family (after one untimed warm-up)
+ITERATIONS = {
+    "parse": 20,
+    "pdf": 5,
+    "pdfbatch": 1,
+    "dedup": 20,
+    "search": 50,
+    "anki": 5,
+    "pipeline": 3,
+    "batch": 1,
+    "startup": 10,
+}
+
+# Metrics compared against the baseline; larger is worse for all of them
+COMPARED_METRICS = ("p50_seconds", "p90_seconds", "peak_rss_mb")
+
+
+def list_scenarios() -> list[str]:
+    names = []
+    for family in ("parse", "pdf", "anki", "pipeline"):
+        names += [f"{family}_{n}" for n in QUESTION_COUNTS]
+    names += [f"pdfbatch_{n}" for n in PDF_BATCH_SIZES]
+    names += [f"dedup_{n}" for n in DEDUP_INDEX_SIZES]
+    names += [f"search_{n}" for n in SEARCH_INDEX_SIZES]
+    names += [f"batch_{n}" for n in SOURCE_COUNTS]
+    names += [f"startup_{n}" for n in STARTUP_MODULES]
+    return names
+
+def _percentile(samples: list[float], pct: float) -> float:
+    """Nearest-rank percentile."""
+    ordered = sorted(samples)
+    rank = max(1, round(pct / 100 * len(ordered) + 0.5))
+    return ordered[min(rank, len(ordered)) - 1]
+
+def summarize(samples: list[float], items_per_sample: float, wall_seconds: float) -> dict:
+    """Latency percentiles and throughput for a list of per-sample durations."""
+    return {
+        "samples": len(samples),
+        "p50_seconds": round(_percentile(samples, 50), 5),
+        "p90_seconds": round(_percentile(samples, 90), 5),
+        "p99_seconds": round(_percentile(samples, 99), 5),
+        "mean_seconds": round(statistics.fmean(samples), 5),
+        "throughput_per_second": round(items_per_sample * len(samples) / wall_seconds, 3) if wall_seconds else None,
+    }
+
+# ---------------------------------------------------------------------------
+# Child process: run one scenario and print its result as JSON
+# ---------------------------------------------------------------------------
+
+def _start_fakes() -> None:
+    """Start the fake backends and point the project configuration at them."""
+    from utils.fake_openai import start_fake_openai
+    from utils.fake_anki_connect import start_fake_anki_connect
+
+    _, openai_url, _ = start_fake_openai()
+    _, anki_url, _ = start_fake_anki_connect()
+
+    # Must be set before any project module reads config.variable
+    os.environ["OPENAI_BASE_URL"] = openai_url
+    os.environ["OPENAI_API_KEY"] = "sk-benchmark"
+    os.environ["ANKI_CONNECT_URL"] = anki_url
+    os.environ["OPENAI_CACHE_ENABLED"] = "false"
+
+def _timed(fn, iterations: int) -> tuple[list[float], float]:
+    fn(-1)  # warm-up: imports, fonts, connection pools
+    samples = []
+    wall_started = time.perf_counter()
+    for i in range(iterations):
+        started = time.perf_counter()
+        fn(i)
+        samples.append(time.perf_counter() - started)
+    return samples, time.perf_counter() - wall_started
+
+def _cold_import(module: str) -> tuple[float, float]:
+    """
+    Import a module in a fresh interpreter with `-X importtime`.
+
+    Returns:
+        tuple: (wall seconds including interpreter startup, seconds spent
+               importing the module itself as reported by importtime)
+    """
+    started = time.perf_counter()
+    completed = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=BASE_DIR, capture_output=True, text=True, check=True,
+    )
+    wall = time.perf_counter() - started
+    # Lines look like "import time:   self [us] | cumulative | module"
+    for line in reversed(completed.stderr.splitlines()):
+        fields = line.split("|")
+        if len(fields) == 3 and fields[2].strip() == module:
+            return wall, int(fields[1]) / 1_000_000
+    raise RuntimeError(f"No importtime entry for {module}")
+
+def run_scenario(name: str, iterations: Optional[int] = None) -> dict:
+    """Run one scenario in this process (expects a fresh interpreter)."""
+    _start_fakes()
+
+    from benchmarks.fixtures import make_completion, make_quiz, transcript_for
+
+    family, size = name.rsplit("_", 1)
+    size = int(size) if size.isdigit() else size
+    iterations = iterations or ITERATIONS[family]
+
+    if family == "parse":
+        from core.parser import extract_quiz_content
+
+        completion = make_completion(size)
+        samples, wall = _timed(lambda i: extract_quiz_content(completion, f"bench_parse_{size}"), iterations)
+        result = summarize(samples, size, wall)
+
+    elif family == "pdf":
+        from core.pdf_generator import export_pdf
+
+        quiz = make_quiz(size)
+        samples, wall = _timed(lambda i: export_pdf(quiz, f"bench_pdf_{size}"), iterations)
+        result = summarize(samples, size, wall)
+
+    elif family == "pdfbatch":
+        from core.pdf_generator import export_pdfs
+
+        quizzes = {f"bench_pdfbatch_{index}": make_quiz(20, seed=index) for index in range(size)}
+        per_pdf = []
+
+        def run_export(i):
+            results = export_pdfs(quizzes)
+            if any("error" in r for r in results):
+                raise RuntimeError(f"PDF export failed: {[r for r in results if 'error' in r][:3]}")
+            if i >= 0:
+                per_pdf.extend(r["seconds"] for r in results)
+
+        samples, wall = _timed(run_export, iterations)
+        # Latency is per PDF; throughput is PDFs per second of export wall time
+        result = summarize(per_pdf, 1, wall)
+        result["batch_seconds"] = round(statistics.fmean(samples), 5)
+
+    elif family == "dedup":
+        from config.paths import DEDUP_INDEX_DIR
+        from core.dedup_index import QuestionIndex, find_duplicates
+
+        # Index `size` stored questions, then time checking one 20-question quiz
+        index = QuestionIndex(DEDUP_INDEX_DIR)
+        quizzes = [make_quiz(100, seed=seed) for seed in range(size // 100)]
+        index.add_sources([(f"bench_{n}", [d["question"] for d in quiz], None) for n, quiz in enumerate(quizzes)])
+        quiz = make_quiz(20, seed=size)
+        samples, wall = _timed(lambda i: find_duplicates(quiz, "bench_new", index=index), iterations)
+        result = summarize(samples, len(quiz), wall)
+
+    elif family == "search":
+        from config.paths import TRANSCRIPTS_DIR
+        from core.search_index import rebuild, search
+        from benchmarks.fixtures import make_transcript
+
+        # Index `size` short transcripts, each with one distinctive word
+        TRANSCRIPTS_DIR.mkdir(parents=True, exist_ok=True)
+        for index in range(size):
+            text = make_transcript(300, seed=index) + f" marker{index}"
+            (TRANSCRIPTS_DIR / f"bench_{index}.txt").write_text(text, encoding="utf-8")
+        rebuild()
+        queries = [f"marker{index} sleep" for index in range(0, size, max(1, size // 50))]
+        samples, wall = _timed(lambda i: search(queries[i % len(queries)], limit=10), iterations)
+        result = summarize(samples, 1, wall)
+
+    elif family == "anki":
+        from core.anki_generator import create_flashcards_from_transcript
+
+        quiz = make_quiz(size)
+        # A fresh deck per iteration, so every note is really added
+        samples, wall = _timed(
+            lambda i: create_flashcards_from_transcript(quiz, user_deck_name=f"bench_{size}_{i}"),
+            iterations,
+        )
+        result = summarize(samples, size, wall)
+
+    elif family == "pipeline":
+        from core.pipeline import run_learning_pipeline
+
+        transcript = transcript_for(size)
+        samples, wall = _timed(
+            lambda i: run_learning_pipeline(
+                api_key=os.environ["OPENAI_API_KEY"],
+                input_type="text",
+                transcript_text=transcript,
+                question_count=size,
+                source_id=f"bench_pipeline_{size}",
+                use_cache=False,
+                force=True,
+            ),
+            iterations,
+        )
+        result = summarize(samples, size, wall)
+
+    elif family == "batch":
+        from core.batch import run_batch_pipeline
+
+        sources = [
+            {
+                "text": transcript_for(BATCH_QUESTION_COUNT, seed=index),
+                "source_id": f"bench_batch_{index}",
+                "question_count": BATCH_QUESTION_COUNT,
+            }
+            for index in range(size)
+        ]
+        per_source = []
+
+        def run_batch(i):
+            summary = run_batch_pipeline(
+                os.environ["OPENAI_API_KEY"], sources, use_cache=False, force=True
+            )
+            if summary["failures"]:
+                raise RuntimeError(f"Batch had failures: {summary['failures'][:3]}")
+            if i >= 0:
+                per_source.extend(r["elapsed_seconds"] for r in summary["results"])
+
+        samples, wall = _timed(run_batch, iterations)
+        # Latency is per source; throughput is sources per second of batch wall time
+        result = summarize(per_source, 1, wall)
+        result["batch_seconds"] = round(statistics.fmean(samples), 5)
+
+    elif family == "startup":
+        module = STARTUP_MODULES[size]
+        import_seconds = []
+
+        def start(i):
+            _, imported = _cold_import(module)
+            if i >= 0:
+                import_seconds.append(imported)
+
+        # Latency is process start to module imported; RSS is the largest child's
+        samples, wall = _timed(start, iterations)
+        result = summarize(samples, 1, wall)
+        result["import_p50_seconds"] = round(_percentile(import_seconds, 50), 5)
+
+    else:
+        raise ValueError(f"Unknown scenario: {name}")
+
+    from utils.metrics import peak_rss_mb
+
+    result["scenario"] = name
+    result["peak_rss_mb"] = peak_rss_mb(children=family == "startup")
+    return result
+
+# ---------------------------------------------------------------------------
+# Parent process: run scenarios in subprocesses, report and compare
+# ---------------------------------------------------------------------------
+
+def run_in_subprocess(name: str, iterations: Optional[int] = None) -> dict:
+    with tempfile.TemporaryDirectory(prefix=f"bench_{name}_") as data_dir:
+        env = {
+            **os.environ,
+            "LEARNING_PIPELINE_DATA_DIR": data_dir,
+            "LEARNING_PIPELINE_LOGS_DIR": str(Path(data_dir) / "logs"),
+        }
+        command = [sys.executable, "-m", "benchmarks.run_benchmarks", "--child", name]
+        if iterations:
+            command += ["--iterations", str(iterations)]
+
+        completed = subprocess.run(command, cwd=BASE_DIR, env=env, capture_output=True, text=True)
+        if completed.returncode != 0:
+            return {"scenario": name, "error": completed.stderr.strip().splitlines()[-1:] or ["failed"]}
+        return json.loads(completed.stdout.strip().splitlines()[-1])
+
+def compare(results: list[dict], baseline: dict, tolerance: float) -> list[str]:
+    """Return a description of every metric that regressed beyond `tolerance`."""
+    regressions = []
+    for result in results:
+        reference = baseline.get(result["scenario"])
+        if not reference or "error" in result:
+            continue
+        for metric in COMPARED_METRICS:
+            before, after = reference.get(metric), result.get(metric)
+            if before and after and after > before * (1 + tolerance):
+                regressions.append(
+                    f"{result['scenario']}: {metric} {before} -> {after} (+{(after / before - 1) * 100:.0f}%)"
+                )
+    return regressions
+
+def format_report(results: list[dict]) -> str:
+    header = f"{'scenario':<16}{'p50 s':>10}{'p90 s':>10}{'p99 s':>10}{'mean s':>10}{'items/s':>12}{'rss MB':>9}"
+    lines = [header, "-" * len(header)]
+    for r in results:
+        if "error" in r:
+            lines.append(f"{r['scenario']:<16}ERROR: {r['error'][0]}")
+            continue
+        lines.append(
+            f"{r['scenario']:<16}{r['p50_seconds']:>10.4f}{r['p90_seconds']:>10.4f}{r['p99_seconds']:>10.4f}"
+            f"{r['mean_seconds']:>10.4f}{r['throughput_per_second']:>12.1f}{r['peak_rss_mb'] or float('nan'):>9.1f}"
+        )
+    return "\n".join(lines)
+
+def main(argv: Optional[list] = None) -> int:
+    parser = argparse.ArgumentParser(description="Run the offline pipeline benchmarks.")
+    parser.add_argument("--only", nargs="+", metavar="PREFIX", help="Only run scenarios starting with these prefixes")
+    parser.add_argument("--iterations", type=int, help="Override the timed iterations per scenario")
+    parser.add_argument("--baseline", type=Path, default=BASELINE_PATH)
+    parser.add_argument("--save-baseline", action="store_true", help="Write the results as the new baseline")
+    parser.add_argument("--compare", action="store_true", help="Exit 1 if any metric regressed past the tolerance")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="Allowed slowdown as a fraction (default 0.2)")
+    parser.add_argument("--output", type=Path, help="Also write the results as JSON to this path")
+    parser.add_argument("--child", help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.child:
+        # Scenarios log to the temporary logs directory, as a real run would
+        from utils.logger import setup_logging
+        setup_logging()
+        print(json.dumps(run_scenario(args.child, args.iterations)))
+        return 0
+
+    scenarios = [
+        name for name in list_scenarios()
+        if not args.only or any(name.startswith(prefix) for prefix in args.only)
+    ]
+
+    results = []
+    for name in scenarios:
+        print(f"Running {name}...", file=sys.stderr)
+        results.append(run_in_subprocess(name, args.iterations))
+
+    print(format_report(results))
+
+    if args.output:
+        args.output.write_text(json.dumps(results, indent=2), encoding="utf-8")
+
+    failed = [r["scenario"] for r in results if "error" in r]
+
+    if args.save_baseline:
+        baseline = json.loads(args.baseline.read_text(encoding="utf-8")) if args.baseline.exists() else {}
+        baseline.update({r["scenario"]: r for r in results if "error" not in r})
+        args.baseline.write_text(json.dumps(baseline, indent=2, sort_keys=True) + "\n", encoding="utf-8")
+        print(f"Saved baseline to {args.baseline}")
+
+    if args.compare:
+        if not args.baseline.exists():
+            print(f"No baseline at {args.baseline}; run with --save-baseline first")
+            return 1
+        regressions = compare(results, json.loads(args.baseline.read_text(encoding="utf-8")), args.tolerance)
+        if regressions:
+            print("Regressions:\n  " + "\n  ".join(regressions))
+            return 1
+        print(f"No regressions beyond {args.tolerance:.0%}")
+
+    return 1 if failed else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,11 +1,12 @@
 # config/paths.py
+import os
 from pathlib import Path
 
 # Base directory (e.g. your project root)
 BASE_DIR = Path(__file__).resolve().parents[1]
 
 # Core data directories
-DATA_DIR = BASE_DIR / "data"
+DATA_DIR = Path(os.getenv("LEARNING_PIPELINE_DATA_DIR", BASE_DIR / "data"))
 RAW_DIR = DATA_DIR / "raw"
 INTERMEDIATE_DIR = DATA_DIR / "intermediate"
 PROCESSED_DIR = DATA_DIR / "processed"
@@ -15,13 +16,26 @@ TRANSCRIPTS_DIR = RAW_DIR / "transcripts"
 METADATA_DIR = INTERMEDIATE_DIR / "metadata"
 RAW_OPENAI_DIR = RAW_DIR / "openai_responses"
 PROCESSED_OPENAI_DIR = PROCESSED_DIR / "openai_responses"
-LOGS_DIR = BASE_DIR / "logs"
+LOGS_DIR = Path(os.getenv("LEARNING_PIPELINE_LOGS_DIR", BASE_DIR / "logs"))
 PDF_OUTPUTS_DIR =  PROCESSED_DIR/ "pdf_ready"
+CACHE_DIR = DATA_DIR / "cache"
+OPENAI_CACHE_DIR = CACHE_DIR / "openai_responses"
+QUEUE_DIR = DATA_DIR / "queue"
+ANKI_QUEUE_PATH = QUEUE_DIR / "anki_queue.sqlite3"
+JOBS_DB_PATH = QUEUE_DIR / "jobs.sqlite3"
+MANIFESTS_DIR = INTERMEDIATE_DIR / "manifests"
+PDF_FRAGMENTS_DIR = INTERMEDIATE_DIR / "pdf_fragments"
+PACKETS_DIR = PROCESSED_DIR / "packets"
+DEDUP_INDEX_DIR = INTERMEDIATE_DIR / "dedup_index"
+SEARCH_INDEX_PATH = INTERMEDIATE_DIR / "search_index.sqlite3"
+OPENAI_BATCHES_DIR = INTERMEDIATE_DIR / "openai_batches"
 
-# Create all directories at import time (optional safety)
-for directory in [
+# Data directories, created once per process by `core.setup.create_directories`
+# (importing this module has no side effects)
+DATA_DIRECTORIES = (
     DATA_DIR, RAW_DIR, INTERMEDIATE_DIR, PROCESSED_DIR,
-    TRANSCRIPTS_DIR, METADATA_DIR, RAW_OPENAI_DIR,
-    LOGS_DIR, PDF_OUTPUTS_DIR
-]:
-    directory.mkdir(parents=True, exist_ok=True)
\ No newline at end of file
+    TRANSCRIPTS_DIR, METADATA_DIR, RAW_OPENAI_DIR, PROCESSED_OPENAI_DIR,
+    LOGS_DIR, PDF_OUTPUTS_DIR, CACHE_DIR, OPENAI_CACHE_DIR,
+    QUEUE_DIR, MANIFESTS_DIR, PDF_FRAGMENTS_DIR, PACKETS_DIR,
+    DEDUP_INDEX_DIR, OPENAI_BATCHES_DIR
+)
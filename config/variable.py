@@ -4,7 +4,122 @@ from dotenv import load_dotenv
 load_dotenv()
 
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
-ANKI_CONNECT_URL = "http://host.docker.internal:8765"
+ANKI_CONNECT_URL = os.getenv("ANKI_CONNECT_URL", "http://host.docker.internal:8765")
+ANKI_CONNECT_TIMEOUT = float(os.getenv("ANKI_CONNECT_TIMEOUT", "10"))
+ANKI_BATCH_SIZE = int(os.getenv("ANKI_BATCH_SIZE", "100"))
+# After AnkiConnect is found unreachable, queue notes without retrying for this long
+ANKI_UNREACHABLE_COOLDOWN = float(os.getenv("ANKI_UNREACHABLE_COOLDOWN", "30"))
+ANKI_DRAIN_INTERVAL = float(os.getenv("ANKI_DRAIN_INTERVAL", "15"))
+ANKI_DRAIN_MAX_BACKOFF = float(os.getenv("ANKI_DRAIN_MAX_BACKOFF", "600"))
+# Delivery attempts before a queued note is moved to the dead-letter state
+ANKI_MAX_ATTEMPTS = int(os.getenv("ANKI_MAX_ATTEMPTS", "5"))
+
+# Batch ingestion
+BATCH_MAX_WORKERS = int(os.getenv("BATCH_MAX_WORKERS", "4"))
+
+# Transcripts of expanded playlists/channels fetched ahead of the pipeline workers
+TRANSCRIPT_PREFETCH_WORKERS = int(os.getenv("TRANSCRIPT_PREFETCH_WORKERS", "4"))
+TRANSCRIPT_MAX_RETRIES = int(os.getenv("TRANSCRIPT_MAX_RETRIES", "3"))
+TRANSCRIPT_BACKOFF_BASE = float(os.getenv("TRANSCRIPT_BACKOFF_BASE", "2.0"))
+# Stored transcripts (core.transcript_store): zlib-compress the text in blocks of this many bytes
+TRANSCRIPT_COMPRESS = os.getenv("TRANSCRIPT_COMPRESS", "false").lower() in ("1", "true", "yes")
+TRANSCRIPT_BLOCK_SIZE = int(os.getenv("TRANSCRIPT_BLOCK_SIZE", str(64 * 1024)))
+# Clean transcripts before they go into quiz prompts (see core.transcript_cleaner), and
+# trim them to this many tokens by keeping the most informative sentences (0 for no budget)
+TRANSCRIPT_PREPROCESS = os.getenv("TRANSCRIPT_PREPROCESS", "true").lower() in ("1", "true", "yes")
+TRANSCRIPT_TOKEN_BUDGET = int(os.getenv("TRANSCRIPT_TOKEN_BUDGET", "0"))
+
+# Per-backend limits shared by every worker in the process
+BACKEND_RATE_LIMITS = {
+    "youtube": {"max_concurrent": 4, "min_interval": 0.25},
+    "openai": {"max_concurrent": 8, "min_interval": 0.0},
+    "anki": {"max_concurrent": 1, "min_interval": 0.0},
+}
+
+# OpenAI response cache
+OPENAI_CACHE_ENABLED = os.getenv("OPENAI_CACHE_ENABLED", "true").lower() in ("1", "true", "yes")
+OPENAI_CACHE_MAX_ENTRIES = int(os.getenv("OPENAI_CACHE_MAX_ENTRIES", "1000"))
+OPENAI_CACHE_MAX_BYTES = int(os.getenv("OPENAI_CACHE_MAX_BYTES", str(200 * 1024 * 1024)))
+OPENAI_CACHE_MAX_AGE_DAYS = float(os.getenv("OPENAI_CACHE_MAX_AGE_DAYS", "30"))
+# Seconds between full scans of the cache directory while it is within its limits
+OPENAI_CACHE_EVICT_INTERVAL = float(os.getenv("OPENAI_CACHE_EVICT_INTERVAL", "300"))
+
+# OpenAI HTTP connection pool and retry backoff
+OPENAI_MAX_CONNECTIONS = int(os.getenv("OPENAI_MAX_CONNECTIONS", "20"))
+OPENAI_MAX_KEEPALIVE_CONNECTIONS = int(os.getenv("OPENAI_MAX_KEEPALIVE_CONNECTIONS", "10"))
+OPENAI_KEEPALIVE_EXPIRY = float(os.getenv("OPENAI_KEEPALIVE_EXPIRY", "60"))
+OPENAI_TIMEOUT = float(os.getenv("OPENAI_TIMEOUT", "120"))
+OPENAI_BACKOFF_BASE = float(os.getenv("OPENAI_BACKOFF_BASE", "1.0"))
+OPENAI_BACKOFF_MAX = float(os.getenv("OPENAI_BACKOFF_MAX", "30"))
+
+# Transcript chunking for long inputs (map-reduce question generation)
+CHUNK_MAX_TOKENS = int(os.getenv("CHUNK_MAX_TOKENS", "6000"))
+CHUNK_OVERLAP_TOKENS = int(os.getenv("CHUNK_OVERLAP_TOKENS", "200"))
+CHUNK_MAX_WORKERS = int(os.getenv("CHUNK_MAX_WORKERS", "4"))
+# Ask each chunk for this many times its share, to leave room for deduplication
+CHUNK_OVERSAMPLE = float(os.getenv("CHUNK_OVERSAMPLE", "1.5"))
+
+# Pipeline runs executed concurrently by the background job runner (core.jobs)
+JOBS_MAX_WORKERS = int(os.getenv("JOBS_MAX_WORKERS", "2"))
+# Unfinished jobs accepted before new submissions are turned away (HTTP 429 in api.py)
+JOBS_MAX_PENDING = int(os.getenv("JOBS_MAX_PENDING", "32"))
+# Runners refresh their unfinished jobs this often; jobs not refreshed for
+# JOBS_LEASE_TIMEOUT seconds belong to a runner that exited
+JOBS_HEARTBEAT_INTERVAL = float(os.getenv("JOBS_HEARTBEAT_INTERVAL", "30"))
+JOBS_LEASE_TIMEOUT = float(os.getenv("JOBS_LEASE_TIMEOUT", "120"))
+
+# Worker processes for multi-quiz PDF export
+PDF_MAX_WORKERS = int(os.getenv("PDF_MAX_WORKERS", str(os.cpu_count() or 2)))
+
+# Cross-run question deduplication (see core.dedup_index)
+# 'flag' marks near-duplicates (Anki skips them), 'filter' drops them, 'off' disables the check
+DEDUP_MODE = os.getenv("DEDUP_MODE", "flag").lower()
+DEDUP_THRESHOLD = float(os.getenv("DEDUP_THRESHOLD", "0.9"))
+DEDUP_DIM = int(os.getenv("DEDUP_DIM", "256"))
+
+# YouTube metadata: only these fields are kept from yt-dlp's info dict
+METADATA_FIELDS = (
+    "id", "title", "channel", "channel_id", "uploader",
+    "duration", "upload_date", "webpage_url",
+)
+# Skip the requests yt-dlp only needs for downloading formats
+METADATA_EXTRACTOR_ARGS = {
+    "youtube": {
+        "skip": ["dash", "hls", "translated_subs"],
+        "player_skip": ["js"],
+    }
+}
+METADATA_MEMORY_CACHE_SIZE = int(os.getenv("METADATA_MEMORY_CACHE_SIZE", "1024"))
+
+# USD per million tokens, used to estimate the cost of each run
+OPENAI_PRICING = {
+    "gpt-4o": {"input": 2.50, "output": 10.00},
+    "gpt-4o-mini": {"input": 0.15, "output": 0.60},
+}
+
+# Logging (see utils.logger): records are written by a background thread to
+# logs/pipeline.log, rotated by size. LOG_FORMAT is 'json' or 'text';
+# LOG_SAMPLE_RATE is the fraction of per-item debug lines kept.
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+LOG_FORMAT = os.getenv("LOG_FORMAT", "json").lower()
+LOG_MAX_BYTES = int(os.getenv("LOG_MAX_BYTES", str(20 * 1024 * 1024)))
+LOG_BACKUP_COUNT = int(os.getenv("LOG_BACKUP_COUNT", "5"))
+LOG_SAMPLE_RATE = float(os.getenv("LOG_SAMPLE_RATE", "0.1"))
+
+# OpenAI Batch API (see core.openai_batch), for bulk quiz generation
+OPENAI_BATCH_COMPLETION_WINDOW = os.getenv("OPENAI_BATCH_COMPLETION_WINDOW", "24h")
+OPENAI_BATCH_POLL_INTERVAL = float(os.getenv("OPENAI_BATCH_POLL_INTERVAL", "30"))
+# Give up waiting on a batch after this many seconds (it keeps running server-side)
+OPENAI_BATCH_TIMEOUT = float(os.getenv("OPENAI_BATCH_TIMEOUT", str(25 * 3600)))
+# Requests per submitted batch file (the API allows up to 50,000)
+OPENAI_BATCH_MAX_REQUESTS = int(os.getenv("OPENAI_BATCH_MAX_REQUESTS", "50000"))
+# Batch requests are billed at a discount to the list prices in OPENAI_PRICING
+OPENAI_BATCH_PRICE_FACTOR = float(os.getenv("OPENAI_BATCH_PRICE_FACTOR", "0.5"))
+
+# Quiz output (see core.parser): ask for JSON-schema structured output, and
+# re-request only the missing or malformed items this many times
+QUIZ_STRUCTURED_OUTPUT = os.getenv("QUIZ_STRUCTURED_OUTPUT", "true").lower() in ("1", "true", "yes")
+QUIZ_REPAIR_ATTEMPTS = int(os.getenv("QUIZ_REPAIR_ATTEMPTS", "2"))
 
 ## TODO:
-# Configure the AnkiConnect URL so it'll run successfully locally or in a docker container
\ No newline at end of file
+# Configure the AnkiConnect URL so it'll run successfully locally or in a docker container
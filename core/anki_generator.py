@@ -1,34 +1,124 @@
+import queue
+import threading
+import time
 from typing import Optional
 
 import requests
+from requests.adapters import HTTPAdapter
 
-from utils.logger import get_logger
-from config.variable import ANKI_CONNECT_URL
+from utils.logger import get_logger, sampled
+from config.variable import (
+    ANKI_CONNECT_URL,
+    ANKI_CONNECT_TIMEOUT,
+    ANKI_BATCH_SIZE,
+    ANKI_UNREACHABLE_COOLDOWN
+)
+from core.rate_limit import backend_slot
 
 logger = get_logger(__name__)
 
-def create_anki_deck(deck_name: str):
-    logger.info(f"Creating anki deck named: {deck_name}...")
+ANKI_CONNECT_VERSION = 6
 
+class AnkiConnectError(RuntimeError):
+    """Raised when AnkiConnect answers a request with an error."""
+
+_session: Optional[requests.Session] = None
+_session_lock = threading.Lock()
+
+# Decks known to exist per AnkiConnect URL, so each one is only created once per process
+_known_decks: dict[str, set] = {}
+_decks_lock = threading.Lock()
+
+# Monotonic time until which AnkiConnect is assumed down and not retried
+_unreachable_until = 0.0
+
+def _get_session() -> requests.Session:
+    """Return the process-wide pooled HTTP session for AnkiConnect."""
+    global _session
+    with _session_lock:
+        if _session is None:
+            _session = requests.Session()
+            _session.mount("http://", HTTPAdapter(pool_connections=1, pool_maxsize=4))
+        return _session
+
+def _warn_unreachable(action: str) -> None:
+    logger.warning(f"Error calling AnkiConnect action: {action}")
+    logger.warning(f"Could not reach AnkiConnect at {ANKI_CONNECT_URL}.")
+    logger.warning("Please open Anki Desktop and ensure the AnkiConnect plugin is installed and enabled")
+
+def invoke(action: str, url: str = ANKI_CONNECT_URL, **params):
+    """
+    Call an AnkiConnect action over the pooled session and return its result.
+
+    Raises:
+        requests.RequestException: If AnkiConnect cannot be reached.
+        AnkiConnectError: If AnkiConnect reports an error for the action.
+    """
+    response = _get_session().post(url, json={
+        "action": action,
+        "version": ANKI_CONNECT_VERSION,
+        "params": params
+    }, timeout=ANKI_CONNECT_TIMEOUT)
+    response.raise_for_status()
+    payload = response.json()
+
+    if not isinstance(payload, dict) or set(payload) != {"result", "error"}:
+        raise AnkiConnectError(f"Unexpected AnkiConnect response for {action}: {payload!r}")
+    if payload["error"] is not None:
+        raise AnkiConnectError(f"AnkiConnect {action} failed: {payload['error']}")
+    return payload["result"]
+
+def mark_reachable() -> None:
+    """Clear the unreachable cooldown, e.g. after a successful health check."""
+    global _unreachable_until
+    _unreachable_until = 0.0
+
+def reset_deck_cache() -> None:
+    """Forget which decks exist, e.g. after pointing at a different Anki profile."""
+    with _decks_lock:
+        _known_decks.clear()
+
+def _deck_is_known(deck_name: str, url: str) -> bool:
+    """Check the deck cache, loading the deck list of `url` from Anki on first use."""
+    with _decks_lock:
+        if url not in _known_decks:
+            _known_decks[url] = set(invoke("deckNames", url=url))
+        return deck_name in _known_decks[url]
+
+def _remember_decks(deck_names, url: str) -> None:
+    with _decks_lock:
+        _known_decks.setdefault(url, set()).update(deck_names)
+
+def create_anki_deck(deck_name: str, url: str = ANKI_CONNECT_URL) -> bool:
+    """
+    Make sure a deck exists, creating it only if it isn't already known.
+
+    Returns:
+        bool: True if the deck exists (or was created), False if AnkiConnect
+              could not be reached or refused.
+    """
     try:
-        requests.post(ANKI_CONNECT_URL, json={
-            "action": "createDeck",
-            "version": 6,
-            "params": {"deck": deck_name}
-        })
+        if _deck_is_known(deck_name, url):
+            return True
+        logger.info(f"Creating anki deck named: {deck_name}...")
+        invoke("createDeck", url=url, deck=deck_name)
+        _remember_decks([deck_name], url)
         logger.info(f"Created anki deck named: {deck_name}")
-    except Exception as e:
-        logger.warning(f"Error creating deck_name: {deck_name}")
-        logger.warning("Could not reach AnkiConnect on port 8765.")
-        logger.warning("Please open Anki Desktop and ensure the AnkiConnect plugin is installed and enabled")
+        return True
+    except requests.RequestException:
+        _warn_unreachable("createDeck")
+    except AnkiConnectError as e:
+        logger.warning(f"Error creating deck_name: {deck_name}: {e}")
+    return False
 
-def generate_anki_cards(
-        deck_name: str, 
-        question: str, 
-        answer_exp: str, 
-        tags: list
-    ) -> None:
-    note = {
+def build_note(
+        deck_name: str,
+        question: str,
+        answer_exp: str,
+        tags: Optional[list] = None
+    ) -> dict:
+    """Build an AnkiConnect 'Basic' note for one question."""
+    return {
         "deckName": deck_name,
         "modelName": "Basic",
         "fields": {
@@ -38,47 +128,283 @@ def generate_anki_cards(
         "options": {
             "allowDuplicate": False
         },
-        "tags": tags
+        "tags": tags or []
     }
 
-    try:
-        requests.post(ANKI_CONNECT_URL, json={
-            "action": "addNote",
-            "version": 6,
-            "params": {"note": note}
-            })
-    except Exception as e:
-        logger.warning("Error generating anki cards")
-        logger.warning("Could not reach AnkiConnect on port 8765.")
-        logger.warning("Please open Anki Desktop and ensure the AnkiConnect plugin is installed and enabled")
-    
+def add_notes(
+        notes: list[dict],
+        url: str = ANKI_CONNECT_URL,
+        batch_size: int = ANKI_BATCH_SIZE
+    ) -> list[dict]:
+    """
+    Add notes in bulk and report the outcome of each one.
+
+    Each batch costs two round trips: one `multi` call that creates any
+    unknown decks and runs the `canAddNotesWithErrorDetail` pre-check, then
+    `addNotes` for the notes that passed. Only notes Anki already has (or
+    that repeat an earlier note of the batch) are reported as duplicates;
+    notes rejected for any other reason (e.g. an empty field) fail.
+
+    Args:
+        notes (list[dict]): Notes as built by `build_note`.
+        url (str): AnkiConnect endpoint.
+        batch_size (int): Notes sent per request.
+
+    Returns:
+        list[dict]: One entry per input note, in order, with 'status'
+                    ('added', 'duplicate', 'failed' or 'unreachable'),
+                    'note_id' and 'error'.
+    """
+    global _unreachable_until
+    results = []
+    for start in range(0, len(notes), batch_size):
+        batch = notes[start:start + batch_size]
+        if time.monotonic() < _unreachable_until:
+            # Don't pay a connection timeout per batch while Anki is known to be down
+            results.extend(
+                {"status": "unreachable", "note_id": None, "error": "AnkiConnect recently unreachable"}
+                for _ in batch
+            )
+            continue
+        try:
+            batch_results = _add_note_batch(batch, url)
+            _unreachable_until = 0.0
+            for note, result in zip(batch, batch_results):
+                if sampled(logger):
+                    logger.debug(f"Anki note {result['status']} in {note['deckName']}: {note['fields']['Front'][:80]}")
+            results.extend(batch_results)
+        except requests.RequestException as e:
+            _warn_unreachable("addNotes")
+            _unreachable_until = time.monotonic() + ANKI_UNREACHABLE_COOLDOWN
+            results.extend(
+                {"status": "unreachable", "note_id": None, "error": str(e)} for _ in batch
+            )
+        except AnkiConnectError as e:
+            logger.warning(str(e))
+            results.extend(
+                {"status": "failed", "note_id": None, "error": str(e)} for _ in batch
+            )
+    return results
+
+def _unwrap_multi(actions: list[dict], outcomes: list) -> list:
+    """Unwrap `multi` results, which come back as {'result': ..., 'error': ...}."""
+    results = []
+    for action, outcome in zip(actions, outcomes):
+        if isinstance(outcome, dict) and set(outcome) == {"result", "error"}:
+            if outcome["error"] is not None:
+                raise AnkiConnectError(f"AnkiConnect {action['action']} failed: {outcome['error']}")
+            outcome = outcome["result"]
+        results.append(outcome)
+    return results
+
+def _add_note_batch(batch: list[dict], url: str) -> list[dict]:
+    results = [None] * len(batch)
+
+    # Decks must exist before the pre-check, so unknown ones ride in the same request
+    actions = [
+        {"action": "createDeck", "params": {"deck": deck_name}}
+        for deck_name in sorted({note["deckName"] for note in batch})
+        if not _deck_is_known(deck_name, url)
+    ]
+    actions.append({"action": "canAddNotesWithErrorDetail", "params": {"notes": batch}})
+    outcomes = _unwrap_multi(actions, invoke("multi", url=url, actions=actions))
+    _remember_decks([a["params"]["deck"] for a in actions if a["action"] == "createDeck"], url)
+
+    pending = []
+    seen = set()
+    for i, check in enumerate(outcomes[-1]):
+        # The pre-check compares each note with Anki only, not with the rest of the batch
+        key = (batch[i]["deckName"], batch[i]["fields"]["Front"])
+        if not check.get("canAdd"):
+            error = check.get("error") or "cannot add note"
+            status = "duplicate" if "duplicate" in error else "failed"
+            results[i] = {"status": status, "note_id": None, "error": error}
+        elif key in seen:
+            results[i] = {"status": "duplicate", "note_id": None, "error": "repeats an earlier note in the batch"}
+        else:
+            pending.append(i)
+            seen.add(key)
+
+    if pending:
+        note_ids = invoke("addNotes", url=url, notes=[batch[i] for i in pending])
+        for i, note_id in zip(pending, note_ids or []):
+            if note_id is None:
+                results[i] = {"status": "failed", "note_id": None, "error": "addNotes returned null"}
+            else:
+                results[i] = {"status": "added", "note_id": note_id, "error": None}
+
+    for i, result in enumerate(results):
+        if result is None:
+            results[i] = {"status": "failed", "note_id": None, "error": "no result from addNotes"}
+    return results
+
+def deliver_notes(notes: list[dict], source_id: Optional[str] = None) -> list[dict]:
+    """
+    Add notes, persisting any that AnkiConnect couldn't receive to the
+    offline queue (see `core.anki_queue`) and starting its drainer.
+    """
+    results = add_notes(notes)
+    undelivered = [note for note, r in zip(notes, results) if r["status"] == "unreachable"]
+    if undelivered:
+        # Imported here because the queue module delivers through add_notes
+        from core.anki_queue import enqueue_notes, start_background_drainer
+        enqueue_notes(undelivered, source_id=source_id)
+        start_background_drainer()
+        for r in results:
+            if r["status"] == "unreachable":
+                r["status"] = "queued"
+    return results
+
+def summarize_results(deck_name: str, results: list[dict]) -> dict:
+    """
+    Collapse per-note results into counts plus the failures, whose
+    'index' is their position in `results` (quiz order).
+    """
+    summary = {"deck_name": deck_name, "added": 0, "duplicate": 0, "failed": 0, "unreachable": 0, "queued": 0}
+    for result in results:
+        summary[result["status"]] += 1
+    summary["errors"] = [
+        {"index": i, **r} for i, r in enumerate(results) if r["status"] in ("failed", "unreachable")
+    ]
+    return summary
+
+def generate_anki_cards(
+        deck_name: str,
+        question: str,
+        answer_exp: str,
+        tags: list
+    ) -> dict:
+    """Add a single card. Prefer `add_notes` for more than one."""
+    return add_notes([build_note(deck_name, question, answer_exp, tags)])[0]
+
+def resolve_deck_name(
+        user_deck_name: Optional[str] = None,
+        video_title: Optional[str] = None,
+        channel_name: Optional[str] = None
+    ) -> str:
+    """Use 'channel::title' for YouTube sources, otherwise the user's deck name."""
+    if video_title and channel_name:
+        return f"{channel_name}::{video_title}"
+    return user_deck_name
+
+def format_answer(content: dict) -> str:
+    """Build the back of a card from a quiz item."""
+    return content['answer'] + " Explanation: " + content['explanation']
+
+def _deliver_quiz(deck_name: str, quiz: list[dict], source_id: Optional[str] = None) -> list[dict]:
+    """
+    Deliver quiz items as notes, skipping those the dedup index flagged as
+    already asked (see `core.dedup_index`). Results are in quiz order, so
+    their positions match the items'.
+    """
+    notes = [
+        build_note(deck_name, content['question'], format_answer(content))
+        for content in quiz
+        if not content.get('duplicate_of')
+    ]
+    delivered = iter(deliver_notes(notes, source_id=source_id) if notes else [])
+    return [
+        {"status": "duplicate", "duplicate_of": content['duplicate_of']}
+        if content.get('duplicate_of') else next(delivered)
+        for content in quiz
+    ]
+
 def create_flashcards_from_transcript(
         clean_quiz: list,
-        user_deck_name: Optional[str] = None, 
+        user_deck_name: Optional[str] = None,
         video_title: Optional[str] = None,
-        channel_name: Optional[str] = None
-    ) -> None:
+        channel_name: Optional[str] = None,
+        source_id: Optional[str] = None
+    ) -> dict:
+    """
+    Push a quiz to Anki in bulk. Notes that can't be delivered because
+    AnkiConnect is down are queued and delivered later.
+
+    Returns:
+        dict: Counts of added/duplicate/failed/queued notes and the
+              per-note errors (see `summarize_results`).
+    """
     logger.info("Creating Anki Flashcards...")
-    
-    if video_title and channel_name:
-        deck_name = f"{channel_name}::{video_title}"         
-        # Create the new deck name
-        create_anki_deck(deck_name)
-    else:
-        deck_name = user_deck_name.copy()
-        create_anki_deck(deck_name)
+
+    # Create the new deck name
+    deck_name = resolve_deck_name(user_deck_name, video_title, channel_name)
 
     logger.info("Generating Anki Flashcards...")
-    # Add all the cards to the deck
-    for content in clean_quiz:
-        question = content['question']
-        answer_exp = content['answer'] + " Explanation: " + content['explanation']
-        tags = []
-
-        generate_anki_cards(
-            deck_name=deck_name,
-            question=question,
-            answer_exp=answer_exp,
-            tags=tags
-            )
-    logger.info("Finished generating Anki Flashcards")
\ No newline at end of file
+    results = _deliver_quiz(deck_name, clean_quiz, source_id=source_id)
+    summary = summarize_results(deck_name, results)
+    logger.info(
+        f"Finished generating Anki Flashcards: {summary['added']} added, "
+        f"{summary['duplicate']} duplicate, {summary['failed']} failed, "
+        f"{summary['queued']} queued"
+    )
+    return summary
+
+class FlashcardStream:
+    """
+    Pushes quiz items to Anki from a background thread as they arrive, so
+    cards are created while the rest of the quiz is still being generated.
+    Items that arrive while a request is in flight are sent together.
+
+    Call `add` for each item and `close` once the quiz is complete; `close`
+    waits until every queued card has been sent. If the quiz fails instead,
+    `cancel` drops the cards not yet sent.
+    """
+
+    _DONE = object()
+
+    def __init__(self, deck_name: str, source_id: Optional[str] = None):
+        self.deck_name = deck_name
+        self.source_id = source_id
+        self.results: list[dict] = []
+        self._queue: "queue.Queue" = queue.Queue()
+        self._thread = threading.Thread(target=self._run, name="anki-stream", daemon=True)
+        self._thread.start()
+
+    def _run(self) -> None:
+        done = False
+        with backend_slot("anki"):
+            while not done:
+                batch = [self._queue.get()]
+                while True:
+                    try:
+                        batch.append(self._queue.get_nowait())
+                    except queue.Empty:
+                        break
+                if self._DONE in batch:
+                    done = True
+                    batch = [item for item in batch if item is not self._DONE]
+                if batch:
+                    self.results.extend(_deliver_quiz(self.deck_name, batch, source_id=self.source_id))
+
+    def add(self, content: dict) -> None:
+        self._queue.put(content)
+
+    def close(self) -> dict:
+        """Wait for queued cards to be sent and return the summary."""
+        self._queue.put(self._DONE)
+        self._thread.join()
+        summary = summarize_results(self.deck_name, self.results)
+        logger.info(f"Finished streaming {summary['added']} Anki Flashcards to {self.deck_name}")
+        return summary
+
+    def cancel(self) -> int:
+        """
+        Drop the queued cards and stop. Cards already sent to Anki stay.
+
+        Returns:
+            int: Number of cards dropped.
+        """
+        dropped = 0
+        while True:
+            try:
+                item = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            dropped += item is not self._DONE
+        self._queue.put(self._DONE)
+        self._thread.join()
+        logger.warning(
+            f"Cancelled Anki streaming to {self.deck_name}: {dropped} queued cards dropped, "
+            f"{len(self.results)} already sent"
+        )
+        return dropped
@@ -0,0 +1,319 @@
+# Base libraries
+import argparse
+import hashlib
+import json
+import sqlite3
+import sys
+import threading
+import time
+from contextlib import closing
+from pathlib import Path
+from typing import Optional
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+
+# 3rd party packages
+import requests
+
+# Local modules
+from utils.logger import get_logger, setup_logging
+from config.paths import ANKI_QUEUE_PATH
+from config.variable import (
+    ANKI_CONNECT_URL,
+    ANKI_BATCH_SIZE,
+    ANKI_DRAIN_INTERVAL,
+    ANKI_DRAIN_MAX_BACKOFF,
+    ANKI_MAX_ATTEMPTS
+)
+from core.anki_generator import add_notes, invoke, mark_reachable, AnkiConnectError
+
+logger = get_logger(__name__)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS anki_notes (
+    note_key     TEXT PRIMARY KEY,
+    note_json    TEXT NOT NULL,
+    source_id    TEXT,
+    enqueued_at  REAL NOT NULL,
+    attempts     INTEGER NOT NULL DEFAULT 0,
+    last_error   TEXT,
+    delivered_at REAL,
+    retry_at     REAL,
+    dead_at      REAL
+);
+CREATE INDEX IF NOT EXISTS idx_anki_notes_pending
+    ON anki_notes (delivered_at, enqueued_at);
+"""
+
+_db_lock = threading.Lock()
+_drainer: Optional["QueueDrainer"] = None
+_drainer_lock = threading.Lock()
+
+def _connect(db_path: Path = ANKI_QUEUE_PATH) -> sqlite3.Connection:
+    db_path = Path(db_path)
+    db_path.parent.mkdir(parents=True, exist_ok=True)
+    conn = sqlite3.connect(db_path, timeout=30)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.executescript(_SCHEMA)
+    # Queues created before failed notes were retried with backoff
+    columns = {row[1] for row in conn.execute("PRAGMA table_info(anki_notes)")}
+    for column in ("retry_at", "dead_at"):
+        if column not in columns:
+            conn.execute(f"ALTER TABLE anki_notes ADD COLUMN {column} REAL")
+    return conn
+
+def note_key(note: dict) -> str:
+    """Identify a note by deck and card content, so re-queueing it is a no-op."""
+    payload = json.dumps(
+        [note["deckName"], note["modelName"], note["fields"]],
+        sort_keys=True,
+        ensure_ascii=False,
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+def enqueue_notes(
+        notes: list[dict],
+        source_id: Optional[str] = None,
+        db_path: Path = ANKI_QUEUE_PATH
+    ) -> int:
+    """
+    Persist undeliverable notes for later delivery.
+
+    Notes still pending are left as they are. Notes queued before and since
+    delivered or dead-lettered are reset to pending: being asked to deliver
+    them again means Anki no longer has them (e.g. the deck was deleted).
+
+    Returns:
+        int: Number of notes newly queued or reset to pending.
+    """
+    if not notes:
+        return 0
+
+    now = time.time()
+    rows = [(note_key(note), json.dumps(note), source_id, now) for note in notes]
+    with _db_lock, closing(_connect(db_path)) as conn, conn:
+        before = conn.total_changes
+        conn.executemany(
+            "INSERT INTO anki_notes (note_key, note_json, source_id, enqueued_at) VALUES (?, ?, ?, ?) "
+            "ON CONFLICT (note_key) DO UPDATE SET "
+            "note_json = excluded.note_json, source_id = excluded.source_id, enqueued_at = excluded.enqueued_at, "
+            "attempts = 0, last_error = NULL, delivered_at = NULL, retry_at = NULL, dead_at = NULL "
+            "WHERE anki_notes.delivered_at IS NOT NULL OR anki_notes.dead_at IS NOT NULL",
+            rows,
+        )
+        added = conn.total_changes - before
+
+    logger.info(f"Queued {added} Anki notes for later delivery ({len(notes) - added} already pending)")
+    return added
+
+def pending_count(db_path: Path = ANKI_QUEUE_PATH) -> int:
+    """Number of queued notes not yet delivered (dead-lettered ones excluded)."""
+    with _db_lock, closing(_connect(db_path)) as conn:
+        return conn.execute(
+            "SELECT COUNT(*) FROM anki_notes WHERE delivered_at IS NULL AND dead_at IS NULL"
+        ).fetchone()[0]
+
+def dead_count(db_path: Path = ANKI_QUEUE_PATH) -> int:
+    """Number of notes that failed `ANKI_MAX_ATTEMPTS` times and are no longer retried."""
+    with _db_lock, closing(_connect(db_path)) as conn:
+        return conn.execute("SELECT COUNT(*) FROM anki_notes WHERE dead_at IS NOT NULL").fetchone()[0]
+
+def retry_dead(db_path: Path = ANKI_QUEUE_PATH) -> int:
+    """Put dead-lettered notes back in the queue with a fresh attempt count."""
+    with _db_lock, closing(_connect(db_path)) as conn, conn:
+        count = conn.execute(
+            "UPDATE anki_notes SET dead_at = NULL, retry_at = NULL, attempts = 0 WHERE dead_at IS NOT NULL"
+        ).rowcount
+    logger.info(f"Re-queued {count} dead-lettered Anki notes")
+    return count
+
+def retry_delay(attempts: int) -> float:
+    """Seconds before a note that failed `attempts` times is tried again."""
+    return min(ANKI_DRAIN_MAX_BACKOFF, ANKI_DRAIN_INTERVAL * 2 ** (attempts - 1))
+
+def anki_is_reachable(url: str = ANKI_CONNECT_URL) -> bool:
+    """Return True if AnkiConnect answers a `version` request."""
+    try:
+        invoke("version", url=url)
+        mark_reachable()
+        return True
+    except (requests.RequestException, AnkiConnectError):
+        return False
+
+def drain_queue(
+        url: str = ANKI_CONNECT_URL,
+        batch_size: int = ANKI_BATCH_SIZE,
+        db_path: Path = ANKI_QUEUE_PATH,
+        max_attempts: int = ANKI_MAX_ATTEMPTS
+    ) -> dict:
+    """
+    Deliver queued notes to AnkiConnect in bulk, in the order they were queued.
+
+    Delivery is idempotent: notes Anki already has (reported as duplicates)
+    are marked delivered rather than retried. Notes Anki rejects are retried
+    after `retry_delay`, and dead-lettered after `max_attempts` failures so
+    they stop coming back. Draining stops at the first batch that finds
+    AnkiConnect unreachable.
+
+    Returns:
+        dict: Counts of 'delivered', 'duplicate', 'failed' (to be retried),
+              'dead' and 'remaining' notes, and whether Anki was 'reachable'.
+    """
+    summary = {"delivered": 0, "duplicate": 0, "failed": 0, "dead": 0, "remaining": 0, "reachable": True}
+
+    if not anki_is_reachable(url):
+        summary["reachable"] = False
+        summary["remaining"] = pending_count(db_path)
+        logger.info(f"AnkiConnect unreachable; {summary['remaining']} notes still queued")
+        return summary
+
+    last_rowid = 0
+    started = time.time()
+    while True:
+        with _db_lock, closing(_connect(db_path)) as conn:
+            rows = conn.execute(
+                "SELECT rowid, note_key, note_json, attempts FROM anki_notes "
+                "WHERE delivered_at IS NULL AND dead_at IS NULL "
+                "AND (retry_at IS NULL OR retry_at <= ?) AND rowid > ? "
+                "ORDER BY rowid LIMIT ?",
+                (started, last_rowid, batch_size),
+            ).fetchall()
+        if not rows:
+            break
+        last_rowid = rows[-1][0]
+
+        results = add_notes([json.loads(note_json) for _, _, note_json, _ in rows], url=url, batch_size=batch_size)
+
+        now = time.time()
+        delivered, failed, dead = [], [], []
+        for (_, key, _, attempts), result in zip(rows, results):
+            if result["status"] == "added":
+                summary["delivered"] += 1
+                delivered.append((now, key))
+            elif result["status"] == "duplicate":
+                summary["duplicate"] += 1
+                delivered.append((now, key))
+            elif result["status"] == "failed" and attempts + 1 >= max_attempts:
+                summary["dead"] += 1
+                dead.append((result["error"], now, key))
+            elif result["status"] == "failed":
+                summary["failed"] += 1
+                failed.append((result["error"], now + retry_delay(attempts + 1), key))
+
+        with _db_lock, closing(_connect(db_path)) as conn, conn:
+            conn.executemany("UPDATE anki_notes SET delivered_at = ? WHERE note_key = ?", delivered)
+            conn.executemany(
+                "UPDATE anki_notes SET attempts = attempts + 1, last_error = ?, retry_at = ? WHERE note_key = ?",
+                failed,
+            )
+            conn.executemany(
+                "UPDATE anki_notes SET attempts = attempts + 1, last_error = ?, dead_at = ? WHERE note_key = ?",
+                dead,
+            )
+        if dead:
+            logger.warning(f"Dead-lettered {len(dead)} Anki notes after {max_attempts} failed attempts")
+
+        if any(r["status"] == "unreachable" for r in results):
+            summary["reachable"] = False
+            break
+
+    summary["remaining"] = pending_count(db_path)
+    logger.info(
+        f"Drained Anki queue: {summary['delivered']} delivered, {summary['duplicate']} already present, "
+        f"{summary['failed']} failed, {summary['dead']} dead-lettered, {summary['remaining']} remaining"
+    )
+    return summary
+
+class QueueDrainer:
+    """
+    Background thread that drains the queue while notes are pending,
+    backing off exponentially while AnkiConnect stays unreachable.
+    """
+
+    def __init__(
+            self,
+            url: str = ANKI_CONNECT_URL,
+            interval: float = ANKI_DRAIN_INTERVAL,
+            max_backoff: float = ANKI_DRAIN_MAX_BACKOFF,
+            db_path: Path = ANKI_QUEUE_PATH
+        ):
+        self.url = url
+        self.interval = interval
+        self.max_backoff = max_backoff
+        self.db_path = db_path
+        self._stop = threading.Event()
+        self._wake = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="anki-queue-drainer", daemon=True)
+
+    def start(self) -> "QueueDrainer":
+        self._thread.start()
+        return self
+
+    def wake(self) -> None:
+        """Try again now rather than at the end of the current wait."""
+        self._wake.set()
+
+    def stop(self, timeout: Optional[float] = None) -> None:
+        self._stop.set()
+        self._wake.set()
+        self._thread.join(timeout)
+
+    def _run(self) -> None:
+        delay = self.interval
+        while not self._stop.is_set():
+            try:
+                if pending_count(self.db_path):
+                    summary = drain_queue(url=self.url, db_path=self.db_path)
+                    if summary["reachable"]:
+                        delay = self.interval
+                    else:
+                        delay = min(self.max_backoff, delay * 2)
+                else:
+                    delay = self.interval
+            except Exception as e:
+                logger.exception(f"Anki queue drainer error: {e}")
+                delay = min(self.max_backoff, delay * 2)
+
+            self._wake.wait(delay)
+            self._wake.clear()
+
+def start_background_drainer(url: str = ANKI_CONNECT_URL) -> QueueDrainer:
+    """Start the process-wide drainer if it isn't running, and nudge it."""
+    global _drainer
+    with _drainer_lock:
+        if _drainer is None:
+            _drainer = QueueDrainer(url=url).start()
+            logger.info("Started background Anki queue drainer")
+        else:
+            _drainer.wake()
+        return _drainer
+
+def main(argv: Optional[list] = None) -> int:
+    parser = argparse.ArgumentParser(description="Manage the offline Anki delivery queue.")
+    parser.add_argument("command", choices=["status", "drain", "watch", "retry-dead"])
+    parser.add_argument("--url", default=ANKI_CONNECT_URL)
+    args = parser.parse_args(argv)
+    setup_logging()
+
+    if args.command == "status":
+        print(json.dumps({"pending": pending_count(), "dead": dead_count()}))
+        return 0
+
+    if args.command == "retry-dead":
+        print(json.dumps({"requeued": retry_dead()}))
+        return 0
+
+    if args.command == "drain":
+        summary = drain_queue(url=args.url)
+        print(json.dumps(summary))
+        return 0 if summary["reachable"] else 1
+
+    drainer = QueueDrainer(url=args.url).start()
+    try:
+        while True:
+            time.sleep(60)
+    except KeyboardInterrupt:
+        drainer.stop()
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
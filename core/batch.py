@@ -0,0 +1,334 @@
+# Base libraries
+import argparse
+import json
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from pathlib import Path
+from typing import Callable, Iterable, Iterator, Optional, Union
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+
+# Local modules
+from utils.logger import get_logger, setup_logging
+from config.paths import RAW_OPENAI_DIR, PROCESSED_OPENAI_DIR
+from config.variable import OPENAI_API_KEY, BATCH_MAX_WORKERS, TRANSCRIPT_PREFETCH_WORKERS
+from core.sources import normalize_source, load_manifest, describe_source
+from core.pipeline import run_learning_pipeline, prefetch_transcript, quiz_fingerprint
+from core.quiz_generator import generate_quizzes_batch
+from core.stage_manifest import STAGES, StageManifest, forced_stages
+from core.search_index import index_artifact
+from core.transcript_service import extract_video_id
+from core.transcript_store import read_transcript_text
+
+logger = get_logger(__name__)
+
+def _run_single_source(
+        api_key: str,
+        entry: Union[str, dict],
+        question_count: int,
+        use_cache: bool,
+        force: bool,
+        from_stage: Optional[str],
+        make_pdf: bool = True,
+        make_anki: bool = True
+    ) -> dict:
+    """Normalize one entry and run the full pipeline on it, timing the run."""
+    started = time.perf_counter()
+    source = normalize_source(entry)
+    result = run_learning_pipeline(
+        api_key=api_key,
+        input_type=source["input_type"],
+        youtube_url=source["youtube_url"],
+        transcript_text=source["transcript_text"],
+        question_count=source.get("question_count", question_count),
+        source_id=source["source_id"],
+        use_cache=use_cache,
+        force=force,
+        from_stage=from_stage,
+        make_pdf=make_pdf,
+        make_anki=make_anki,
+    )
+    result["elapsed_seconds"] = round(time.perf_counter() - started, 3)
+    return result
+
+def _collect(
+        future,
+        index: int,
+        entry: Union[str, dict],
+        results: list,
+        failures: list,
+        on_complete: Optional[Callable[[dict], None]]
+    ) -> None:
+    """Record one finished source as a result or a failure."""
+    try:
+        outcome = future.result()
+        outcome["index"] = index
+        results.append(outcome)
+        logger.info(f"Batch source {index} finished: {outcome['source_id']}")
+    except Exception as e:
+        logger.exception(f"Batch source {index} failed: {e}")
+        outcome = {
+            "index": index,
+            "source": describe_source(entry),
+            "error": f"{type(e).__name__}: {e}",
+        }
+        failures.append(outcome)
+    if on_complete:
+        on_complete(outcome)
+
+def prefetch_transcripts(
+        sources: Iterable[Union[str, dict]],
+        max_workers: int = TRANSCRIPT_PREFETCH_WORKERS,
+        force: bool = False
+    ) -> Iterator[Union[str, dict]]:
+    """
+    Fetch the transcripts of YouTube sources in a bounded pool ahead of the
+    pipeline, yielding each source as soon as its transcript is on disk.
+
+    Sources are pulled from `sources` lazily, at most `2 * max_workers` at a
+    time, so a playlist that is still being enumerated is fetched as it goes.
+    Text sources pass straight through. A failed fetch is logged and the
+    source still yielded, so the pipeline retries and reports it. With
+    `force`, transcripts are fetched even if they are current.
+
+    Yields:
+        str | dict: The sources, in the order their transcripts arrive.
+    """
+    if max_workers < 1 and not force:
+        yield from sources
+        return
+
+    def fetch(entry):
+        try:
+            source = normalize_source(entry)
+            if source["input_type"] == "youtube":
+                prefetch_transcript(source["youtube_url"], force=force)
+        except Exception as e:
+            logger.warning(f"Prefetching transcript for {describe_source(entry)} failed: {e}")
+        return entry
+
+    iterator = iter(sources)
+    max_workers = max(1, max_workers)
+    with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="transcript-prefetch") as executor:
+        pending = set()
+        exhausted = False
+        while pending or not exhausted:
+            while not exhausted and len(pending) < 2 * max_workers:
+                try:
+                    entry = next(iterator)
+                except StopIteration:
+                    exhausted = True
+                    break
+                pending.add(executor.submit(fetch, entry))
+            if not pending:
+                continue
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                yield future.result()
+
+def run_batch_pipeline(
+    api_key: str,
+    sources: Iterable[Union[str, dict]],
+    question_count: int = 20,
+    max_workers: int = BATCH_MAX_WORKERS,
+    use_cache: bool = True,
+    force: bool = False,
+    from_stage: Optional[str] = None,
+    make_pdf: bool = True,
+    make_anki: bool = True,
+    on_complete: Optional[Callable[[dict], None]] = None
+) -> dict:
+    """
+    Run `run_learning_pipeline` over many sources concurrently.
+
+    Each source runs in a bounded worker pool so the network-bound stages
+    (transcript fetch, yt-dlp, OpenAI, AnkiConnect) of different sources
+    overlap. Backend calls are throttled by the shared limiters in
+    `core.rate_limit`. A failing source is recorded and never aborts the batch.
+
+    Args:
+        api_key (str): OpenAI API key.
+        sources (Iterable[str | dict]): URLs, texts or dict entries
+                                        (see `core.sources.normalize_source`).
+                                        Consumed lazily; may be a generator.
+        question_count (int): Default number of questions per source.
+        max_workers (int): Size of the worker pool.
+        use_cache (bool): Serve repeated OpenAI requests from the response cache.
+        force (bool): Re-run every stage, ignoring up-to-date artifacts.
+        from_stage (str, optional): Re-run this stage and the ones after it.
+        make_pdf (bool): Export a PDF for each source.
+        make_anki (bool): Push each source's quiz to Anki.
+        on_complete (Callable, optional): Called from the calling thread with
+                       each result or failure as soon as it finishes (e.g. for
+                       progress output or checkpoints).
+
+    Returns:
+        dict: {'results': [...], 'failures': [...], 'elapsed_seconds': float}
+              Results and failures keep the input order via their 'index'.
+    """
+    max_workers = max(1, max_workers)
+    logger.info(f"Starting batch with {max_workers} workers")
+    started = time.perf_counter()
+
+    results = []
+    failures = []
+
+    # Sources are pulled lazily and only a bounded number are in flight, so
+    # a generator (e.g. a playlist being enumerated) feeds the workers as it goes
+    iterator = enumerate(sources)
+    exhausted = False
+    futures = {}
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        while futures or not exhausted:
+            while not exhausted and len(futures) < 2 * max_workers:
+                try:
+                    index, entry = next(iterator)
+                except StopIteration:
+                    exhausted = True
+                    break
+                future = executor.submit(
+                    _run_single_source, api_key, entry, question_count, use_cache,
+                    force, from_stage, make_pdf, make_anki
+                )
+                futures[future] = (index, entry)
+            if not futures:
+                continue
+
+            done, _ = wait(futures, return_when=FIRST_COMPLETED)
+            for future in done:
+                index, entry = futures.pop(future)
+                _collect(future, index, entry, results, failures, on_complete)
+
+    results.sort(key=lambda r: r["index"])
+    failures.sort(key=lambda f: f["index"])
+    elapsed = round(time.perf_counter() - started, 3)
+
+    logger.info(f"Batch finished in {elapsed}s: {len(results)} succeeded, {len(failures)} failed")
+    return {
+        "results": results,
+        "failures": failures,
+        "elapsed_seconds": elapsed,
+    }
+
+def generate_quizzes_with_batch_api(
+        api_key: str,
+        sources: Iterable[Union[str, dict]],
+        question_count: int = 20,
+        use_cache: bool = True,
+        force: bool = False,
+        from_stage: Optional[str] = None,
+        prefetch_workers: int = TRANSCRIPT_PREFETCH_WORKERS
+    ) -> dict:
+    """
+    Generate the quizzes of many sources in one OpenAI Batch API job (see
+    `core.quiz_generator.generate_quizzes_batch`), ahead of
+    `run_batch_pipeline`.
+
+    Transcripts are fetched first, then every source whose quiz stage is
+    missing, stale or forced goes into the batch. Finished quizzes are
+    recorded in the stage manifests, so the pipeline run that follows skips
+    straight to the PDF and Anki stages. Sources that still fail are left
+    for that run to retry and report. If the batch itself times out or the
+    API fails, it is cancelled and all of its sources are 'deferred' to
+    that run.
+
+    Returns:
+        dict: Counts of quizzes 'generated', already 'fresh', 'failed' and
+              'deferred'.
+    """
+    forced = forced_stages(force, from_stage)
+    summary = {"generated": 0, "fresh": 0, "failed": 0, "deferred": 0}
+    jobs = []
+    manifests: dict[str, tuple[StageManifest, str]] = {}
+
+    # Transcripts must be on disk before the batch, so they are always fetched here
+    for entry in prefetch_transcripts(sources, max(1, prefetch_workers), force="transcript" in forced):
+        try:
+            source = normalize_source(entry)
+            if source["input_type"] == "youtube":
+                source_id = extract_video_id(source["youtube_url"])
+                if not source_id:
+                    raise ValueError(f"Could not extract a video id from {source['youtube_url']}")
+                transcript_text = read_transcript_text(source_id)
+            else:
+                source_id = source["source_id"]
+                transcript_text = source["transcript_text"]
+        except Exception as e:
+            logger.warning(f"Leaving {describe_source(entry)} out of the OpenAI batch: {e}")
+            summary["failed"] += 1
+            continue
+
+        if source_id in manifests:
+            continue
+        count = source.get("question_count", question_count)
+        manifest = StageManifest(source_id)
+        quiz_fp = quiz_fingerprint(transcript_text, count)
+        if not manifest.should_run("quiz", quiz_fp, forced):
+            summary["fresh"] += 1
+            continue
+        manifests[source_id] = (manifest, quiz_fp)
+        jobs.append({
+            "source_id": source_id,
+            "transcript_text": transcript_text,
+            "question_count": count,
+            "input_type": source["input_type"],
+        })
+
+    logger.info(f"Generating {len(jobs)} quizzes through the OpenAI Batch API ({summary['fresh']} up to date)")
+    try:
+        results = generate_quizzes_batch(api_key, jobs, use_cache=use_cache)
+    except Exception as e:
+        logger.error(f"OpenAI batch failed, leaving {len(jobs)} quizzes to the pipeline run: {type(e).__name__}: {e}")
+        summary["deferred"] = len(jobs)
+        return summary
+
+    for source_id, result in results.items():
+        if isinstance(result, Exception):
+            summary["failed"] += 1
+            continue
+        manifest, quiz_fp = manifests[source_id]
+        quiz_path = PROCESSED_OPENAI_DIR / f"{source_id}.json"
+        manifest.record("quiz", quiz_fp, [RAW_OPENAI_DIR / f"{source_id}.json", quiz_path])
+        index_artifact(source_id, "quiz", path=quiz_path)
+        summary["generated"] += 1
+    return summary
+
+def main(argv: Optional[list] = None) -> int:
+    parser = argparse.ArgumentParser(description="Run the learning pipeline over many sources.")
+    parser.add_argument("sources", nargs="*", help="YouTube URLs to process")
+    parser.add_argument("--manifest", help="JSONL manifest with one source per line")
+    parser.add_argument("--question-count", type=int, default=20)
+    parser.add_argument("--workers", type=int, default=BATCH_MAX_WORKERS)
+    parser.add_argument("--no-cache", action="store_true", help="Bypass the OpenAI response cache")
+    parser.add_argument("--force", action="store_true", help="Re-run every stage")
+    parser.add_argument("--from-stage", choices=STAGES, help="Re-run this stage and all later ones")
+    args = parser.parse_args(argv)
+    setup_logging()
+
+    entries = list(args.sources)
+    if args.manifest:
+        entries.extend(load_manifest(args.manifest))
+    if not entries:
+        parser.error("Provide at least one URL or a --manifest")
+
+    summary = run_batch_pipeline(
+        api_key=OPENAI_API_KEY,
+        sources=entries,
+        question_count=args.question_count,
+        max_workers=args.workers,
+        use_cache=not args.no_cache,
+        force=args.force,
+        from_stage=args.from_stage,
+    )
+    summary["results"] = [
+        {"index": r["index"], "source_id": r["source_id"],
+         "questions": len(r["quiz_data"]), "stages_run": r["stages_run"],
+         "elapsed_seconds": r["elapsed_seconds"]}
+        for r in summary["results"]
+    ]
+    print(json.dumps(summary, indent=2))
+    return 1 if summary["failures"] else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,141 @@
+# Base libraries
+import re
+from functools import lru_cache
+
+# Local modules
+from utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+# Rough average for English text when tiktoken is unavailable
+CHARS_PER_TOKEN = 4
+
+_SENTENCE_SPLIT = re.compile(r"(?<=[.!?])\s+")
+
+@lru_cache(maxsize=8)
+def _get_encoding(model: str):
+    """Return the tiktoken encoding for a model, or None if tiktoken is not installed."""
+    try:
+        import tiktoken
+    except ImportError:
+        logger.info("tiktoken not installed, estimating token counts from characters")
+        return None
+
+    try:
+        try:
+            return tiktoken.encoding_for_model(model)
+        except KeyError:
+            return tiktoken.get_encoding("o200k_base")
+    except Exception as e:
+        # tiktoken downloads encodings on first use, which fails offline
+        logger.warning(f"Could not load tiktoken encoding for {model}, estimating token counts: {e}")
+        return None
+
+def count_tokens(text: str, model: str = "gpt-4o") -> int:
+    """
+    Count the tokens in a piece of text for the given model.
+
+    Uses tiktoken when available and falls back to a character-based
+    estimate otherwise.
+    """
+    if not text:
+        return 0
+    encoding = _get_encoding(model)
+    if encoding is None:
+        return -(-len(text) // CHARS_PER_TOKEN)
+    return len(encoding.encode(text, disallowed_special=()))
+
+def truncate_to_tokens(text: str, max_tokens: int, model: str = "gpt-4o") -> str:
+    """Cut text down to its first `max_tokens` tokens (estimated from characters without tiktoken)."""
+    encoding = _get_encoding(model)
+    if encoding is None:
+        return text[:max(max_tokens, 0) * CHARS_PER_TOKEN]
+    tokens = encoding.encode(text, disallowed_special=())
+    return text if len(tokens) <= max_tokens else encoding.decode(tokens[:max(max_tokens, 0)])
+
+def _split_units(text: str, max_tokens: int, model: str) -> list[tuple[str, int]]:
+    """
+    Split text into (unit, token_count) pairs no larger than `max_tokens`.
+    Units are transcript lines, falling back to sentences and then words
+    for lines that are too long on their own.
+    """
+    units = []
+    for line in text.splitlines():
+        line = line.strip()
+        if not line:
+            continue
+        tokens = count_tokens(line, model)
+        if tokens <= max_tokens:
+            units.append((line, tokens))
+            continue
+
+        for sentence in _SENTENCE_SPLIT.split(line):
+            tokens = count_tokens(sentence, model)
+            if tokens <= max_tokens:
+                units.append((sentence, tokens))
+                continue
+            # A single run-on "sentence": pack it word by word
+            words, current = [], 0
+            for word in sentence.split():
+                word_tokens = count_tokens(word + " ", model)
+                if words and current + word_tokens > max_tokens:
+                    units.append((" ".join(words), current))
+                    words, current = [], 0
+                words.append(word)
+                current += word_tokens
+            if words:
+                units.append((" ".join(words), current))
+    return units
+
+def chunk_text(
+        text: str,
+        max_tokens: int = 4000,
+        overlap_tokens: int = 200,
+        model: str = "gpt-4o"
+    ) -> list[str]:
+    """
+    Split a transcript into token-bounded chunks along line and sentence
+    boundaries, repeating up to `overlap_tokens` of trailing context at the
+    start of the next chunk so ideas spanning a boundary are not lost.
+
+    Args:
+        text (str): Full transcript text.
+        max_tokens (int): Maximum tokens per chunk.
+        overlap_tokens (int): Tokens of context shared between neighbouring chunks.
+        model (str): Model whose tokenizer is used for counting.
+
+    Returns:
+        list[str]: The chunks, in transcript order.
+    """
+    if max_tokens <= 0:
+        raise ValueError("max_tokens must be positive")
+    overlap_tokens = max(0, min(overlap_tokens, max_tokens // 2))
+
+    units = _split_units(text, max_tokens, model)
+    chunks = []
+    current: list[tuple[str, int]] = []
+    current_tokens = 0
+
+    for unit, tokens in units:
+        if current and current_tokens + tokens > max_tokens:
+            chunks.append("\n".join(u for u, _ in current))
+
+            # Carry trailing units over as overlap
+            carried, carried_tokens = [], 0
+            for prev_unit, prev_tokens in reversed(current):
+                if carried_tokens + prev_tokens > overlap_tokens:
+                    break
+                carried.insert(0, (prev_unit, prev_tokens))
+                carried_tokens += prev_tokens
+            if carried_tokens + tokens > max_tokens:
+                carried, carried_tokens = [], 0
+            current, current_tokens = carried, carried_tokens
+
+        current.append((unit, tokens))
+        current_tokens += tokens
+
+    if current:
+        chunks.append("\n".join(u for u, _ in current))
+
+    logger.info(f"Split transcript into {len(chunks)} chunks (max {max_tokens} tokens, overlap {overlap_tokens})")
+    return chunks
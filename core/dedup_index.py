@@ -0,0 +1,555 @@
+"""
+Local near-duplicate index over every question produced so far.
+
+Questions are embedded with signed feature hashing of word unigrams and
+bigrams (no network, no model) into L2-normalised vectors, so cosine
+similarity is a dot product. The vectors of all quizzes under
+`PROCESSED_OPENAI_DIR` are kept in memory as one float32 matrix (float16 on
+disk) and new items are scored against it in blocks, with a single matrix
+product per block.
+
+On disk the index is append-only (`vectors.f16`, `entries.jsonl`) plus a
+small `sources.json` recording which rows belong to which source; rows of a
+re-generated quiz are superseded and compacted away once they pile up.
+Writers take `index.lock` so several processes can share the files.
+"""
+# Base libraries
+import json
+import os
+import re
+import threading
+import zlib
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Optional
+
+# 3rd party packages
+import numpy as np
+
+# Local modules
+from utils.logger import get_logger, sampled
+from utils.file_lock import file_lock
+from config.paths import DEDUP_INDEX_DIR, PROCESSED_OPENAI_DIR
+from config.variable import DEDUP_MODE, DEDUP_THRESHOLD, DEDUP_DIM
+
+logger = get_logger(__name__)
+
+_WORD = re.compile(r"[a-z0-9]+")
+_STOPWORDS = frozenset(
+    "a an and are as at be by can do does for from how in is it of on or that the "
+    "this to was what when where which who why will with you your".split()
+)
+
+# Rows scored per matrix product; bounds the score matrix for large queries
+_QUERY_BLOCK = 65_536
+# Rows the in-memory buffer starts with; it doubles when full
+_MIN_CAPACITY = 1024
+
+def _features(question: str) -> list[str]:
+    words = [w for w in _WORD.findall(question.lower()) if w not in _STOPWORDS]
+    return words + [f"{a} {b}" for a, b in zip(words, words[1:])]
+
+def embed_questions(questions: list[str], dim: int = DEDUP_DIM) -> np.ndarray:
+    """
+    Embed questions as L2-normalised hashed n-gram vectors.
+
+    Each word and word bigram (stopwords removed) is hashed with CRC32 to a
+    column and a sign, so the embedding is stable across processes.
+
+    Returns:
+        np.ndarray: float32 array of shape (len(questions), dim).
+    """
+    rows, cols, signs = [], [], []
+    for row, question in enumerate(questions):
+        for feature in _features(question):
+            h = zlib.crc32(feature.encode("utf-8"))
+            rows.append(row)
+            cols.append(h % dim)
+            signs.append(1.0 if h & 0x80000000 else -1.0)
+
+    vectors = np.zeros((len(questions), dim), dtype=np.float32)
+    if rows:
+        np.add.at(vectors, (np.array(rows), np.array(cols)), np.array(signs, dtype=np.float32))
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    np.divide(vectors, norms, out=vectors, where=norms > 0)
+    return vectors
+
+class QuestionIndex:
+    """
+    Append-only store of question vectors with blockwise cosine lookup.
+
+    The files are shared by every process (app, API, CLI runs). Updates and
+    lookups hold a lock file and first read what other processes appended
+    since, so row offsets in `sources.json` stay consistent. In memory the
+    vectors live in a buffer that doubles when full, so an append doesn't
+    copy the whole matrix.
+
+    Args:
+        index_dir (Path): Where the index files live.
+        dim (int): Embedding width. Changing it rebuilds the index.
+    """
+
+    def __init__(self, index_dir: Path = DEDUP_INDEX_DIR, dim: int = DEDUP_DIM):
+        self.index_dir = Path(index_dir)
+        self.dim = dim
+        self.vectors_path = self.index_dir / "vectors.f16"
+        self.entries_path = self.index_dir / "entries.jsonl"
+        self.sources_path = self.index_dir / "sources.json"
+        self.lock_path = self.index_dir / "index.lock"
+        self.lock = threading.RLock()
+        with self.lock, file_lock(self.lock_path):
+            self._load()
+
+    @contextmanager
+    def _locked(self):
+        """Hold the thread and file locks, synced with other processes' writes."""
+        with self.lock, file_lock(self.lock_path):
+            self._sync()
+            yield
+
+    # ----- storage -----
+
+    @property
+    def _vectors(self) -> np.ndarray:
+        return self._buffer[:self._rows]
+
+    @property
+    def _active(self) -> np.ndarray:
+        return self._active_buffer[:self._rows]
+
+    def _set_rows(self, vectors: np.ndarray, active: np.ndarray) -> None:
+        capacity = max(len(vectors), _MIN_CAPACITY)
+        self._buffer = np.zeros((capacity, self.dim), dtype=np.float32)
+        self._active_buffer = np.zeros(capacity, dtype=bool)
+        self._rows = len(vectors)
+        self._buffer[:self._rows] = vectors
+        self._active_buffer[:self._rows] = active
+
+    def _grow(self, extra: int) -> None:
+        """Make room for `extra` more rows, doubling the capacity as needed."""
+        needed = self._rows + extra
+        capacity = len(self._buffer)
+        if needed <= capacity:
+            return
+        while capacity < needed:
+            capacity *= 2
+        buffer = np.zeros((capacity, self.dim), dtype=np.float32)
+        buffer[:self._rows] = self._vectors
+        active = np.zeros(capacity, dtype=bool)
+        active[:self._rows] = self._active
+        self._buffer, self._active_buffer = buffer, active
+
+    def _push(self, vectors: np.ndarray, entries: list[tuple[str, str]]) -> None:
+        """Add rows in memory, inactive until a source claims them."""
+        self._grow(len(vectors))
+        self._buffer[self._rows:self._rows + len(vectors)] = vectors
+        self._rows += len(vectors)
+        self._entries.extend(entries)
+
+    def _reset(self) -> None:
+        self._set_rows(np.zeros((0, self.dim), dtype=np.float32), np.zeros(0, dtype=bool))
+        self._entries: list[tuple[str, str]] = []
+        self.sources: dict[str, dict] = {}
+        # What the files looked like when last read or written (see `_sync`)
+        self._generation = 0
+        self._entries_bytes = 0
+        self._sources_stamp: Optional[tuple] = None
+
+    def _stat_sources(self) -> Optional[tuple]:
+        try:
+            stat = self.sources_path.stat()
+        except FileNotFoundError:
+            return None
+        return (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+
+    def _read_entries(self, offset: int = 0) -> tuple[list[tuple[str, str]], int, bool]:
+        """
+        Entries from byte `offset` on.
+
+        Returns:
+            tuple: (entries, offset after the last complete line, whether a
+                   partial line follows it)
+        """
+        if not self.entries_path.exists():
+            return [], offset, False
+        with open(self.entries_path, "rb") as file:
+            file.seek(offset)
+            data = file.read()
+        end = data.rfind(b"\n") + 1
+        entries = [tuple(json.loads(line)) for line in data[:end].splitlines() if line.strip()]
+        return entries, offset + end, end < len(data)
+
+    def _load(self) -> None:
+        # Caller holds the locks
+        self._reset()
+        if not self.sources_path.exists():
+            # Rows written before the first sources.json belong to no source
+            for path in (self.vectors_path, self.entries_path):
+                path.unlink(missing_ok=True)
+            return
+
+        meta = json.loads(self.sources_path.read_text(encoding="utf-8"))
+        if meta.get("dim") != self.dim:
+            logger.info(f"Dedup index dimension changed ({meta.get('dim')} -> {self.dim}); rebuilding")
+            for path in (self.vectors_path, self.entries_path, self.sources_path):
+                path.unlink(missing_ok=True)
+            return
+
+        vectors = np.fromfile(self.vectors_path, dtype=np.float16) if self.vectors_path.exists() else np.zeros(0, np.float16)
+        entries, self._entries_bytes, partial = self._read_entries()
+
+        # A crash between appends can leave the files uneven; sources past the
+        # shorter one are dropped and re-indexed by the next refresh
+        rows = min(len(vectors) // self.dim, len(entries))
+        self._set_rows(vectors[:rows * self.dim].reshape(-1, self.dim), False)
+        self._entries = entries[:rows]
+        self._generation = meta.get("generation", 0)
+        for source_id, info in meta.get("sources", {}).items():
+            if info["end"] <= rows:
+                self.sources[source_id] = info
+                self._active[info["start"]:info["end"]] = True
+
+        if partial or len(vectors) != rows * self.dim or len(entries) != rows:
+            # Cut the files back to the rows kept, so later appends line up
+            self._write_files()
+            self._save_sources()
+        else:
+            self._sources_stamp = self._stat_sources()
+
+    def _sync(self) -> None:
+        """Read what other processes wrote since we last did; caller holds the locks."""
+        stamp = self._stat_sources()
+        if stamp == self._sources_stamp:
+            return
+        try:
+            meta = json.loads(self.sources_path.read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            meta = None
+        if not meta or meta.get("dim") != self.dim or meta.get("generation", 0) != self._generation:
+            # Rebuilt or compacted elsewhere: row numbers changed
+            self._load()
+            return
+
+        vectors = (
+            np.fromfile(self.vectors_path, dtype=np.float16, offset=self._rows * self.dim * 2)
+            if self.vectors_path.exists() else np.zeros(0, np.float16)
+        )
+        entries, entries_bytes, partial = self._read_entries(self._entries_bytes)
+        if partial or len(vectors) != len(entries) * self.dim:
+            self._load()
+            return
+
+        self._push(vectors.reshape(-1, self.dim), entries)
+        self._entries_bytes = entries_bytes
+        self.sources = {}
+        self._active[:] = False
+        for source_id, info in meta.get("sources", {}).items():
+            if info["end"] <= self._rows:
+                self.sources[source_id] = info
+                self._active[info["start"]:info["end"]] = True
+        self._sources_stamp = stamp
+        if entries:
+            logger.debug(f"Dedup index picked up {len(entries)} questions written by another process")
+
+    def _save_sources(self) -> None:
+        self.index_dir.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.sources_path.with_suffix(f".{os.getpid()}.{threading.get_ident()}.tmp")
+        tmp_path.write_text(
+            json.dumps({"dim": self.dim, "generation": self._generation, "sources": self.sources}),
+            encoding="utf-8",
+        )
+        os.replace(tmp_path, self.sources_path)
+        self._sources_stamp = self._stat_sources()
+
+    def _write_files(self) -> None:
+        """Rewrite the vector and entry files from memory."""
+        self.index_dir.mkdir(parents=True, exist_ok=True)
+        entries = "".join(json.dumps(entry) + "\n" for entry in self._entries).encode("utf-8")
+        for path, write in (
+            (self.vectors_path, lambda tmp: self._vectors.astype(np.float16).tofile(tmp)),
+            (self.entries_path, lambda tmp: tmp.write_bytes(entries)),
+        ):
+            tmp_path = path.with_suffix(f".{os.getpid()}.{threading.get_ident()}.tmp")
+            write(tmp_path)
+            os.replace(tmp_path, path)
+        self._entries_bytes = len(entries)
+        # Other processes reload everything instead of reading past their old offsets
+        self._generation += 1
+
+    def _compact(self) -> None:
+        """Rewrite the files with only the rows of current quizzes."""
+        keep = np.flatnonzero(self._active)
+        order = sorted(self.sources.items(), key=lambda item: item[1]["start"])
+        self._set_rows(self._vectors[keep], True)
+        self._entries = [self._entries[i] for i in keep]
+
+        start = 0
+        for source_id, info in order:
+            length = info["end"] - info["start"]
+            self.sources[source_id] = {**info, "start": start, "end": start + length}
+            start += length
+
+        self._write_files()
+        self._save_sources()
+        logger.info(f"Compacted dedup index to {len(keep)} questions")
+
+    def __len__(self) -> int:
+        return int(self._active.sum())
+
+    # ----- updates -----
+
+    def add_sources(self, batch: list[tuple[str, list[str], Optional[Path]]]) -> None:
+        """
+        Index several (source_id, questions, quiz_path) entries in one write,
+        superseding earlier versions of those sources (see `replace_source`).
+        """
+        with self._locked():
+            self._append(batch)
+
+    def _append(self, batch: list[tuple[str, list[str], Optional[Path]]]) -> None:
+        # Caller holds the locks and has synced
+        questions = [q for _, source_questions, _ in batch for q in source_questions]
+        vectors = embed_questions(questions, self.dim)
+        entries = [(source_id, q) for source_id, source_questions, _ in batch for q in source_questions]
+        lines = "".join(json.dumps(list(entry)) + "\n" for entry in entries).encode("utf-8")
+
+        self.index_dir.mkdir(parents=True, exist_ok=True)
+        with open(self.vectors_path, "ab") as file:
+            vectors.astype(np.float16).tofile(file)
+        with open(self.entries_path, "ab") as file:
+            file.write(lines)
+        self._entries_bytes += len(lines)
+
+        start = self._rows
+        self._push(vectors, entries)
+        for source_id, source_questions, quiz_path in batch:
+            previous = self.sources.pop(source_id, None)
+            if previous:
+                self._active[previous["start"]:previous["end"]] = False
+
+            info = {"start": start, "end": start + len(source_questions)}
+            if quiz_path is not None and Path(quiz_path).exists():
+                stat = Path(quiz_path).stat()
+                info.update(size=stat.st_size, mtime_ns=stat.st_mtime_ns)
+            self.sources[source_id] = info
+            self._active[info["start"]:info["end"]] = True
+            start += len(source_questions)
+
+        dead = len(self._entries) - len(self)
+        if dead > max(10_000, len(self._entries) // 2):
+            self._compact()
+        else:
+            self._save_sources()
+
+    def replace_source(self, source_id: str, questions: list[str], quiz_path: Optional[Path] = None) -> None:
+        """
+        Make `questions` the indexed questions of `source_id`, superseding
+        any earlier version of that source's quiz.
+
+        Args:
+            quiz_path (Path, optional): The saved quiz file; its size and
+                mtime let `refresh` skip it while it is unchanged.
+        """
+        with self._locked():
+            self._append([(source_id, questions, quiz_path)])
+
+    def refresh(self, quiz_dir: Path = PROCESSED_OPENAI_DIR, batch_size: int = 500) -> int:
+        """
+        Index quiz files that are new or changed since they were indexed,
+        and drop sources whose quiz file is gone.
+
+        Returns:
+            int: Number of sources (re-)indexed.
+        """
+        quiz_dir = Path(quiz_dir)
+        paths = {path.stem: path for path in quiz_dir.glob("*.json")} if quiz_dir.exists() else {}
+        updated = 0
+
+        with self._locked():
+            for source_id in [s for s in self.sources if s not in paths]:
+                info = self.sources.pop(source_id)
+                self._active[info["start"]:info["end"]] = False
+
+            batch = []
+            for source_id, path in paths.items():
+                stat = path.stat()
+                info = self.sources.get(source_id)
+                if info and info.get("size") == stat.st_size and info.get("mtime_ns") == stat.st_mtime_ns:
+                    continue
+                try:
+                    items = json.loads(path.read_text(encoding="utf-8"))
+                    questions = [str(item["question"]) for item in items]
+                except (OSError, ValueError, KeyError, TypeError) as e:
+                    logger.warning(f"Skipping unreadable quiz {path} in dedup index: {e}")
+                    continue
+                batch.append((source_id, questions, path))
+                updated += 1
+                if len(batch) >= batch_size:
+                    self._append(batch)
+                    batch = []
+
+            if batch:
+                self._append(batch)
+            else:
+                self._save_sources()
+
+        if updated:
+            logger.info(f"Dedup index refreshed {updated} sources; {len(self)} questions indexed")
+        return updated
+
+    # ----- lookups -----
+
+    def nearest(self, vectors: np.ndarray, exclude_source: Optional[str] = None) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Best match among the indexed questions for each query vector.
+
+        Args:
+            exclude_source (str, optional): Ignore the indexed questions of
+                                            this source.
+
+        Returns:
+            tuple: (similarities, rows); rows are -1 where nothing is indexed.
+        """
+        best_scores = np.full(len(vectors), -1.0, dtype=np.float32)
+        best_rows = np.full(len(vectors), -1, dtype=np.int64)
+        if not len(vectors):
+            return best_scores, best_rows
+
+        queries = vectors.T.astype(np.float32)
+        with self._locked():
+            total = len(self._vectors)
+            excluded = self.sources.get(exclude_source) if exclude_source else None
+            for start in range(0, total, _QUERY_BLOCK):
+                end = min(start + _QUERY_BLOCK, total)
+                scores = self._vectors[start:end] @ queries
+                scores[~self._active[start:end]] = -1.0
+                if excluded and excluded["start"] < end and excluded["end"] > start:
+                    scores[max(excluded["start"] - start, 0):excluded["end"] - start] = -1.0
+                rows = scores.argmax(axis=0)
+                values = scores[rows, np.arange(len(vectors))]
+                better = values > best_scores
+                best_scores[better] = values[better]
+                best_rows[better] = rows[better] + start
+        return best_scores, best_rows
+
+    def entry(self, row: int) -> tuple[str, str]:
+        """(source_id, question) stored at a row."""
+        return self._entries[row]
+
+
+_index: Optional[QuestionIndex] = None
+_index_lock = threading.Lock()
+
+def get_question_index() -> QuestionIndex:
+    """The process-wide index, synced with the quiz directory on first use."""
+    global _index
+    with _index_lock:
+        if _index is None:
+            _index = QuestionIndex()
+            _index.refresh()
+        return _index
+
+def find_duplicates(
+        items: list[dict],
+        source_id: str,
+        threshold: float = DEDUP_THRESHOLD,
+        index: Optional[QuestionIndex] = None
+    ) -> tuple[list[Optional[dict]], np.ndarray]:
+    """
+    Match each item against the index and against earlier items in the list.
+
+    The indexed questions of `source_id` itself (an earlier version of this
+    quiz) are not matched, so re-running a source doesn't mark its own
+    questions as already asked; AnkiConnect's duplicate check covers cards
+    that were delivered before.
+
+    Returns:
+        tuple: (matches, vectors). `matches[i]` is None or a dict with the
+               'source_id', 'question' and 'similarity' of the duplicate;
+               repeats within `items` also have 'repeat': True.
+    """
+    index = index or get_question_index()
+    questions = [str(item.get("question", "")) for item in items]
+    vectors = embed_questions(questions, index.dim)
+
+    matches: list[Optional[dict]] = [None] * len(items)
+    # Rows are only meaningful until the next sync, so resolve them under the same lock
+    with index.lock:
+        scores, rows = index.nearest(vectors, exclude_source=source_id)
+        for i, (score, row) in enumerate(zip(scores, rows)):
+            if row >= 0 and score >= threshold:
+                match_source, match_question = index.entry(int(row))
+                matches[i] = {"source_id": match_source, "question": match_question, "similarity": round(float(score), 3)}
+
+    # Repeats within this quiz
+    if len(items) > 1:
+        pairwise = np.triu(vectors @ vectors.T, k=1)
+        for j in range(1, len(items)):
+            i = int(pairwise[:, j].argmax())
+            if matches[j] is None and pairwise[i, j] >= threshold:
+                matches[j] = {
+                    "source_id": source_id, "question": questions[i],
+                    "similarity": round(float(pairwise[i, j]), 3), "repeat": True,
+                }
+
+    return matches, vectors
+
+def flag_duplicate(item: dict, source_id: str, threshold: float = DEDUP_THRESHOLD) -> dict:
+    """
+    Mark a single item (e.g. one streamed question) with 'duplicate_of' if
+    it matches an indexed question. The index itself is not updated.
+    """
+    if DEDUP_MODE == "off":
+        return item
+    matches, _ = find_duplicates([item], source_id, threshold)
+    if matches[0]:
+        item["duplicate_of"] = matches[0]
+        if sampled(logger):
+            logger.debug(f"Flagged duplicate of {matches[0]['source_id']}: {item.get('question', '')[:80]}")
+    return item
+
+def deduplicate_quiz(
+        items: list[dict],
+        source_id: str,
+        mode: str = DEDUP_MODE,
+        threshold: float = DEDUP_THRESHOLD
+    ) -> list[dict]:
+    """
+    Flag or drop quiz items that are near-duplicates of questions already
+    produced (cosine similarity at or above `threshold`).
+
+    With mode 'flag' every item is kept and duplicates get a 'duplicate_of'
+    entry, which Anki export skips. With mode 'filter' duplicates of other
+    sources, and repeats within this quiz, are dropped. An earlier version
+    of this same source's quiz is not matched (see `find_duplicates`), so a
+    re-run still produces, and delivers, a complete quiz.
+
+    Call `record_quiz` once the result is saved so later runs see it.
+    """
+    if mode == "off" or not items:
+        return items
+
+    matches, _ = find_duplicates(items, source_id, threshold)
+    kept = []
+    for item, match in zip(items, matches):
+        item.pop("duplicate_of", None)
+        if match:
+            if mode == "filter":
+                continue
+            item["duplicate_of"] = match
+        kept.append(item)
+
+    flagged = sum(1 for item in kept if "duplicate_of" in item)
+    logger.info(
+        f"Dedup ({mode}) for {source_id}: {len(items) - len(kept)} dropped, {flagged} flagged "
+        f"of {len(items)} items"
+    )
+    return kept
+
+def record_quiz(source_id: str, items: list[dict], quiz_path: Optional[Path] = None) -> None:
+    """Index a saved quiz as the current questions of `source_id`."""
+    if DEDUP_MODE == "off":
+        return
+    get_question_index().replace_source(
+        source_id, [str(item.get("question", "")) for item in items], quiz_path=quiz_path
+    )
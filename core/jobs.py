@@ -0,0 +1,341 @@
+"""
+Background job runner for pipeline runs.
+
+Runs are submitted to a thread pool and tracked in a local SQLite table, so
+callers (the Streamlit page, scripts) get a job id back immediately, can poll
+per-stage progress while the run is in flight, and can reconnect to a job
+after a page refresh. Finished results are served from the stored artifacts
+rather than held in memory.
+
+Identical submissions coalesce onto the job already in flight, and the
+number of unfinished jobs is capped, so a burst of requests is turned away
+(`JobQueueFull`) instead of queueing unbounded work.
+
+Several runners (API workers, the Streamlit app) can share one job table.
+Each keeps a lease on its unfinished jobs by refreshing their `updated_at`;
+jobs whose lease runs out belong to a runner that exited and are marked
+interrupted.
+"""
+# Base libraries
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Optional
+
+# Local modules
+from utils.logger import get_logger, log_context
+from utils.metrics import observe_spans
+from config.paths import JOBS_DB_PATH, PROCESSED_OPENAI_DIR, PDF_OUTPUTS_DIR
+from config.variable import (
+    OPENAI_API_KEY, JOBS_MAX_WORKERS, JOBS_MAX_PENDING, JOBS_HEARTBEAT_INTERVAL, JOBS_LEASE_TIMEOUT
+)
+
+logger = get_logger(__name__)
+
+# Job states; 'interrupted' marks jobs whose runner stopped mid-run
+QUEUED, RUNNING, SUCCEEDED, FAILED, INTERRUPTED = "queued", "running", "succeeded", "failed", "interrupted"
+FINISHED_STATES = (SUCCEEDED, FAILED, INTERRUPTED)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    job_id      TEXT PRIMARY KEY,
+    status      TEXT NOT NULL,
+    params_json TEXT NOT NULL,
+    source_id   TEXT,
+    stage       TEXT,
+    progress    TEXT NOT NULL DEFAULT '{}',
+    result_json TEXT,
+    error       TEXT,
+    worker_pid  INTEGER,
+    runner_id   TEXT,
+    created_at  REAL NOT NULL,
+    started_at  REAL,
+    updated_at  REAL,
+    finished_at REAL
+);
+CREATE INDEX IF NOT EXISTS idx_jobs_created ON jobs (created_at);
+"""
+
+_db_lock = threading.Lock()
+
+class JobQueueFull(RuntimeError):
+    """Raised by `JobRunner.submit` when too many jobs are unfinished."""
+
+def _connect(db_path: Path = JOBS_DB_PATH) -> sqlite3.Connection:
+    db_path = Path(db_path)
+    db_path.parent.mkdir(parents=True, exist_ok=True)
+    conn = sqlite3.connect(db_path, timeout=30)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.executescript(_SCHEMA)
+    # Tables created before jobs recorded their runner and lease
+    columns = {row[1] for row in conn.execute("PRAGMA table_info(jobs)")}
+    for column, kind in (("runner_id", "TEXT"), ("updated_at", "REAL")):
+        if column not in columns:
+            conn.execute(f"ALTER TABLE jobs ADD COLUMN {column} {kind}")
+    conn.row_factory = sqlite3.Row
+    return conn
+
+def _row_to_job(row: sqlite3.Row) -> dict:
+    job = dict(row)
+    job["params"] = json.loads(job.pop("params_json"))
+    job["progress"] = json.loads(job["progress"] or "{}")
+    job["result"] = json.loads(job.pop("result_json")) if job["result_json"] else None
+    return job
+
+def get_job(job_id: str, db_path: Path = JOBS_DB_PATH) -> Optional[dict]:
+    """
+    Current state of a job.
+
+    Returns:
+        dict | None: 'job_id', 'status', 'params', 'source_id', the current
+                     'stage', 'progress' ({'stages': {...}, 'questions': [...]}),
+                     'result' once finished, 'error' and timestamps.
+    """
+    with _connect(db_path) as conn:
+        row = conn.execute("SELECT * FROM jobs WHERE job_id = ?", (job_id,)).fetchone()
+    return _row_to_job(row) if row else None
+
+def list_jobs(limit: int = 20, db_path: Path = JOBS_DB_PATH) -> list[dict]:
+    """Most recent jobs first."""
+    with _connect(db_path) as conn:
+        rows = conn.execute("SELECT * FROM jobs ORDER BY created_at DESC LIMIT ?", (limit,)).fetchall()
+    return [_row_to_job(row) for row in rows]
+
+def load_job_artifacts(job: dict) -> dict:
+    """
+    The outputs of a finished job, read from the stored artifacts.
+
+    Returns:
+        dict: 'quiz_data' (list, empty if missing) and 'pdf_path' (Path or None).
+    """
+    source_id = job.get("source_id")
+    if not source_id:
+        return {"quiz_data": [], "pdf_path": None}
+    quiz_path = PROCESSED_OPENAI_DIR / f"{source_id}.json"
+    pdf_path = PDF_OUTPUTS_DIR / f"{source_id}.pdf"
+    return {
+        "quiz_data": json.loads(quiz_path.read_text(encoding="utf-8")) if quiz_path.exists() else [],
+        "pdf_path": pdf_path if pdf_path.exists() else None,
+    }
+
+def job_key(params: dict) -> str:
+    """
+    Key identifying the work a job does, so identical submissions can share
+    one job. YouTube URLs are reduced to their video id, so different URL
+    forms of the same video coalesce.
+    """
+    normalized = dict(params)
+    if normalized.get("youtube_url"):
+        from core.transcript_service import extract_video_id
+        normalized["youtube_url"] = extract_video_id(normalized["youtube_url"]) or normalized["youtube_url"]
+    if normalized.get("transcript_text"):
+        normalized["transcript_text"] = hashlib.sha256(normalized["transcript_text"].encode("utf-8")).hexdigest()
+    return hashlib.sha256(json.dumps(normalized, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+
+class JobRunner:
+    """
+    Thread pool that runs `run_learning_pipeline` jobs and records their
+    progress in the job table.
+
+    Args:
+        max_workers (int): Pipeline runs executed at the same time. Backend
+                           calls are still throttled by `core.rate_limit`.
+        max_pending (int): Unfinished (queued or running) jobs accepted
+                           before `submit` raises `JobQueueFull`.
+
+    Each runner gets a random `runner_id`, recorded on its jobs (process ids
+    can't tell runs apart: in a container the app is PID 1 after every
+    restart). A background thread refreshes `updated_at` on the runner's
+    unfinished jobs every JOBS_HEARTBEAT_INTERVAL seconds, and marks other
+    runners' unfinished jobs that haven't been refreshed for
+    JOBS_LEASE_TIMEOUT seconds as interrupted. Runners in other processes
+    that are still alive keep their jobs.
+    """
+
+    def __init__(
+            self,
+            max_workers: int = JOBS_MAX_WORKERS,
+            max_pending: int = JOBS_MAX_PENDING,
+            db_path: Path = JOBS_DB_PATH
+        ):
+        self.db_path = db_path
+        self.max_pending = max(1, max_pending)
+        self.runner_id = uuid.uuid4().hex
+        self._executor = ThreadPoolExecutor(max_workers=max(1, max_workers), thread_name_prefix="pipeline-job")
+        self._progress: dict[str, dict] = {}
+        self._progress_lock = threading.Lock()
+        # In-flight jobs by job_key, for coalescing identical submissions
+        self._inflight: dict[str, str] = {}
+        self._inflight_lock = threading.Lock()
+        self._mark_interrupted()
+        self._stopped = threading.Event()
+        self._heartbeat = threading.Thread(target=self._run_heartbeat, name="job-heartbeat", daemon=True)
+        self._heartbeat.start()
+
+    def _update(self, job_id: str, **fields) -> None:
+        fields["updated_at"] = time.time()
+        columns = ", ".join(f"{name} = ?" for name in fields)
+        with _db_lock, _connect(self.db_path) as conn:
+            conn.execute(f"UPDATE jobs SET {columns} WHERE job_id = ?", (*fields.values(), job_id))
+
+    def _renew_lease(self) -> None:
+        """Refresh `updated_at` on this runner's unfinished jobs."""
+        with _db_lock, _connect(self.db_path) as conn:
+            conn.execute(
+                "UPDATE jobs SET updated_at = ? WHERE runner_id = ? AND status IN (?, ?)",
+                (time.time(), self.runner_id, QUEUED, RUNNING),
+            )
+
+    def _mark_interrupted(self) -> None:
+        """Mark other runners' unfinished jobs whose lease ran out (see the class docstring) as interrupted."""
+        now = time.time()
+        with _db_lock, _connect(self.db_path) as conn:
+            orphaned = conn.execute(
+                "UPDATE jobs SET status = ?, finished_at = ?, error = ? "
+                "WHERE status IN (?, ?) AND (runner_id IS NULL OR runner_id != ?) "
+                "AND COALESCE(updated_at, started_at, created_at) < ?",
+                (
+                    INTERRUPTED, now, "The process running this job exited",
+                    QUEUED, RUNNING, self.runner_id, now - JOBS_LEASE_TIMEOUT,
+                ),
+            ).rowcount
+        if orphaned:
+            logger.warning(f"Marked {orphaned} unfinished jobs from an exited process as interrupted")
+
+    def _run_heartbeat(self) -> None:
+        while not self._stopped.wait(JOBS_HEARTBEAT_INTERVAL):
+            try:
+                self._renew_lease()
+                self._mark_interrupted()
+            except sqlite3.Error as e:
+                logger.warning(f"Job lease refresh failed: {e}")
+
+    def submit(self, coalesce: bool = True, **params) -> str:
+        """
+        Queue a pipeline run and return its job id immediately.
+
+        Args:
+            coalesce (bool): Return the id of an in-flight job with the same
+                             parameters instead of starting another one.
+            **params: Keyword arguments for `run_learning_pipeline` (other
+                      than `api_key` and `on_question`).
+
+        Returns:
+            str: The job id, for `get_job`.
+
+        Raises:
+            JobQueueFull: If `max_pending` jobs are already unfinished.
+        """
+        key = job_key(params)
+        with self._inflight_lock:
+            if coalesce and key in self._inflight:
+                job_id = self._inflight[key]
+                logger.info(f"Coalesced submission onto in-flight job {job_id}")
+                return job_id
+            if len(self._inflight) >= self.max_pending:
+                raise JobQueueFull(f"{len(self._inflight)} jobs are already queued or running")
+
+            job_id = uuid.uuid4().hex[:12]
+            now = time.time()
+            with _db_lock, _connect(self.db_path) as conn:
+                conn.execute(
+                    "INSERT INTO jobs (job_id, status, params_json, source_id, worker_pid, runner_id, created_at, updated_at) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                    (
+                        job_id, QUEUED, json.dumps(params), params.get("source_id"),
+                        os.getpid(), self.runner_id, now, now,
+                    ),
+                )
+            self._inflight[key] = job_id
+
+        self._executor.submit(self._run, job_id, key, params)
+        logger.info(f"Submitted job {job_id}: {params.get('input_type')} {params.get('youtube_url') or params.get('source_id') or ''}")
+        return job_id
+
+    def pending(self) -> int:
+        """Number of queued or running jobs."""
+        with self._inflight_lock:
+            return len(self._inflight)
+
+    def _save_progress(self, job_id: str, stage: Optional[str] = None) -> None:
+        with self._progress_lock:
+            progress = json.dumps(self._progress[job_id])
+        if stage:
+            self._update(job_id, progress=progress, stage=stage)
+        else:
+            self._update(job_id, progress=progress)
+
+    def _on_span(self, job_id: str, event: str, span) -> None:
+        with self._progress_lock:
+            stages = self._progress[job_id]["stages"]
+            if event == "start":
+                stages[span.name] = {"status": RUNNING}
+            else:
+                stages[span.name] = {
+                    "status": "skipped" if span.attrs.get("skipped") else ("done" if span.status == "ok" else FAILED),
+                    "duration_seconds": round(span.duration, 3),
+                }
+        self._save_progress(job_id, stage=span.name if event == "start" else None)
+
+    def _on_question(self, job_id: str, item: dict) -> None:
+        with self._progress_lock:
+            self._progress[job_id]["questions"].append(item.get("question", ""))
+        self._save_progress(job_id)
+
+    def _run(self, job_id: str, key: str, params: dict) -> None:
+        # Imported here so importing the job module (e.g. to poll) stays cheap
+        from core.pipeline import run_learning_pipeline
+
+        with self._progress_lock:
+            self._progress[job_id] = {"stages": {}, "questions": []}
+        self._update(job_id, status=RUNNING, started_at=time.time())
+
+        try:
+            with log_context(job_id=job_id), observe_spans(lambda event, span: self._on_span(job_id, event, span)):
+                result = run_learning_pipeline(
+                    api_key=OPENAI_API_KEY,
+                    on_question=lambda item: self._on_question(job_id, item),
+                    **params,
+                )
+            summary = {
+                "source_id": result["source_id"],
+                "questions": len(result["quiz_data"]),
+                "anki": result["anki"],
+                "stages_run": result["stages_run"],
+                "metrics": result["metrics"],
+            }
+            self._update(
+                job_id, status=SUCCEEDED, source_id=result["source_id"], stage=None,
+                result_json=json.dumps(summary, default=str), finished_at=time.time(),
+            )
+            logger.info(f"Job {job_id} finished for {result['source_id']}")
+        except Exception as e:
+            logger.exception(f"Job {job_id} failed: {e}")
+            self._update(job_id, status=FAILED, error=f"{type(e).__name__}: {e}", finished_at=time.time())
+        finally:
+            with self._progress_lock:
+                self._progress.pop(job_id, None)
+            with self._inflight_lock:
+                self._inflight.pop(key, None)
+
+    def shutdown(self, wait: bool = True) -> None:
+        self._executor.shutdown(wait=wait)
+        self._stopped.set()
+
+
+_runner: Optional[JobRunner] = None
+_runner_lock = threading.Lock()
+
+def get_job_runner() -> JobRunner:
+    """The process-wide job runner, created on first use."""
+    global _runner
+    with _runner_lock:
+        if _runner is None:
+            _runner = JobRunner()
+        return _runner
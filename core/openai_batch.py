@@ -0,0 +1,201 @@
+"""
+Chat completions through the OpenAI Batch API.
+
+Requests are written to a JSONL file, uploaded, and run as one batch job,
+which OpenAI completes asynchronously (within the completion window) at a
+discount and outside the per-minute rate limits used by interactive runs.
+`run_batch` submits, polls and returns the responses by `custom_id`; items
+that fail are reported rather than raised, so callers can retry them one
+at a time.
+
+Point OPENAI_BASE_URL at `utils.fake_openai` to run batches offline.
+"""
+# Base libraries
+import json
+import time
+import uuid
+from pathlib import Path
+from typing import Optional
+
+# Local modules
+from utils.logger import get_logger
+from config.paths import OPENAI_BATCHES_DIR
+from config.variable import (
+    OPENAI_BATCH_COMPLETION_WINDOW,
+    OPENAI_BATCH_POLL_INTERVAL,
+    OPENAI_BATCH_TIMEOUT,
+    OPENAI_BATCH_MAX_REQUESTS
+)
+from core.openai_client import get_openai_client, completion_body
+
+logger = get_logger(__name__)
+
+BATCH_ENDPOINT = "/v1/chat/completions"
+FINISHED_BATCH_STATES = ("completed", "failed", "expired", "cancelled")
+
+def build_batch_request(
+        custom_id: str,
+        prompt: str,
+        model: str = "gpt-4o",
+        temperature: float = 0.7,
+        response_format: Optional[dict] = None
+    ) -> dict:
+    """One line of a batch input file: the same request `call_openai_api` sends."""
+    return {
+        "custom_id": custom_id,
+        "method": "POST",
+        "url": BATCH_ENDPOINT,
+        "body": completion_body(prompt, model, temperature, response_format),
+    }
+
+def write_batch_file(requests: list[dict], path: Path) -> Path:
+    """Write batch requests as JSONL."""
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, "w", encoding="utf-8") as file:
+        for request in requests:
+            file.write(json.dumps(request, ensure_ascii=False) + "\n")
+    return path
+
+def submit_batch(api_key: str, path: Path, metadata: Optional[dict] = None) -> str:
+    """
+    Upload a batch input file and start the batch.
+
+    Returns:
+        str: The batch id, for `wait_for_batch`.
+    """
+    client = get_openai_client(api_key)
+    with open(path, "rb") as file:
+        uploaded = client.files.create(file=file, purpose="batch")
+    batch = client.batches.create(
+        input_file_id=uploaded.id,
+        endpoint=BATCH_ENDPOINT,
+        completion_window=OPENAI_BATCH_COMPLETION_WINDOW,
+        metadata=metadata,
+    )
+    logger.info(f"Submitted OpenAI batch {batch.id} from {path}")
+    return batch.id
+
+def wait_for_batch(
+        api_key: str,
+        batch_id: str,
+        poll_interval: float = OPENAI_BATCH_POLL_INTERVAL,
+        timeout: float = OPENAI_BATCH_TIMEOUT
+    ) -> dict:
+    """
+    Poll a batch until it reaches a final state.
+
+    Returns:
+        dict: The batch object (as from `to_dict()`).
+
+    Raises:
+        TimeoutError: If the batch is still running after `timeout` seconds.
+    """
+    client = get_openai_client(api_key)
+    deadline = time.monotonic() + timeout
+    last_status = None
+    while True:
+        batch = client.batches.retrieve(batch_id).to_dict()
+        if batch["status"] != last_status:
+            counts = batch.get("request_counts") or {}
+            logger.info(
+                f"OpenAI batch {batch_id} {batch['status']}: "
+                f"{counts.get('completed', 0)}/{counts.get('total', 0)} done, {counts.get('failed', 0)} failed"
+            )
+            last_status = batch["status"]
+        if batch["status"] in FINISHED_BATCH_STATES:
+            return batch
+        if time.monotonic() >= deadline:
+            raise TimeoutError(f"OpenAI batch {batch_id} still {batch['status']} after {timeout:.0f}s")
+        time.sleep(poll_interval)
+
+def cancel_batch(api_key: str, batch_id: str) -> None:
+    """Cancel a batch, logging rather than raising if that fails too."""
+    try:
+        get_openai_client(api_key).batches.cancel(batch_id)
+        logger.warning(f"Cancelled OpenAI batch {batch_id}")
+    except Exception as e:
+        logger.warning(f"Could not cancel OpenAI batch {batch_id}: {e}")
+
+def _read_jsonl_file(api_key: str, file_id: Optional[str]) -> list[dict]:
+    if not file_id:
+        return []
+    content = get_openai_client(api_key).files.content(file_id).text
+    return [json.loads(line) for line in content.splitlines() if line.strip()]
+
+def read_batch_results(api_key: str, batch: dict) -> dict[str, dict]:
+    """
+    Collect the outcome of every request in a finished batch.
+
+    Returns:
+        dict: {custom_id: {'response': completion dict or None, 'error': str or None}}
+    """
+    results = {}
+    for line in _read_jsonl_file(api_key, batch.get("output_file_id")) + _read_jsonl_file(api_key, batch.get("error_file_id")):
+        response = line.get("response") or {}
+        if line.get("error") or response.get("status_code") != 200:
+            error = line.get("error") or (response.get("body") or {}).get("error") or {}
+            message = error.get("message") if isinstance(error, dict) else str(error)
+            results[line["custom_id"]] = {
+                "response": None,
+                "error": message or f"HTTP {response.get('status_code')}",
+            }
+        else:
+            results[line["custom_id"]] = {"response": response["body"], "error": None}
+    return results
+
+def run_batch(
+        api_key: str,
+        requests: list[dict],
+        name: Optional[str] = None,
+        poll_interval: float = OPENAI_BATCH_POLL_INTERVAL,
+        timeout: float = OPENAI_BATCH_TIMEOUT,
+        max_requests: int = OPENAI_BATCH_MAX_REQUESTS
+    ) -> dict[str, dict]:
+    """
+    Run requests (from `build_batch_request`) through the Batch API and
+    wait for their results.
+
+    More than `max_requests` requests are split into several batches, all
+    submitted before any is polled. Input files are kept under
+    `OPENAI_BATCHES_DIR` for inspection.
+
+    Returns:
+        dict: {custom_id: {'response', 'error'}} for every request. Requests
+              the batch did not answer (failed, expired or cancelled batches)
+              are included with an error.
+
+    Raises:
+        TimeoutError: If a batch is still running after `timeout` seconds.
+        openai.OpenAIError: If submitting or polling fails.
+        Either way the batches not yet finished are cancelled first.
+    """
+    if not requests:
+        return {}
+    name = name or f"batch_{time.strftime('%Y%m%dT%H%M%S')}_{uuid.uuid4().hex[:6]}"
+    max_requests = max(1, max_requests)
+
+    batch_ids = []
+    finished = set()
+    results = {}
+    try:
+        for part, start in enumerate(range(0, len(requests), max_requests)):
+            path = write_batch_file(requests[start:start + max_requests], OPENAI_BATCHES_DIR / f"{name}_{part}.jsonl")
+            batch_ids.append(submit_batch(api_key, path, metadata={"name": name, "part": str(part)}))
+
+        for batch_id in batch_ids:
+            batch = wait_for_batch(api_key, batch_id, poll_interval, timeout)
+            finished.add(batch_id)
+            results.update(read_batch_results(api_key, batch))
+    except Exception:
+        # Don't leave batches running (and billed) that nobody will read
+        for batch_id in batch_ids:
+            if batch_id not in finished:
+                cancel_batch(api_key, batch_id)
+        raise
+
+    for request in requests:
+        results.setdefault(request["custom_id"], {"response": None, "error": "No result returned by the batch"})
+    failed = sum(1 for result in results.values() if result["error"])
+    logger.info(f"OpenAI batch {name}: {len(results) - failed} succeeded, {failed} failed")
+    return results
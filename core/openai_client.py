@@ -1,49 +1,438 @@
 # Base libraries
+import asyncio
+import random
+import threading
 import time
+import weakref
 from datetime import datetime
+from email.utils import parsedate_to_datetime
 import json
 from pathlib import Path
 from typing import Optional
 
-# 3rd party libraries
-from openai import OpenAI
-
 # Local modules
 from utils.logger import get_logger
+from utils.metrics import add_to_span, record_openai_usage
+from config.variable import (
+    OPENAI_CACHE_ENABLED,
+    OPENAI_MAX_CONNECTIONS,
+    OPENAI_MAX_KEEPALIVE_CONNECTIONS,
+    OPENAI_KEEPALIVE_EXPIRY,
+    OPENAI_TIMEOUT,
+    OPENAI_BACKOFF_BASE,
+    OPENAI_BACKOFF_MAX
+)
+from core.response_cache import (
+    make_cache_key,
+    get_cached_response,
+    store_response,
+    record_bypass
+)
 
 logger = get_logger(__name__)
 
+SYSTEM_MESSAGE = "You are a helpful assistant."
+
+class OpenAIRetryError(RuntimeError):
+    """Raised when an OpenAI request still fails after all retries."""
+
+    def __init__(self, message: str, attempts: int, last_error: Optional[Exception] = None):
+        super().__init__(message)
+        self.attempts = attempts
+        self.last_error = last_error
+
+_clients: dict = {}
+_async_clients: "weakref.WeakKeyDictionary" = weakref.WeakKeyDictionary()
+_clients_lock = threading.Lock()
+
+# httpx and the openai SDK are imported on first use: together they are most
+# of the pipeline's import time, and cache hits never need them.
+
+def _http_limits() -> "httpx.Limits":
+    import httpx
+
+    return httpx.Limits(
+        max_connections=OPENAI_MAX_CONNECTIONS,
+        max_keepalive_connections=OPENAI_MAX_KEEPALIVE_CONNECTIONS,
+        keepalive_expiry=OPENAI_KEEPALIVE_EXPIRY,
+    )
+
+def _http_timeout() -> "httpx.Timeout":
+    import httpx
+
+    return httpx.Timeout(OPENAI_TIMEOUT, connect=10.0)
+
+def get_openai_client(api_key: str) -> "OpenAI":
+    """
+    Return the process-wide OpenAI client for an API key.
+
+    The client is built once with a pooled, keep-alive HTTP transport so
+    repeated calls reuse warm connections instead of a new TLS handshake
+    each time. SDK-level retries are disabled; retries happen here.
+    """
+    import httpx
+    from openai import OpenAI
+
+    with _clients_lock:
+        client = _clients.get(api_key)
+        if client is None:
+            client = OpenAI(
+                api_key=api_key,
+                max_retries=0,
+                http_client=httpx.Client(limits=_http_limits(), timeout=_http_timeout()),
+            )
+            _clients[api_key] = client
+            logger.info("Created pooled OpenAI client")
+        return client
+
+def get_async_openai_client(api_key: str) -> "AsyncOpenAI":
+    """
+    Return the AsyncOpenAI client for an API key on the running event loop.
+
+    Async connection pools are bound to the loop that created them, so one
+    client is kept per loop and dropped when the loop is garbage collected.
+    """
+    import httpx
+    from openai import AsyncOpenAI
+
+    loop = asyncio.get_running_loop()
+    with _clients_lock:
+        loop_clients = _async_clients.setdefault(loop, {})
+        client = loop_clients.get(api_key)
+        if client is None:
+            client = AsyncOpenAI(
+                api_key=api_key,
+                max_retries=0,
+                http_client=httpx.AsyncClient(limits=_http_limits(), timeout=_http_timeout()),
+            )
+            loop_clients[api_key] = client
+            logger.info("Created pooled AsyncOpenAI client")
+        return client
+
+def _is_retryable(error: Exception) -> bool:
+    """Rate limits, timeouts, connection errors and 5xx responses are retried."""
+    from openai import APIConnectionError, APIStatusError, APITimeoutError, RateLimitError
+
+    if isinstance(error, (RateLimitError, APIConnectionError, APITimeoutError)):
+        return True
+    if isinstance(error, APIStatusError):
+        return error.status_code == 429 or error.status_code >= 500
+    return False
+
+def _retry_after_seconds(error: Exception) -> Optional[float]:
+    """Read the server's Retry-After hint from a 429 response, if any."""
+    response = getattr(error, "response", None)
+    if response is None or getattr(response, "status_code", None) != 429:
+        return None
+
+    headers = response.headers
+    retry_after_ms = headers.get("retry-after-ms")
+    if retry_after_ms:
+        try:
+            return float(retry_after_ms) / 1000
+        except ValueError:
+            pass
+
+    retry_after = headers.get("retry-after")
+    if not retry_after:
+        return None
+    try:
+        return float(retry_after)
+    except ValueError:
+        try:
+            return max(0.0, parsedate_to_datetime(retry_after).timestamp() - time.time())
+        except (TypeError, ValueError):
+            return None
+
+def _backoff_delay(attempt: int, error: Exception) -> float:
+    """
+    Seconds to wait before the next attempt: the server's Retry-After when
+    given, otherwise exponential backoff with full jitter.
+    """
+    retry_after = _retry_after_seconds(error)
+    if retry_after is not None:
+        return min(retry_after, OPENAI_BACKOFF_MAX)
+    ceiling = min(OPENAI_BACKOFF_MAX, OPENAI_BACKOFF_BASE * (2 ** (attempt - 1)))
+    return random.uniform(0, ceiling)
+
+def build_messages(prompt: str) -> list[dict]:
+    return [
+        {"role": "system", "content": SYSTEM_MESSAGE},
+        {"role": "user", "content": prompt}
+    ]
+
+def completion_body(
+        prompt: str,
+        model: str = "gpt-4o",
+        temperature: float = 0.7,
+        response_format: Optional[dict] = None
+    ) -> dict:
+    """Chat completion parameters; `response_format` is only sent when given."""
+    body = {
+        "model": model,
+        "messages": build_messages(prompt),
+        "temperature": temperature,  # controls creativity
+    }
+    if response_format:
+        body["response_format"] = response_format
+    return body
+
 def call_openai_api(
         api_key: str,
         prompt: str,
         model: str = "gpt-4o",
         temperature: float = 0.7,
-        max_retries: int = 3
-    ) -> str:
+        max_retries: int = 3,
+        response_format: Optional[dict] = None
+    ) -> "ChatCompletion":
     """
-    Send a prompt to OpenAI and return the response text
+    Send a prompt to OpenAI and return the response.
+
+    Args:
+        response_format (dict, optional): e.g. a JSON schema for structured output.
+
+    Raises:
+        OpenAIRetryError: If every attempt fails with a retryable error.
     """
-    client = OpenAI(api_key=api_key)
+    client = get_openai_client(api_key)
+    # At least one attempt, so a response or an error always comes back
+    max_retries = max(1, max_retries)
 
     for attempt in range(1, max_retries + 1):
         try:
             logger.info("Sending request to OpenAI...")
             response = client.chat.completions.create(
-            model=model,
-            messages=[
-                {"role": "system", "content": "You are a helpful assistant."},
-                {"role": "user", "content": prompt}
-            ],
-            temperature=temperature  # controls creativity
+                **completion_body(prompt, model, temperature, response_format)
             )
             logger.info(f"OpenAI response received successfully on attempt {attempt}")
             return response
         
         except Exception as e:
+            if not _is_retryable(e):
+                raise
             logger.warning(f"OpenAI call failed (attempt {attempt}): {e}")
-            time.sleep(2 * attempt) # exponential backoff
-    
+            add_to_span("retries")
+            if attempt == max_retries:
+                raise OpenAIRetryError(
+                    f"OpenAI call failed after {max_retries} attempts: {e}",
+                    attempts=attempt,
+                    last_error=e
+                ) from e
+            time.sleep(_backoff_delay(attempt, e))
+
+async def call_openai_api_async(
+        api_key: str,
+        prompt: str,
+        model: str = "gpt-4o",
+        temperature: float = 0.7,
+        max_retries: int = 3,
+        response_format: Optional[dict] = None
+    ):
+    """
+    Async version of `call_openai_api` on a pooled `AsyncOpenAI` client.
+
+    Retries rate limits, timeouts and server errors with exponential
+    backoff and jitter, honouring Retry-After on 429 responses.
+
+    Raises:
+        OpenAIRetryError: If every attempt fails with a retryable error.
+    """
+    client = get_async_openai_client(api_key)
+    max_retries = max(1, max_retries)
+
+    for attempt in range(1, max_retries + 1):
+        try:
+            logger.info("Sending async request to OpenAI...")
+            response = await client.chat.completions.create(
+                **completion_body(prompt, model, temperature, response_format)
+            )
+            logger.info(f"OpenAI async response received successfully on attempt {attempt}")
+            return response
+
+        except Exception as e:
+            if not _is_retryable(e):
+                raise
+            logger.warning(f"OpenAI async call failed (attempt {attempt}): {e}")
+            add_to_span("retries")
+            if attempt == max_retries:
+                raise OpenAIRetryError(
+                    f"OpenAI call failed after {max_retries} attempts: {e}",
+                    attempts=attempt,
+                    last_error=e
+                ) from e
+            await asyncio.sleep(_backoff_delay(attempt, e))
+
+def call_openai_api_cached(
+        api_key: str,
+        prompt: str,
+        question_count: Optional[int] = None,
+        model: str = "gpt-4o",
+        temperature: float = 0.7,
+        max_retries: int = 3,
+        bypass_cache: bool = False,
+        response_format: Optional[dict] = None
+    ) -> dict:
+    """
+    Same as `call_openai_api`, but served from the local response cache
+    when an identical request (prompt, model, temperature, question count,
+    response format) has already been answered.
 
+    Args:
+        question_count (int, optional): Part of the cache key.
+        bypass_cache (bool): Skip the lookup and force a fresh completion.
+                             The fresh response still refreshes the cache.
+        response_format (dict, optional): Passed to `call_openai_api`.
+
+    Returns:
+        dict: The response as a plain dict (as from `response.to_dict()`).
+
+    Raises:
+        OpenAIRetryError: If the request fails or returns nothing.
+    """
+    key = make_cache_key(prompt, model, temperature, question_count, response_format)
+    use_cache = OPENAI_CACHE_ENABLED and not bypass_cache
+
+    if use_cache:
+        cached = get_cached_response(key)
+        if cached is not None:
+            add_to_span("cache_hits")
+            return cached
+        add_to_span("cache_misses")
+    else:
+        record_bypass()
+
+    response = call_openai_api(
+        api_key=api_key,
+        prompt=prompt,
+        model=model,
+        temperature=temperature,
+        max_retries=max_retries,
+        response_format=response_format
+    )
+    if response is None:
+        raise OpenAIRetryError("OpenAI returned no response", attempts=max_retries)
+    response_dict = response.to_dict()
+    record_openai_usage(response_dict.get("usage"), model)
+    if OPENAI_CACHE_ENABLED:
+        store_response(key, response_dict)
+
+    # Callers may annotate the dict (e.g. save_raw_open_ai_response)
+    return json.loads(json.dumps(response_dict))
+
+class CompletionStream:
+    """
+    Iterable over the text deltas of a streamed chat completion.
+
+    Identical requests are served from the response cache (as one delta).
+    Retries only happen before the first delta arrives; once text has been
+    handed to the caller a failure is raised as-is. After iteration,
+    `response_dict` holds the full response in the same shape as
+    `response.to_dict()`, and fresh responses are written to the cache.
+
+    Args:
+        api_key (str): OpenAI API key.
+        prompt (str): The full prompt.
+        question_count (int, optional): Part of the cache key.
+        model (str): Model name.
+        temperature (float): Sampling temperature.
+        max_retries (int): Attempts before giving up.
+        bypass_cache (bool): Skip the cache lookup.
+        response_format (dict, optional): e.g. a JSON schema for structured output.
+    """
+
+    def __init__(
+            self,
+            api_key: str,
+            prompt: str,
+            question_count: Optional[int] = None,
+            model: str = "gpt-4o",
+            temperature: float = 0.7,
+            max_retries: int = 3,
+            bypass_cache: bool = False,
+            response_format: Optional[dict] = None
+        ):
+        self.api_key = api_key
+        self.prompt = prompt
+        self.question_count = question_count
+        self.model = model
+        self.temperature = temperature
+        self.max_retries = max(1, max_retries)
+        self.bypass_cache = bypass_cache
+        self.response_format = response_format
+        self.response_dict: Optional[dict] = None
+        self.from_cache = False
+
+    def __iter__(self):
+        key = make_cache_key(
+            self.prompt, self.model, self.temperature, self.question_count, self.response_format
+        )
+        if OPENAI_CACHE_ENABLED and not self.bypass_cache:
+            cached = get_cached_response(key)
+            if cached is not None:
+                add_to_span("cache_hits")
+                self.from_cache = True
+                self.response_dict = cached
+                yield cached["choices"][0]["message"]["content"]
+                return
+            add_to_span("cache_misses")
+        else:
+            record_bypass()
+
+        client = get_openai_client(self.api_key)
+        parts: list[str] = []
+        response_id, finish_reason, usage = None, None, None
+
+        for attempt in range(1, self.max_retries + 1):
+            try:
+                logger.info("Streaming request to OpenAI...")
+                stream = client.chat.completions.create(
+                    **completion_body(self.prompt, self.model, self.temperature, self.response_format),
+                    stream=True,
+                    stream_options={"include_usage": True}
+                )
+                for chunk in stream:
+                    response_id = chunk.id
+                    if getattr(chunk, "usage", None):
+                        usage = chunk.usage.to_dict()
+                    if not chunk.choices:
+                        continue
+                    choice = chunk.choices[0]
+                    finish_reason = choice.finish_reason or finish_reason
+                    delta = choice.delta.content
+                    if delta:
+                        parts.append(delta)
+                        yield delta
+                logger.info(f"OpenAI stream completed on attempt {attempt}")
+                break
+
+            except Exception as e:
+                if parts or not _is_retryable(e):
+                    raise
+                logger.warning(f"OpenAI stream failed (attempt {attempt}): {e}")
+                add_to_span("retries")
+                if attempt == self.max_retries:
+                    raise OpenAIRetryError(
+                        f"OpenAI stream failed after {self.max_retries} attempts: {e}",
+                        attempts=attempt,
+                        last_error=e
+                    ) from e
+                time.sleep(_backoff_delay(attempt, e))
+
+        self.response_dict = {
+            "id": response_id,
+            "object": "chat.completion",
+            "model": self.model,
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": "".join(parts)},
+                "finish_reason": finish_reason,
+            }],
+            "usage": usage,
+        }
+        record_openai_usage(usage, self.model)
+        if OPENAI_CACHE_ENABLED:
+            store_response(key, self.response_dict)
+        self.response_dict = json.loads(json.dumps(self.response_dict))
 
 def save_raw_open_ai_response(
         response, 
@@ -0,0 +1,430 @@
+"""
+Study packets: one combined PDF (and Anki deck) for many sources.
+
+The packet has a table of contents, a questions section per source and a
+shared answer key. Each source's questions and answers are laid out on their
+own into small PDF "fragments", cached by the quiz content, and the packet is
+assembled by copying fragment pages straight into the output file. Only one
+source is ever held as flowables, and only one fragment's pages in memory,
+at a time; a source whose quiz did not change is not laid out again.
+"""
+# Base libraries
+import argparse
+import json
+import os
+import re
+import sys
+import threading
+from pathlib import Path
+from typing import BinaryIO, Iterable, Optional
+from xml.sax.saxutils import escape
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+
+# 3rd party packages
+from pypdf import PdfReader
+from pypdf.generic import (
+    ArrayObject, DictionaryObject, IndirectObject, NameObject, NumberObject, TextStringObject
+)
+from reportlab.platypus import Paragraph, Spacer, Table, TableStyle
+
+# Local modules
+from utils.logger import get_logger, setup_logging
+from config.paths import PROCESSED_OPENAI_DIR, PDF_FRAGMENTS_DIR, PACKETS_DIR, METADATA_DIR
+from core.pdf_generator import get_pdf_styles, write_pdf
+from core.stage_manifest import fingerprint, file_digest
+from core.anki_generator import build_note, format_answer, deliver_notes, summarize_results
+
+logger = get_logger(__name__)
+
+# Bump when the fragment layout changes so cached fragments are re-rendered
+FRAGMENT_LAYOUT_VERSION = "1"
+
+_UNSAFE_FILE_CHARS = re.compile(r"[^\w .-]+")
+
+def packet_file_stem(packet_name: str) -> str:
+    """
+    The packet name reduced to a safe file name (no path separators or
+    leading dots), so a name like '../x' can't write outside PACKETS_DIR.
+    """
+    stem = _UNSAFE_FILE_CHARS.sub("_", packet_name).strip(" ._")[:100]
+    return stem or "packet"
+
+def list_quiz_sources(quiz_dir: Path = PROCESSED_OPENAI_DIR) -> list[str]:
+    """Source ids of every parsed quiz on disk, oldest first."""
+    return [path.stem for path in sorted(Path(quiz_dir).glob("*.json"), key=lambda p: p.stat().st_mtime)]
+
+def source_title(source_id: str) -> str:
+    """The video title from the stored metadata, or the source id for text sources."""
+    metadata_path = METADATA_DIR / f"{source_id}.json"
+    if metadata_path.exists():
+        try:
+            record = json.loads(metadata_path.read_text(encoding="utf-8"))
+            if record.get("title"):
+                return record["title"]
+        except (OSError, ValueError):
+            pass
+    return source_id
+
+def _question_flowables(title: str, quiz: list[dict]) -> list:
+    styles = get_pdf_styles()
+    flowables = [Paragraph(escape(title), styles["Heading1"]), Spacer(1, 12)]
+    for i, d in enumerate(quiz, start=1):
+        flowables.append(Paragraph(f"{i}. {escape(str(d['question']))}", styles["Normal"]))
+        flowables.append(Spacer(1, 84))  # add extra blank space for writing
+    return flowables
+
+def _answer_flowables(title: str, quiz: list[dict]) -> list:
+    styles = get_pdf_styles()
+    flowables = [Paragraph(f"Answer Key: {escape(title)}", styles["Heading2"]), Spacer(1, 8)]
+    for i, d in enumerate(quiz, start=1):
+        flowables.append(Paragraph(f"{i}. {escape(str(d['question']))}", styles["Normal"]))
+        flowables.append(Paragraph(f"Answer: {escape(str(d['answer']))}", styles["Italic"]))
+        flowables.append(Paragraph(f"Explanation: {escape(str(d['explanation']))}", styles["Normal"]))
+        flowables.append(Spacer(1, 12))
+    return flowables
+
+def render_source_fragments(
+        source_id: str,
+        title: Optional[str] = None,
+        quiz_dir: Path = PROCESSED_OPENAI_DIR,
+        fragments_dir: Path = PDF_FRAGMENTS_DIR
+    ) -> tuple[Path, Path, bool]:
+    """
+    Lay out one source's questions and answers as two PDF fragments, reusing
+    the cached fragments if the quiz and title are unchanged.
+
+    Returns:
+        tuple: (questions_path, answers_path, reused)
+    """
+    quiz_path = Path(quiz_dir) / f"{source_id}.json"
+    if not quiz_path.exists():
+        raise FileNotFoundError(f"No parsed quiz for {source_id} at {quiz_path}")
+
+    title = title or source_title(source_id)
+    fp = fingerprint("packet-fragment", FRAGMENT_LAYOUT_VERSION, file_digest(quiz_path), title)[:16]
+    fragments_dir = Path(fragments_dir)
+    questions_path = fragments_dir / f"{source_id}.{fp}.questions.pdf"
+    answers_path = fragments_dir / f"{source_id}.{fp}.answers.pdf"
+
+    if questions_path.exists() and answers_path.exists():
+        return questions_path, answers_path, True
+
+    quiz = json.loads(quiz_path.read_text(encoding="utf-8"))
+    write_pdf(_question_flowables(title, quiz), questions_path)
+    write_pdf(_answer_flowables(title, quiz), answers_path)
+
+    # Drop fragments rendered from older versions of this quiz
+    for stale in fragments_dir.glob(f"{source_id}.*.pdf"):
+        if stale not in (questions_path, answers_path):
+            stale.unlink(missing_ok=True)
+
+    return questions_path, answers_path, False
+
+def _page_count(path: Path) -> int:
+    return len(PdfReader(str(path)).pages)
+
+class _StreamingPdfWriter:
+    """
+    Concatenates PDFs into an open file, writing each copied object as soon
+    as it is read, so memory holds one source file's objects rather than
+    the whole packet (pypdf's PdfWriter keeps every page until `write`).
+    Only the page list and the bookmarks are kept until `close`.
+    """
+
+    def __init__(self, file: BinaryIO):
+        self.file = file
+        # Byte offset of each object, by object number (0 is the free-list head)
+        self._offsets: list[Optional[int]] = [0]
+        self._page_refs: list[IndirectObject] = []
+        self._pages_root = self._reserve()
+        file.write(b"%PDF-1.7\n%\xe2\xe3\xcf\xd3\n")
+
+    @property
+    def page_count(self) -> int:
+        return len(self._page_refs)
+
+    def _reserve(self) -> IndirectObject:
+        self._offsets.append(None)
+        return IndirectObject(len(self._offsets) - 1, 0, None)
+
+    def _write_object(self, ref: IndirectObject, obj) -> None:
+        self._offsets[ref.idnum] = self.file.tell()
+        self.file.write(f"{ref.idnum} 0 obj\n".encode("ascii"))
+        obj.write_to_stream(self.file)
+        self.file.write(b"\nendobj\n")
+
+    def append(self, path: Path) -> int:
+        """Copy every page of a PDF; returns the index of its first page."""
+        first_page = self.page_count
+        reader = PdfReader(str(path))
+        # Source object number -> reference in the output
+        refs: dict[int, IndirectObject] = {}
+        todo: list[IndirectObject] = []
+
+        def renumber(obj):
+            if isinstance(obj, IndirectObject):
+                if obj.idnum not in refs:
+                    refs[obj.idnum] = self._reserve()
+                    todo.append(obj)
+                return refs[obj.idnum]
+            if isinstance(obj, DictionaryObject):
+                for key, value in list(dict.items(obj)):
+                    dict.__setitem__(obj, key, renumber(value))
+            elif isinstance(obj, ArrayObject):
+                for i, value in enumerate(list.__iter__(obj)):
+                    list.__setitem__(obj, i, renumber(value))
+            return obj
+
+        for page in reader.pages:
+            self._page_refs.append(renumber(page.indirect_reference))
+            while todo:
+                source = todo.pop()
+                obj = source.get_object()
+                if obj.get("/Type") == "/Page":
+                    # Inherited attributes are already on the page (pypdf copies them down)
+                    dict.pop(obj, "/Parent", None)
+                    renumber(obj)
+                    dict.__setitem__(obj, NameObject("/Parent"), self._pages_root)
+                else:
+                    renumber(obj)
+                self._write_object(refs[source.idnum], obj)
+        return first_page
+
+    def _write_outline(self, items: list[tuple], parent: IndirectObject) -> tuple:
+        """Write (title, page index, children) bookmarks; returns (first, last, count)."""
+        refs = [self._reserve() for _ in items]
+        count = len(items)
+        for i, (title, page, children) in enumerate(items):
+            item = DictionaryObject({
+                NameObject("/Title"): TextStringObject(title),
+                NameObject("/Parent"): parent,
+                NameObject("/Dest"): ArrayObject([self._page_refs[page], NameObject("/Fit")]),
+            })
+            if i:
+                item[NameObject("/Prev")] = refs[i - 1]
+            if i + 1 < len(items):
+                item[NameObject("/Next")] = refs[i + 1]
+            if children:
+                first, last, child_count = self._write_outline(children, refs[i])
+                item.update({
+                    NameObject("/First"): first,
+                    NameObject("/Last"): last,
+                    NameObject("/Count"): NumberObject(child_count),
+                })
+                count += child_count
+            self._write_object(refs[i], item)
+        return refs[0], refs[-1], count
+
+    def close(self, outline: Optional[list[tuple]] = None) -> None:
+        """Write the page tree, bookmarks, catalog and cross-reference table."""
+        self._write_object(self._pages_root, DictionaryObject({
+            NameObject("/Type"): NameObject("/Pages"),
+            NameObject("/Kids"): ArrayObject(self._page_refs),
+            NameObject("/Count"): NumberObject(self.page_count),
+        }))
+        catalog = DictionaryObject({
+            NameObject("/Type"): NameObject("/Catalog"),
+            NameObject("/Pages"): self._pages_root,
+        })
+        if outline:
+            outlines = self._reserve()
+            first, last, count = self._write_outline(outline, outlines)
+            self._write_object(outlines, DictionaryObject({
+                NameObject("/Type"): NameObject("/Outlines"),
+                NameObject("/First"): first,
+                NameObject("/Last"): last,
+                NameObject("/Count"): NumberObject(count),
+            }))
+            catalog[NameObject("/Outlines")] = outlines
+            catalog[NameObject("/PageMode")] = NameObject("/UseOutlines")
+        root = self._reserve()
+        self._write_object(root, catalog)
+
+        xref = self.file.tell()
+        self.file.write(f"xref\n0 {len(self._offsets)}\n0000000000 65535 f \n".encode("ascii"))
+        self.file.write("".join(f"{offset:010d} 00000 n \n" for offset in self._offsets[1:]).encode("ascii"))
+        self.file.write(
+            f"trailer\n<< /Size {len(self._offsets)} /Root {root.idnum} 0 R >>\nstartxref\n{xref}\n%%EOF\n".encode("ascii")
+        )
+
+def _render_contents(packet_title: str, entries: list[dict], path: Path) -> int:
+    """Write the title and table-of-contents pages; returns their page count."""
+    styles = get_pdf_styles()
+    rows = [["", "Questions", "Answers"]] + [
+        [Paragraph(f"{i}. {escape(e['title'])}", styles["Normal"]), str(e["questions_page"]), str(e["answers_page"])]
+        for i, e in enumerate(entries, start=1)
+    ]
+    table = Table(rows, colWidths=[330, 70, 70], repeatRows=1)
+    table.setStyle(TableStyle([
+        ("FONTNAME", (0, 0), (-1, 0), "Helvetica-Bold"),
+        ("ALIGN", (1, 0), (-1, -1), "RIGHT"),
+        ("VALIGN", (0, 0), (-1, -1), "TOP"),
+    ]))
+    write_pdf([
+        Paragraph(escape(packet_title), styles["Title"]),
+        Spacer(1, 12),
+        Paragraph("Contents", styles["Heading2"]),
+        table,
+    ], path)
+    return _page_count(path)
+
+def export_packet_pdf(
+        packet_name: str,
+        source_ids: Iterable[str],
+        output_dir: Path = PACKETS_DIR,
+        quiz_dir: Path = PROCESSED_OPENAI_DIR,
+        fragments_dir: Path = PDF_FRAGMENTS_DIR
+    ) -> dict:
+    """
+    Export one combined PDF for many sources: contents, every source's
+    questions, then the shared answer key.
+
+    Args:
+        packet_name (str): Title of the packet; also names the file (see
+                           `packet_file_stem`).
+        source_ids (Iterable[str]): Sources to include, in order.
+        output_dir (Path): Directory where the packet PDF will be saved.
+
+    Returns:
+        dict: 'path', 'pages', the included 'sources', the 'missing' ones
+              (no parsed quiz), and how many fragments were 'rendered'
+              versus 'reused'.
+    """
+    entries, missing = [], []
+    rendered = reused = 0
+
+    # 1. Lay out (or reuse) each source's fragments, one source at a time
+    for source_id in source_ids:
+        title = source_title(source_id)
+        try:
+            questions_path, answers_path, was_reused = render_source_fragments(
+                source_id, title, quiz_dir=quiz_dir, fragments_dir=fragments_dir
+            )
+        except FileNotFoundError:
+            logger.warning(f"Skipping {source_id} in packet {packet_name}: no parsed quiz")
+            missing.append(source_id)
+            continue
+        reused += was_reused
+        rendered += not was_reused
+        entries.append({
+            "source_id": source_id,
+            "title": title,
+            "questions": questions_path,
+            "answers": answers_path,
+            "questions_pages": _page_count(questions_path),
+            "answers_pages": _page_count(answers_path),
+        })
+
+    if not entries:
+        raise ValueError(f"None of the sources for packet {packet_name} have a parsed quiz")
+
+    # 2. Number the sections. The contents length depends on the entries only,
+    #    so a second pass settles the page numbers
+    output_dir = Path(output_dir)
+    output_dir.mkdir(parents=True, exist_ok=True)
+    file_stem = packet_file_stem(packet_name)
+    file_path = output_dir / f"{file_stem}.pdf"
+    contents_path = output_dir / f".{file_stem}.{os.getpid()}.{threading.get_ident()}.contents.pdf"
+
+    try:
+        contents_pages = 1
+        for _ in range(3):
+            page = contents_pages + 1
+            for entry in entries:
+                entry["questions_page"] = page
+                page += entry["questions_pages"]
+            for entry in entries:
+                entry["answers_page"] = page
+                page += entry["answers_pages"]
+            pages = _render_contents(packet_name, entries, contents_path)
+            if pages == contents_pages:
+                break
+            contents_pages = pages
+
+        # 3. Stream the pages into the packet and add bookmarks
+        tmp_path = file_path.with_suffix(f".{os.getpid()}.{threading.get_ident()}.tmp")
+        try:
+            with open(tmp_path, "wb") as file:
+                writer = _StreamingPdfWriter(file)
+                writer.append(contents_path)
+                questions = [(entry["title"], writer.append(entry["questions"]), []) for entry in entries]
+                answers = [(entry["title"], writer.append(entry["answers"]), []) for entry in entries]
+                writer.close(outline=[
+                    ("Contents", 0, []),
+                    ("Questions", questions[0][1], questions),
+                    ("Answer Key", answers[0][1], answers),
+                ])
+            total_pages = writer.page_count
+            os.replace(tmp_path, file_path)
+        finally:
+            tmp_path.unlink(missing_ok=True)
+    finally:
+        contents_path.unlink(missing_ok=True)
+
+    logger.info(
+        f"Exported packet {file_path} with {len(entries)} sources and {total_pages} pages "
+        f"({rendered} rendered, {reused} reused, {len(missing)} missing)"
+    )
+    return {
+        "path": str(file_path),
+        "pages": total_pages,
+        "sources": [entry["source_id"] for entry in entries],
+        "missing": missing,
+        "rendered": rendered,
+        "reused": reused,
+    }
+
+def export_packet_deck(
+        packet_name: str,
+        source_ids: Iterable[str],
+        quiz_dir: Path = PROCESSED_OPENAI_DIR
+    ) -> dict:
+    """
+    Push every source's quiz to one Anki deck, with a subdeck per source
+    ('<packet>::<title>'). Undeliverable notes are queued as usual.
+
+    Returns:
+        dict: Counts of added/duplicate/failed/queued notes (see
+              `summarize_results`) plus the 'missing' sources.
+    """
+    notes, missing = [], []
+    for source_id in source_ids:
+        quiz_path = Path(quiz_dir) / f"{source_id}.json"
+        if not quiz_path.exists():
+            missing.append(source_id)
+            continue
+        deck_name = f"{packet_name}::{source_title(source_id)}"
+        quiz = json.loads(quiz_path.read_text(encoding="utf-8"))
+        notes.extend(build_note(deck_name, d["question"], format_answer(d)) for d in quiz)
+
+    summary = summarize_results(packet_name, deliver_notes(notes, source_id=packet_name))
+    summary["missing"] = missing
+    logger.info(
+        f"Exported packet deck {packet_name}: {summary['added']} added, "
+        f"{summary['duplicate']} duplicate, {summary['failed']} failed, {summary['queued']} queued"
+    )
+    return summary
+
+def main(argv: Optional[list] = None) -> int:
+    parser = argparse.ArgumentParser(description="Export a combined study packet for many sources.")
+    parser.add_argument("name", help="Packet title and output file name")
+    parser.add_argument("source_ids", nargs="*", help="Source ids to include, in order")
+    parser.add_argument("--all", action="store_true", help="Include every source with a parsed quiz")
+    parser.add_argument("--anki", action="store_true", help="Also push the packet to a combined Anki deck")
+    args = parser.parse_args(argv)
+    setup_logging()
+
+    source_ids = list(args.source_ids)
+    if args.all:
+        source_ids += [s for s in list_quiz_sources() if s not in source_ids]
+    if not source_ids:
+        parser.error("Provide source ids or --all")
+
+    summary = {"pdf": export_packet_pdf(args.name, source_ids)}
+    if args.anki:
+        summary["anki"] = export_packet_deck(args.name, source_ids)
+    print(json.dumps(summary, indent=2))
+    return 1 if summary["pdf"]["missing"] else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
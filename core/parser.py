@@ -1,34 +1,169 @@
 import json
 from pathlib import Path
+from typing import Optional
 from utils.logger import get_logger
 from config.paths import PROCESSED_OPENAI_DIR
+from config.variable import QUIZ_STRUCTURED_OUTPUT
+from core.stream_parser import IncrementalQuizParser
 
 logger = get_logger(__name__)
 
+QUIZ_ITEM_FIELDS = ("question", "answer", "explanation")
+
+# Strict structured outputs need an object at the top level, so the items are wrapped
+QUIZ_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "items": {
+            "type": "array",
+            "items": {
+                "type": "object",
+                "properties": {field: {"type": "string"} for field in QUIZ_ITEM_FIELDS},
+                "required": list(QUIZ_ITEM_FIELDS),
+                "additionalProperties": False,
+            },
+        },
+    },
+    "required": ["items"],
+    "additionalProperties": False,
+}
+
+def quiz_response_format() -> Optional[dict]:
+    """
+    The `response_format` for quiz requests: the JSON schema above when
+    QUIZ_STRUCTURED_OUTPUT is on, otherwise None (free text with a fence).
+    """
+    if not QUIZ_STRUCTURED_OUTPUT:
+        return None
+    return {
+        "type": "json_schema",
+        "json_schema": {"name": "quiz", "strict": True, "schema": QUIZ_SCHEMA},
+    }
+
+def parse_quiz_output(output: str) -> list:
+    """
+    Parse the quiz items out of a model's message content: a structured
+    output object ({"items": [...]}), a bare JSON array, or an array in a
+    ```json fence (older responses and cache entries).
+
+    Raises:
+        ValueError: If no quiz JSON is found or it isn't valid JSON.
+    """
+    text = output.strip()
+    if "```json" in text:
+        text = text.split("```json")[1].split("```")[0].strip()
+    elif not text.startswith(("{", "[")):
+        logger.error("JSON block not found")
+        raise ValueError("JSON block not found")
+
+    # Try to parse JSON, log and raise clean error if invalid
+    try:
+        data = json.loads(text)
+    except json.JSONDecodeError as e:
+        logger.error(f"Failed to parse JSON content: {e}")
+        logger.debug(f"Raw content was: \n{text[:500]}")
+        raise ValueError("OpenAI response did not contain valid JSON") from e
+
+    if isinstance(data, dict):
+        data = data.get("items")
+    if not isinstance(data, list):
+        raise ValueError("OpenAI response did not contain a list of quiz items")
+    return data
+
+def is_valid_quiz_item(item) -> bool:
+    """An object whose question, answer and explanation are non-empty strings."""
+    return isinstance(item, dict) and all(
+        isinstance(item.get(field), str) and item[field].strip() for field in QUIZ_ITEM_FIELDS
+    )
+
+def validate_quiz_items(items: list) -> tuple[list[dict], int]:
+    """
+    Keep the well-formed quiz items (`is_valid_quiz_item`). Other keys
+    (e.g. the dedup flag) are kept as they are.
+
+    Returns:
+        tuple: (valid items, number of items rejected)
+    """
+    valid = [item for item in items if is_valid_quiz_item(item)]
+    rejected = len(items) - len(valid)
+    if rejected:
+        logger.warning(f"Rejected {rejected} of {len(items)} malformed quiz items")
+    return valid, rejected
+
+def response_content(response_dict: Optional[dict]) -> str:
+    """
+    The message text of a chat completion.
+
+    Raises:
+        ValueError: If there is no response, no message or the model refused.
+    """
+    try:
+        message = response_dict["choices"][0]["message"]
+    except (TypeError, KeyError, IndexError) as e:
+        raise ValueError("OpenAI response has no message") from e
+    if message.get("refusal"):
+        raise ValueError(f"The model refused: {message['refusal']}")
+    if not message.get("content"):
+        raise ValueError("OpenAI response message is empty")
+    return message["content"]
+
+def parse_quiz_response(response_dict: Optional[dict]) -> tuple[list[dict], int]:
+    """
+    The valid quiz items of a completion, salvaging what it can.
+
+    When the content as a whole doesn't parse (e.g. an answer cut off at
+    the token limit), each complete item is recovered on its own, so only
+    the missing ones need to be asked for again (see
+    `core.quiz_generator`). Malformed items are dropped and counted.
+
+    Returns:
+        tuple: (valid items, number of items rejected or lost)
+    """
+    try:
+        content = response_content(response_dict)
+    except ValueError as e:
+        logger.warning(f"No quiz items in response: {e}")
+        return [], 0
+
+    try:
+        items = parse_quiz_output(content)
+    except ValueError:
+        salvage = IncrementalQuizParser()
+        items = salvage.feed(content)
+        logger.warning(f"Recovered {len(items)} complete quiz items from an unparseable response")
+        valid, rejected = validate_quiz_items(items)
+        return valid, rejected + salvage.items_skipped
+    return validate_quiz_items(items)
+
+def finalize_quiz(data: list[dict], source_id: str) -> list[dict]:
+    """
+    Deduplicate validated quiz items against earlier runs, save them and
+    record them in the dedup index.
+
+    Raises:
+        ValueError: If there are no items.
+    """
+    # The dedup index needs numpy; imported here to keep this module cheap
+    from core.dedup_index import deduplicate_quiz, record_quiz
+
+    if not data:
+        raise ValueError("No valid quiz items were generated")
+    # Flag or drop questions already produced by earlier runs
+    data = deduplicate_quiz(data, source_id)
+
+    output_path = PROCESSED_OPENAI_DIR / f"{source_id}.json"
+    save_parsed_quiz(
+        data = data,
+        output_path = output_path
+    )
+    record_quiz(source_id, data, output_path)
+    return data
+
 def extract_quiz_content(response_dict: dict, source_id: str):
     """Extract the quiz content from OpenAI's response"""
     try:
-        output = response_dict['choices'][0]['message']['content']
-
-        
-        if "```json" in output:
-            json_output = output.split("```json")[1].split("```")[0].strip()
-        else:
-            logger.error("JSON block not found")
-            raise ValueError("JSON block not found")
-
-        # Try to parse JSON, log and raise clean error if invalid
-        try:
-            data = json.loads(json_output)
-        except json.JSONDecodeError as e:
-            logger.error(f"Failed to parse JSON content: {e}")
-            logger.debug(f"Raw content was: \n{json_output[:500]}")
-            raise ValueError("OpenAI response did not contain valid JSON") from e
-        
-        save_parsed_quiz(
-            data = data,
-            output_path = PROCESSED_OPENAI_DIR / f"{source_id}.json"
-        )
+        data, _ = parse_quiz_response(response_dict)
+        data = finalize_quiz(data, source_id)
 
         logger.info(f"Successfully extracted {len(data)} quiz items from response.")
         return data
@@ -45,4 +180,4 @@ def save_parsed_quiz(data: dict, output_path: Path) -> None:
     output_path.parent.mkdir(parents=True, exist_ok=True)
     with open(output_path, "w", encoding="utf-8") as f:
         json.dump(data, f, indent=2)
-    logger.info(f"Clean quiz JSON saved to {output_path}")
\ No newline at end of file
+    logger.info(f"Clean quiz JSON saved to {output_path}")
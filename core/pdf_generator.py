@@ -1,79 +1,205 @@
 # Base libraries
-import json
-import re
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from functools import lru_cache
 from pathlib import Path
+from typing import Iterable, Union
+from xml.sax.saxutils import escape
 
 # 3rd party packages
 from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, PageBreak
 from reportlab.lib.styles import getSampleStyleSheet
 
 from utils.logger import get_logger
+from utils.metrics import peak_rss_mb
 from config.paths import PDF_OUTPUTS_DIR
+from config.variable import PDF_MAX_WORKERS
+from core.parser import parse_quiz_output
 
 logger = get_logger(__name__)
 
-def export_pdf(data, source_id, output_dir=PDF_OUTPUTS_DIR):
+STUDENT_TITLE = "Open-Ended Quiz (Student Version)"
+TEACHER_TITLE = "Open-Ended Quiz (Teacher Version)"
+
+@lru_cache(maxsize=1)
+def get_pdf_styles() -> dict:
     """
-    Export a quiz PDF with:
-    - Section 1: Questions only (spaced out)
-    - Section 2: Questions + Answers + Explanations
+    Paragraph styles used by every quiz PDF, built once per process.
+
+    Styles are only read during layout, so one set is shared by all builders.
+    """
+    sheet = getSampleStyleSheet()
+    return {name: sheet[name] for name in ("Title", "Heading1", "Heading2", "Normal", "Italic")}
+
+def write_pdf(flowables: list, file_path: Path) -> Path:
+    """
+    Lay out flowables into a PDF at `file_path`.
+
+    The PDF is written to a temporary file and renamed into place, so a
+    failed or concurrent build never leaves a truncated PDF behind.
+    """
+    file_path = Path(file_path)
+    file_path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = file_path.with_suffix(f".{os.getpid()}.{threading.get_ident()}.tmp")
+    try:
+        SimpleDocTemplate(str(tmp_path)).build(flowables)
+        os.replace(tmp_path, file_path)
+    finally:
+        tmp_path.unlink(missing_ok=True)
+    return file_path
+
+class QuizPdfBuilder:
+    """
+    Accumulates quiz items into the student and teacher sections of a PDF
+    so flowables can be prepared while questions are still streaming in.
 
     Args:
-        data (str | list): JSON string (raw OpenAI output) or parsed list of dicts
         source_id (str): YouTube video ID or txt file source id
         output_dir (Path | str): Directory where PDF will be saved
     """
 
-    try:
-        # If data is a string, extract JSON array
-        if isinstance(data, str):
-            match = re.search(r"\[.*\]", data, re.DOTALL)
-            if not match:
-                raise ValueError("Could not find valid JSON array in string")
-            data = json.loads(match.group(0))
-
-        # Ensure it's a list of dicts
-        if not isinstance(data, list) or not isinstance(data[0], dict):
-            raise TypeError("Data must be a list of dicts with 'question', 'answer', 'explanation'")
-
-        # Ensure output directory exists
-        output_dir = Path(output_dir)
-        output_dir.mkdir(parents=True, exist_ok=True)
-        file_path = output_dir / f"{source_id}.pdf"
-
-        # Build PDF
-        doc = SimpleDocTemplate(str(file_path))
-        styles = getSampleStyleSheet()
-        flowables = []
+    def __init__(self, source_id, output_dir=PDF_OUTPUTS_DIR):
+        self.styles = get_pdf_styles()
+        self.output_dir = Path(output_dir)
+        self.file_path = self.output_dir / f"{source_id}.pdf"
+        self.count = 0
 
         # -----------------------------
         # Section 1: Student Version
         # -----------------------------
-        flowables.append(Paragraph("Open-Ended Quiz (Student Version)", styles["Title"]))
-        flowables.append(Spacer(1, 20))
-
-        for i, d in enumerate(data, 1):
-            flowables.append(Paragraph(f"{i}. {d['question']}", styles["Normal"]))
-            flowables.append(Spacer(1, 84))  # add extra blank space for writing
-
-        flowables.append(PageBreak())
+        self.student = [
+            Paragraph(STUDENT_TITLE, self.styles["Title"]),
+            Spacer(1, 20),
+        ]
 
         # -----------------------------
         # Section 2: Teacher Version
         # -----------------------------
-        flowables.append(Paragraph("Open-Ended Quiz (Teacher Version)", styles["Title"]))
-        flowables.append(Spacer(1, 20))
-
-        for i, d in enumerate(data, 1):
-            flowables.append(Paragraph(f"{i}. {d['question']}", styles["Normal"]))
-            flowables.append(Paragraph(f"Answer: {d['answer']}", styles["Italic"]))
-            flowables.append(Paragraph(f"Explanation: {d['explanation']}", styles["Normal"]))
-            flowables.append(Spacer(1, 12))
-
-        doc.build(flowables)
-        logger.info(f"Exported PDF to {file_path}")
-    
+        self.teacher = [
+            Paragraph(TEACHER_TITLE, self.styles["Title"]),
+            Spacer(1, 20),
+        ]
+
+    def add_item(self, d: dict) -> None:
+        """Append one {question, answer, explanation} item to both sections."""
+        self.count += 1
+        # Escaped once and shared by both sections; quiz text may contain '<' or '&',
+        # which Paragraph would otherwise parse as markup
+        question = f"{self.count}. {escape(str(d['question']))}"
+
+        self.student.append(Paragraph(question, self.styles["Normal"]))
+        self.student.append(Spacer(1, 84))  # add extra blank space for writing
+
+        self.teacher.append(Paragraph(question, self.styles["Normal"]))
+        self.teacher.append(Paragraph(f"Answer: {escape(str(d['answer']))}", self.styles["Italic"]))
+        self.teacher.append(Paragraph(f"Explanation: {escape(str(d['explanation']))}", self.styles["Normal"]))
+        self.teacher.append(Spacer(1, 12))
+
+    def build(self) -> Path:
+        """Lay out and write the PDF (atomically), returning its path."""
+        write_pdf(self.student + [PageBreak()] + self.teacher, self.file_path)
+        logger.info(f"Exported PDF to {self.file_path}")
+        return self.file_path
+
+def _as_quiz_items(data) -> list[dict]:
+    """Accept parsed quiz items, or raw OpenAI output for older callers."""
+    if isinstance(data, str):
+        data = parse_quiz_output(data)
+
+    # Ensure it's a list of dicts
+    if not isinstance(data, list) or not data or not isinstance(data[0], dict):
+        raise TypeError("Data must be a list of dicts with 'question', 'answer', 'explanation'")
+    return data
+
+def export_pdf(data, source_id, output_dir=PDF_OUTPUTS_DIR):
+    """
+    Export a quiz PDF with:
+    - Section 1: Questions only (spaced out)
+    - Section 2: Questions + Answers + Explanations
+
+    Args:
+        data (list | str): Parsed list of quiz dicts. A raw OpenAI output
+                           string is still accepted and parsed first.
+        source_id (str): YouTube video ID or txt file source id
+        output_dir (Path | str): Directory where PDF will be saved
+
+    Raises:
+        Exception: Whatever parsing or layout failed with. The PDF is written
+                   atomically, so an earlier PDF at the path is left as it was.
+    """
+    builder = QuizPdfBuilder(source_id, output_dir)
+    for d in _as_quiz_items(data):
+        builder.add_item(d)
+    return builder.build()
+
+def _render_pdf_job(source_id: str, data, output_dir: str) -> dict:
+    """Render one PDF and report its timing; runs inside a worker process."""
+    started = time.perf_counter()
+    result = {"source_id": source_id, "path": str(Path(output_dir) / f"{source_id}.pdf")}
+    try:
+        builder = QuizPdfBuilder(source_id, output_dir)
+        for d in _as_quiz_items(data):
+            builder.add_item(d)
+        builder.build()
+        result["items"] = builder.count
+        result["bytes"] = builder.file_path.stat().st_size
     except Exception as e:
-        logger.error(f"Error exporting PDF to {file_path}: {str(e)}")
+        result["error"] = f"{type(e).__name__}: {e}"
+    result["seconds"] = round(time.perf_counter() - started, 4)
+    result["peak_rss_mb"] = peak_rss_mb()
+    return result
+
+def export_pdfs(
+        quizzes: Union[dict, Iterable[tuple]],
+        output_dir=PDF_OUTPUTS_DIR,
+        max_workers: int = PDF_MAX_WORKERS
+    ) -> list[dict]:
+    """
+    Export many quiz PDFs in parallel worker processes.
+
+    Layout is CPU-bound pure Python, so PDFs are rendered in a process pool
+    rather than threads. Each PDF is written atomically; one failing quiz
+    does not stop the others.
 
-    return file_path
\ No newline at end of file
+    Args:
+        quizzes (dict | Iterable[tuple]): {source_id: quiz items} or
+                                          (source_id, quiz items) pairs.
+        output_dir (Path | str): Directory where the PDFs will be saved
+        max_workers (int): Number of worker processes. 1 renders in-process.
+
+    Returns:
+        list[dict]: One entry per quiz, in input order, with 'source_id',
+                    'path', 'items', 'bytes', 'seconds' and the worker's
+                    'peak_rss_mb', or 'error' if it could not be rendered.
+    """
+    jobs = list(quizzes.items() if isinstance(quizzes, dict) else quizzes)
+    output_dir = str(output_dir)
+    started = time.perf_counter()
+
+    if max_workers <= 1 or len(jobs) <= 1:
+        results = [_render_pdf_job(source_id, data, output_dir) for source_id, data in jobs]
+    else:
+        results = [None] * len(jobs)
+        with ProcessPoolExecutor(max_workers=min(max_workers, len(jobs))) as executor:
+            futures = {
+                executor.submit(_render_pdf_job, source_id, data, output_dir): index
+                for index, (source_id, data) in enumerate(jobs)
+            }
+            for future in as_completed(futures):
+                index = futures[future]
+                try:
+                    results[index] = future.result()
+                except Exception as e:
+                    # The worker itself died (e.g. killed for memory)
+                    results[index] = {"source_id": jobs[index][0], "error": f"{type(e).__name__}: {e}"}
+
+    failed = [r for r in results if "error" in r]
+    for r in failed:
+        logger.error(f"Error exporting PDF for {r['source_id']}: {r['error']}")
+    logger.info(
+        f"Exported {len(results) - len(failed)} PDFs ({len(failed)} failed) "
+        f"in {time.perf_counter() - started:.2f}s"
+    )
+    return results
@@ -1,12 +1,22 @@
+import json
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
-from typing import Optional
+from typing import Callable, Optional
 
 from dotenv import load_dotenv
 
-from utils.logger import get_logger
-from config.paths import TRANSCRIPTS_DIR, RAW_OPENAI_DIR
-from config.variable import OPENAI_API_KEY
+from utils.logger import get_logger, bind_log_context, sampled
+from config.paths import (
+    METADATA_DIR,
+    RAW_OPENAI_DIR,
+    PROCESSED_OPENAI_DIR,
+    PDF_OUTPUTS_DIR
+)
+from config.variable import QUIZ_STRUCTURED_OUTPUT
+from utils.metrics import start_run, span, run_in_context
 from core.setup import create_directories
+from core.rate_limit import backend_slot
+from core.transcript_store import transcript_path, read_transcript_text
 from core.transcript_service import (
     extract_video_id,
     transcribe_youtube_video, 
@@ -14,16 +24,21 @@ from core.transcript_service import (
     save_metadata,
     get_yt_video_title_author
 )
-from core.prompt_manager import build_quiz_prompt
-from core.openai_client import (
-    call_openai_api,
-    save_raw_open_ai_response
-)
-from core.parser import (
-    extract_quiz_content
+from core.stage_manifest import (
+    StageManifest,
+    fingerprint,
+    text_digest,
+    file_digest,
+    forced_stages
 )
-from core.pdf_generator import export_pdf
-from core.anki_generator import create_flashcards_from_transcript
+from core.prompt_manager import build_quiz_prompt
+from core.transcript_cleaner import preprocess_fingerprint
+from core.quiz_generator import generate_quiz
+from core.search_index import index_artifact
+
+# The PDF (reportlab), Anki (requests) and dedup (numpy) backends are
+# imported by the stages that use them, so runs that skip those stages, and
+# processes that only import this module, don't load them.
 
 logger = get_logger(__name__)
 
@@ -32,72 +47,355 @@ def run_learning_pipeline(
     input_type: str,
     youtube_url: Optional[str] = None,
     transcript_text: Optional[str] = None,
-    question_count: int = 20
+    question_count: int = 20,
+    source_id: Optional[str] = None,
+    use_cache: bool = True,
+    stream: bool = False,
+    on_question: Optional[Callable[[dict], None]] = None,
+    force: bool = False,
+    from_stage: Optional[str] = None,
+    make_pdf: bool = True,
+    make_anki: bool = True
 ) -> None:
     """
     Core orchestration function for generating quizzes and outputs.
     This function contains no Streamlit logic.
+
+    Calls to YouTube, OpenAI and AnkiConnect go through the shared
+    per-backend rate limiters, so many pipelines can run side by side
+    (see `core.batch`).
+
+    Args:
+        source_id (str, optional): Overrides the generated source id for
+                                   text input, so batch runs don't collide.
+        use_cache (bool): Serve identical OpenAI requests from the local
+                          response cache. Set False to force a fresh call.
+        stream (bool): Stream the completion and hand each question to the
+                       PDF builder and Anki as soon as it is parsed.
+        on_question (Callable, optional): Called with each quiz item as it
+                       arrives (e.g. for a live preview). Implies `stream`.
+        force (bool): Re-run every stage even if its artifacts are current.
+        from_stage (str, optional): Re-run this stage and all later ones
+                       (one of `core.stage_manifest.STAGES`).
+        make_pdf (bool): Export the quiz PDF. False skips the stage.
+        make_anki (bool): Push the quiz to Anki. False skips the stage
+                       and 'anki' is None in the result.
+
+    Stages whose inputs are unchanged since the last run (tracked in the
+    per-source manifest) are skipped, so a re-run resumes at the first
+    missing or stale stage.
+
+    Each stage is timed as a metrics span (see `utils.metrics`); the run
+    summary is returned under 'metrics' and exported to the logs directory.
     """
 
     logger.info(f"Starting learning pipeline. Input type: {input_type}")
 
-    # 1. SETUP
-    create_directories()
-    load_dotenv()
+    with start_run(input_type=input_type) as run:
+        # 1. SETUP
+        create_directories()
+        load_dotenv()
 
-    # 2. INGEST TRANSCRIPT
-    logger.info("Ingesting Transcript...")
+        video_id = None
+        if input_type == "youtube":
+            video_id = extract_video_id(youtube_url)
+            if not video_id:
+                raise ValueError(f"Could not extract a video id from {youtube_url}")
+            source_id = video_id
+        else:
+            source_id = source_id or f"text_{Path.cwd().stem}"
+        run.attrs["source_id"] = source_id
+        bind_log_context(source_id=source_id)
 
-    if input_type == "youtube":
-        video_id = extract_video_id(youtube_url)
-        raw_transcript = transcribe_youtube_video(video_id)
-        save_transcript(raw_transcript, video_id)
-        save_metadata(youtube_url, video_id)
-        video_title, channel_name = get_yt_video_title_author(video_id)
-        transcript_text = (TRANSCRIPTS_DIR / f"{video_id}.txt").read_text()
-        source_id = video_id
-    else:
-        source_id = f"text_{Path.cwd().stem}"
-    
-    logger.info("Ingested Transcript")
-
-    # 3. BUILD PROMPT
-    prompt = build_quiz_prompt(transcript_text, question_count)
-
-    # 4. CALL OPENAI
-    response = call_openai_api(api_key=api_key, prompt=prompt)
-    save_raw_open_ai_response(
-        response=response, 
-        output_dir = RAW_OPENAI_DIR,
-        source_id=source_id
+        manifest = StageManifest(source_id)
+        forced = forced_stages(force, from_stage)
+        stages_run = []
+
+        # 2. INGEST TRANSCRIPT
+        logger.info("Ingesting Transcript...")
+
+        if input_type == "youtube":
+            transcript_text = _ingest_youtube(manifest, forced, stages_run, youtube_url, video_id)
+        else:
+            # Pasted text is never written to disk, so index it from memory
+            index_artifact(source_id, "transcript", text=transcript_text)
+        
+        logger.info("Ingested Transcript")
+        deck_name = _deck_name(source_id, video_id) if make_anki else None
+
+        # 3-5. BUILD PROMPT(S), CALL OPENAI, PARSE & VALIDATE
+        # Long transcripts are chunked and quizzed in parallel, then merged
+        quiz_path = PROCESSED_OPENAI_DIR / f"{source_id}.json"
+        quiz_fp = quiz_fingerprint(transcript_text, question_count)
+        anki_summary = None
+
+        with span("quiz") as quiz_span:
+            quiz_span.add("bytes_in", len(transcript_text.encode("utf-8")))
+
+            if not manifest.should_run("quiz", quiz_fp, forced):
+                quiz_span.set(skipped=True)
+                quiz_data = json.loads(quiz_path.read_text(encoding="utf-8"))
+                if on_question:
+                    for item in quiz_data:
+                        on_question(item)
+
+            elif stream or on_question:
+                # PDF and Anki run alongside generation, so they are timed with it
+                quiz_span.set(streamed=True)
+                quiz_data, anki_summary, pdf_built = _generate_streaming(
+                    api_key, transcript_text, question_count, source_id,
+                    input_type, use_cache, deck_name, on_question, make_pdf, make_anki
+                )
+                stages_run.append("quiz")
+                manifest.record("quiz", quiz_fp, [RAW_OPENAI_DIR / f"{source_id}.json", quiz_path])
+                quiz_digest = file_digest(quiz_path)
+                if make_pdf:
+                    stages_run.append("pdf")
+                    if pdf_built:
+                        manifest.record("pdf", fingerprint("pdf", quiz_digest), [PDF_OUTPUTS_DIR / f"{source_id}.pdf"])
+                if make_anki:
+                    stages_run.append("anki")
+                    if not anki_summary["failed"]:
+                        manifest.record("anki", fingerprint("anki", quiz_digest, deck_name), anki=anki_summary)
+
+            else:
+                quiz_data = generate_quiz(
+                    api_key=api_key,
+                    transcript_text=transcript_text,
+                    question_count=question_count,
+                    source_id=source_id,
+                    input_type=input_type,
+                    use_cache=use_cache
+                )
+                stages_run.append("quiz")
+                manifest.record("quiz", quiz_fp, [RAW_OPENAI_DIR / f"{source_id}.json", quiz_path])
+
+            quiz_span.add("items", len(quiz_data))
+            quiz_span.add("bytes_out", quiz_path.stat().st_size if quiz_path.exists() else 0)
+
+        if "quiz" in stages_run:
+            index_artifact(source_id, "quiz", path=quiz_path)
+
+        # 6. GENERATE OUTPUTS
+        quiz_digest = file_digest(quiz_path)
+
+        pdf_fp = fingerprint("pdf", quiz_digest)
+        if make_pdf and "pdf" not in stages_run:
+            with span("pdf") as pdf_span:
+                if manifest.should_run("pdf", pdf_fp, forced):
+                    from core.pdf_generator import export_pdf
+
+                    stages_run.append("pdf")
+                    try:
+                        pdf_path = export_pdf(quiz_data, source_id)
+                    except Exception as e:
+                        # Not fatal to the run, but not recorded either: an older PDF may still be there
+                        logger.error(f"Error exporting PDF for {source_id}: {e}")
+                        pdf_span.set(error=f"{type(e).__name__}: {e}")
+                    else:
+                        manifest.record("pdf", pdf_fp, [pdf_path])
+                        pdf_span.add("bytes_out", pdf_path.stat().st_size)
+                else:
+                    pdf_span.set(skipped=True)
+
+        if make_anki and "anki" not in stages_run:
+            anki_fp = fingerprint("anki", quiz_digest, deck_name)
+            with span("anki") as anki_span:
+                if manifest.should_run("anki", anki_fp, forced):
+                    from core.anki_generator import create_flashcards_from_transcript
+
+                    with backend_slot("anki"):
+                        anki_summary = create_flashcards_from_transcript(
+                            clean_quiz=quiz_data,
+                            user_deck_name=deck_name,
+                            source_id=source_id
+                        )
+                    stages_run.append("anki")
+                    anki_span.add("items", anki_summary["added"])
+                    # Queued notes are delivered by the Anki queue; only failures need a re-run
+                    if not anki_summary["failed"]:
+                        manifest.record("anki", anki_fp, anki=anki_summary)
+                else:
+                    anki_span.set(skipped=True)
+                    anki_summary = manifest.get("anki").get("anki")
+
+        logger.info("✅ Learning pipeline completed successfully.")
+        return {
+            "source_id": source_id,
+            "quiz_data": quiz_data,
+            "anki": anki_summary,
+            "stages_run": stages_run,
+            "metrics": run.summary()
+        }
+
+def quiz_fingerprint(transcript_text: str, question_count: int) -> str:
+    """
+    Fingerprint of the quiz stage's inputs: the transcript, question count,
+    prompt template, structured-output setting and transcript preprocessing
+    settings.
+    """
+    return fingerprint(
+        "quiz", text_digest(transcript_text), question_count,
+        text_digest(build_quiz_prompt("", question_count)), QUIZ_STRUCTURED_OUTPUT, preprocess_fingerprint()
     )
 
-    # 5. PARSE & VALIDATE
-    quiz_data = extract_quiz_content(response.to_dict(), source_id)
+def _deck_name(source_id: str, video_id: Optional[str] = None) -> str:
+    """The Anki deck for a source: 'channel::title' for videos, else the source id."""
+    from core.anki_generator import resolve_deck_name
 
-    # 6. GENERATE OUTPUTS
-    export_pdf(quiz_data, source_id)
+    if video_id:
+        video_title, channel_name = get_yt_video_title_author(video_id)
+        return resolve_deck_name(video_title=video_title, channel_name=channel_name)
+    return resolve_deck_name(user_deck_name=source_id)
 
-    if input_type == "youtube":
-        create_flashcards_from_transcript( 
-            clean_quiz=quiz_data,
-            video_title=video_title,
-            channel_name=channel_name
-        )
-    else:
-        create_flashcards_from_transcript(
-            clean_quiz=quiz_data,
-            user_deck_name=source_id
+def _ingest_youtube(
+    manifest: StageManifest,
+    forced: set,
+    stages_run: list,
+    youtube_url: str,
+    video_id: str
+) -> str:
+    """
+    Run the transcript and metadata stages for a video, skipping whichever
+    is already up to date, and return the transcript text.
+    """
+    transcript_fp = fingerprint("transcript", video_id)
+    metadata_fp = fingerprint("metadata", video_id)
+    run_transcript = manifest.should_run("transcript", transcript_fp, forced)
+    run_metadata = manifest.should_run("metadata", metadata_fp, forced)
+
+    # Transcript fetch and yt-dlp metadata are independent network calls
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        metadata_future = None
+        if run_metadata:
+            metadata_future = run_in_context(executor, _fetch_metadata, youtube_url, video_id)
+
+        with span("transcript", skipped=not run_transcript) as transcript_span:
+            if run_transcript:
+                transcript_text = _fetch_transcript(manifest, video_id, transcript_fp)
+                stages_run.append("transcript")
+            else:
+                transcript_text = read_transcript_text(video_id)
+            transcript_span.add("bytes_out", len(transcript_text.encode("utf-8")))
+
+        if metadata_future:
+            metadata_future.result()
+            manifest.record("metadata", metadata_fp, [METADATA_DIR / f"{video_id}.json"])
+            stages_run.append("metadata")
+            index_artifact(video_id, "metadata", path=METADATA_DIR / f"{video_id}.json")
+
+    return transcript_text
+
+def _fetch_transcript(manifest: StageManifest, video_id: str, transcript_fp: str) -> str:
+    """Fetch, save, record and index a video's transcript, returning its text."""
+    path = transcript_path(video_id)
+    raw_transcript = transcribe_youtube_video(video_id)
+    transcript_text = save_transcript(raw_transcript, video_id)
+    manifest.record("transcript", transcript_fp, [path])
+    index_artifact(video_id, "transcript", text=transcript_text, path=path)
+    return transcript_text
+
+def prefetch_transcript(youtube_url: str, force: bool = False) -> bool:
+    """
+    Run only the transcript stage for a video, so a later
+    `run_learning_pipeline` for it finds the transcript up to date.
+
+    Args:
+        force (bool): Fetch the transcript even if it is current.
+
+    Returns:
+        bool: True if the transcript was fetched, False if it was current.
+    """
+    create_directories()
+    video_id = extract_video_id(youtube_url)
+    if not video_id:
+        raise ValueError(f"Could not extract a video id from {youtube_url}")
+    manifest = StageManifest(video_id)
+    transcript_fp = fingerprint("transcript", video_id)
+    if not manifest.should_run("transcript", transcript_fp, {"transcript"} if force else ()):
+        return False
+    with span("transcript", prefetch=True):
+        _fetch_transcript(manifest, video_id, transcript_fp)
+    return True
+
+def _generate_streaming(
+    api_key: str,
+    transcript_text: str,
+    question_count: int,
+    source_id: str,
+    input_type: str,
+    use_cache: bool,
+    deck_name: str,
+    on_question: Optional[Callable[[dict], None]],
+    make_pdf: bool = True,
+    make_anki: bool = True
+) -> tuple[list[dict], Optional[dict], bool]:
+    """
+    Generate the quiz with streaming, feeding the PDF builder and Anki as
+    each question arrives, then write the PDF once the quiz is complete.
+    If generation fails, the cards still queued for Anki are dropped.
+
+    Returns:
+        tuple: (quiz_data, anki_summary, pdf_built), the summary None
+               without Anki
+    """
+    from core.dedup_index import flag_duplicate
+
+    pdf_builder = None
+    if make_pdf:
+        from core.pdf_generator import QuizPdfBuilder
+        pdf_builder = QuizPdfBuilder(source_id)
+    flashcards = None
+    if make_anki:
+        from core.anki_generator import FlashcardStream
+        flashcards = FlashcardStream(deck_name, source_id=source_id)
+
+    def handle_question(item: dict) -> None:
+        flag_duplicate(item, source_id)
+        if sampled(logger):
+            logger.debug(f"Streamed question: {item.get('question', '')[:80]}")
+        if pdf_builder:
+            pdf_builder.add_item(item)
+        if flashcards:
+            flashcards.add(item)
+        if on_question:
+            on_question(item)
+
+    try:
+        quiz_data = generate_quiz(
+            api_key=api_key,
+            transcript_text=transcript_text,
+            question_count=question_count,
+            source_id=source_id,
+            input_type=input_type,
+            use_cache=use_cache,
+            on_question=handle_question
         )
+    except Exception:
+        if flashcards:
+            flashcards.cancel()
+        raise
+    anki_summary = flashcards.close() if flashcards else None
 
-    logger.info("✅ Learning pipeline completed successfully.")
-    return {
-        "source_id": source_id,
-        "quiz_data": quiz_data
-    }
+    pdf_built = False
+    if pdf_builder:
+        try:
+            pdf_builder.build()
+            pdf_built = True
+        except Exception as e:
+            logger.error(f"Error exporting PDF to {pdf_builder.file_path}: {str(e)}")
+
+    return quiz_data, anki_summary, pdf_built
+
+def _fetch_metadata(youtube_url: str, video_id: str) -> None:
+    """Run the yt-dlp metadata extraction under the YouTube rate limit."""
+    with span("metadata") as metadata_span, backend_slot("youtube"):
+        record = save_metadata(youtube_url, video_id)
+        metadata_span.add("bytes_out", len(json.dumps(record)))
 
 if __name__ == "__main__":
-    results = run_learning_pipeline(
-        api_key = OPENAI_API_KEY,
-        youtube_url= "https://www.youtube.com/watch?v=2UvHiH7zJLU",
-    )
\ No newline at end of file
+    # python -m core.pipeline <url or file> ... is the same as `learning_pipeline run`
+    import sys
+    from learning_pipeline import main
+
+    sys.exit(main(["run", *sys.argv[1:]]))
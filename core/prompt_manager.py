@@ -1,28 +1,69 @@
+from typing import Optional
+
 from utils.logger import get_logger
+from config.variable import QUIZ_STRUCTURED_OUTPUT
 
 logger = get_logger(__name__)
 
-def build_quiz_prompt(transcript_text: str, num_questions: int = 20) -> str:
-    """Build a formatted prompt for the OpenAI model"""
-    # Create prompt to generate quiz
-    prompt = f"""
-    You are an expert quiz generator.
+def build_quiz_prompt(
+        transcript_text: str,
+        num_questions: int = 20,
+        part: Optional[tuple[int, int]] = None,
+        avoid_questions: Optional[list[str]] = None,
+        structured: bool = QUIZ_STRUCTURED_OUTPUT
+    ) -> str:
+    """
+    Build a formatted prompt for the OpenAI model
 
-    I will give you a transcript. Based ONLY on that transcript:
+    Args:
+        part (tuple[int, int], optional): (index, total) when the transcript
+            is one chunk of a longer transcript, starting at 1.
+        avoid_questions (list[str], optional): Questions already written for
+            this transcript, when only the missing ones are asked for.
+        structured (bool): Describe the `{"items": [...]}` object the
+            structured-output schema enforces (see `core.parser.QUIZ_SCHEMA`)
+            instead of a bare array.
+    """
+    intro = "I will give you a transcript."
+    if part:
+        intro = f"I will give you part {part[0]} of {part[1]} of a longer transcript."
 
-    1. Generate {str(num_questions)} well-written **open-ended questions**.  
-    - Each question should test reasoning, application, or connections across ideas, not just recall.  
-    - Provide a strong sample answer with a short explanation of why it is correct.  
+    avoid = ""
+    if avoid_questions:
+        listed = "\n".join(f"        - {question}" for question in avoid_questions)
+        avoid = f"\n    - These questions are already written; do not repeat or rephrase them:\n{listed}"
 
-    2. Return your output in **JSON** with the following structure:
-    [
-    {{
+    item = """{
         "question": "string",
         "answer": "string",
         "explanation": "string"
-    }},
+    }"""
+    if structured:
+        output_format = f"""a **JSON** object with the following structure:
+    {{
+    "items": [
+    {item},
     ...
     ]
+    }}"""
+    else:
+        output_format = f"""**JSON** with the following structure:
+    [
+    {item},
+    ...
+    ]"""
+
+    # Create prompt to generate quiz
+    prompt = f"""
+    You are an expert quiz generator.
+
+    {intro} Based ONLY on that transcript:
+
+    1. Generate {str(num_questions)} well-written **open-ended questions**.  
+    - Each question should test reasoning, application, or connections across ideas, not just recall.  
+    - Provide a strong sample answer with a short explanation of why it is correct.  {avoid}
+
+    2. Return your output in {output_format}
 
     Transcript:
     ---
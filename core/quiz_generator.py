@@ -0,0 +1,471 @@
+# Base libraries
+import math
+import re
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Optional, Union
+
+# Local modules
+from utils.logger import get_logger
+from utils.metrics import run_in_context, record_openai_usage, add_to_span
+from config.paths import RAW_OPENAI_DIR, PROCESSED_OPENAI_DIR
+from config.variable import (
+    CHUNK_MAX_TOKENS,
+    CHUNK_OVERLAP_TOKENS,
+    CHUNK_MAX_WORKERS,
+    CHUNK_OVERSAMPLE,
+    QUIZ_REPAIR_ATTEMPTS,
+    OPENAI_CACHE_ENABLED,
+    OPENAI_BATCH_PRICE_FACTOR
+)
+from core.chunker import chunk_text, count_tokens
+from core.transcript_cleaner import prepare_transcript
+from core.prompt_manager import build_quiz_prompt
+from core.openai_client import (
+    call_openai_api_cached,
+    CompletionStream,
+    save_raw_open_ai_response
+)
+from core.openai_batch import build_batch_request, run_batch
+from core.response_cache import make_cache_key, get_cached_response, store_response
+from core.parser import (
+    quiz_response_format,
+    parse_quiz_response,
+    is_valid_quiz_item,
+    finalize_quiz,
+    save_parsed_quiz
+)
+from core.rate_limit import backend_slot
+from core.stream_parser import IncrementalQuizParser
+
+logger = get_logger(__name__)
+
+_WORD = re.compile(r"[a-z0-9]+")
+
+def _question_tokens(question: str) -> frozenset:
+    return frozenset(_WORD.findall(question.lower()))
+
+def _is_duplicate(tokens: frozenset, seen: list[frozenset], threshold: float) -> bool:
+    for other in seen:
+        union = len(tokens | other)
+        if union and len(tokens & other) / union >= threshold:
+            return True
+    return False
+
+def merge_chunk_quizzes(
+        chunk_quizzes: list[list[dict]],
+        question_count: int,
+        similarity_threshold: float = 0.8
+    ) -> list[dict]:
+    """
+    Merge per-chunk quizzes into one, dropping near-duplicate questions
+    (word-set Jaccard similarity at or above `similarity_threshold`).
+
+    Questions are taken round-robin across chunks so the final quiz covers
+    the whole transcript rather than just its beginning.
+
+    Args:
+        chunk_quizzes (list[list[dict]]): Parsed quiz items per chunk, in order.
+        question_count (int): Number of questions to keep.
+        similarity_threshold (float): Jaccard similarity treated as a duplicate.
+
+    Returns:
+        list[dict]: At most `question_count` unique quiz items.
+    """
+    merged = []
+    seen: list[frozenset] = []
+    queues = [list(items) for items in chunk_quizzes]
+
+    while len(merged) < question_count and any(queues):
+        for queue in queues:
+            if not queue or len(merged) >= question_count:
+                continue
+            item = queue.pop(0)
+            tokens = _question_tokens(item.get("question", ""))
+            if not tokens or _is_duplicate(tokens, seen, similarity_threshold):
+                continue
+            seen.append(tokens)
+            merged.append(item)
+
+    logger.info(f"Merged {sum(len(q) for q in chunk_quizzes)} chunk questions into {len(merged)}")
+    return merged
+
+def _request_quiz(api_key: str, prompt: str, question_count: int, use_cache: bool) -> dict:
+    with backend_slot("openai"):
+        return call_openai_api_cached(
+            api_key=api_key,
+            prompt=prompt,
+            question_count=question_count,
+            bypass_cache=not use_cache,
+            response_format=quiz_response_format()
+        )
+
+def repair_quiz(
+        api_key: str,
+        transcript_text: str,
+        items: list[dict],
+        question_count: int,
+        use_cache: bool = True,
+        part: Optional[tuple[int, int]] = None,
+        attempts: int = QUIZ_REPAIR_ATTEMPTS
+    ) -> tuple[list[dict], list[dict]]:
+    """
+    Top up a quiz that came back short (items missing, malformed or cut
+    off) by asking for just the missing number of questions, with the
+    ones already written listed so they are not repeated. The valid items
+    are kept, so a partly broken answer never costs a full regeneration.
+
+    Args:
+        items (list[dict]): The valid items so far.
+        question_count (int): Number of questions wanted.
+        part (tuple[int, int], optional): Chunk position, for chunked transcripts.
+        attempts (int): Follow-up requests at most.
+
+    Returns:
+        tuple: (items, the follow-up responses)
+    """
+    items = list(items)
+    responses = []
+    seen = [_question_tokens(item["question"]) for item in items]
+
+    for attempt in range(1, attempts + 1):
+        missing = question_count - len(items)
+        if missing <= 0:
+            break
+        logger.info(f"Quiz has {len(items)}/{question_count} valid items; requesting the {missing} missing")
+        prompt = build_quiz_prompt(
+            transcript_text, missing, part=part, avoid_questions=[item["question"] for item in items]
+        )
+        # A cached follow-up that fell short would come back unchanged on a second try
+        response = _request_quiz(api_key, prompt, missing, use_cache and attempt == 1)
+        responses.append(response)
+
+        new_items, _ = parse_quiz_response(response)
+        added = 0
+        for item in new_items:
+            tokens = _question_tokens(item["question"])
+            if len(items) >= question_count or not tokens or _is_duplicate(tokens, seen, 0.8):
+                continue
+            seen.append(tokens)
+            items.append(item)
+            added += 1
+        add_to_span("repaired_items", added)
+        logger.info(f"Follow-up request {attempt} added {added} of {missing} missing quiz items")
+
+    return items, responses
+
+def _parse_and_repair(
+        api_key: str,
+        response: dict,
+        transcript_text: str,
+        question_count: int,
+        use_cache: bool,
+        part: Optional[tuple[int, int]] = None
+    ) -> tuple[list[dict], list[dict]]:
+    """Valid items of a response, topped up by `repair_quiz`; (items, follow-up responses)."""
+    items, rejected = parse_quiz_response(response)
+    if rejected:
+        add_to_span("rejected_items", rejected)
+    if len(items) >= question_count:
+        return items, []
+    return repair_quiz(api_key, transcript_text, items, question_count, use_cache, part=part)
+
+def _complete_quiz(
+        api_key: str,
+        response: dict,
+        transcript_text: str,
+        question_count: int,
+        source_id: str,
+        input_type: str,
+        use_cache: bool,
+        on_question: Optional[Callable[[dict], None]] = None
+    ) -> list[dict]:
+    """
+    Save a single-prompt response, repair it if it fell short, then
+    deduplicate and save the quiz. Follow-up responses are kept with the
+    raw response under 'repairs', and their items reported to `on_question`.
+    """
+    save_raw_open_ai_response(
+        response=response,
+        output_dir=RAW_OPENAI_DIR,
+        source_id=source_id,
+        input_type=input_type
+    )
+    items, rejected = parse_quiz_response(response)
+    if rejected:
+        add_to_span("rejected_items", rejected)
+    if len(items) < question_count:
+        reported = len(items)
+        items, repairs = repair_quiz(api_key, transcript_text, items, question_count, use_cache)
+        if repairs:
+            response["repairs"] = repairs
+            save_raw_open_ai_response(
+                response=response,
+                output_dir=RAW_OPENAI_DIR,
+                source_id=source_id,
+                input_type=input_type
+            )
+        if on_question:
+            for item in items[reported:]:
+                on_question(item)
+
+    data = finalize_quiz(items, source_id)
+    logger.info(f"Successfully extracted {len(data)} quiz items from response.")
+    return data
+
+def _generate_for_chunk(
+        api_key: str,
+        chunk: str,
+        num_questions: int,
+        part: tuple[int, int],
+        use_cache: bool
+    ) -> tuple[dict, list[dict]]:
+    prompt = build_quiz_prompt(chunk, num_questions, part=part)
+    response = _request_quiz(api_key, prompt, num_questions, use_cache)
+    items, repairs = _parse_and_repair(api_key, response, chunk, num_questions, use_cache, part=part)
+    if repairs:
+        response["repairs"] = repairs
+    logger.info(f"Chunk {part[0]}/{part[1]} produced {len(items)} questions")
+    return response, items
+
+def _stream_quiz(
+        api_key: str,
+        transcript_text: str,
+        question_count: int,
+        source_id: str,
+        input_type: str,
+        use_cache: bool,
+        on_question: Callable[[dict], None]
+    ) -> list[dict]:
+    """Stream a single-prompt completion, reporting each item as it closes."""
+    prompt = build_quiz_prompt(transcript_text, question_count)
+    stream = CompletionStream(
+        api_key=api_key,
+        prompt=prompt,
+        question_count=question_count,
+        bypass_cache=not use_cache,
+        response_format=quiz_response_format()
+    )
+    parser = IncrementalQuizParser()
+
+    with backend_slot("openai"):
+        for delta in stream:
+            for item in parser.feed(delta):
+                if is_valid_quiz_item(item):
+                    on_question(item)
+
+    logger.info(f"Streamed {parser.items_parsed} quiz items (from cache: {stream.from_cache})")
+    return _complete_quiz(
+        api_key, stream.response_dict, transcript_text, question_count,
+        source_id, input_type, use_cache, on_question
+    )
+
+def generate_quiz(
+        api_key: str,
+        transcript_text: str,
+        question_count: int,
+        source_id: str,
+        input_type: str = "text",
+        use_cache: bool = True,
+        max_chunk_tokens: int = CHUNK_MAX_TOKENS,
+        overlap_tokens: int = CHUNK_OVERLAP_TOKENS,
+        max_workers: int = CHUNK_MAX_WORKERS,
+        on_question: Optional[Callable[[dict], None]] = None,
+        preprocess: bool = True
+    ) -> list[dict]:
+    """
+    Generate the quiz for a transcript, saving the raw and parsed responses.
+
+    Transcripts that fit in `max_chunk_tokens` go out as a single prompt.
+    Longer ones are split by `chunk_text`, each chunk is quizzed in
+    parallel (map), and the results are merged and deduplicated back down
+    to `question_count` (reduce), so latency follows the longest chunk
+    rather than the whole transcript.
+
+    The transcript is first cleaned and fitted to the token budget
+    (`core.transcript_cleaner.prepare_transcript`); caption markup is only
+    stripped from 'youtube' transcripts.
+
+    Answers are requested as JSON-schema structured output and validated
+    item by item. When items are missing or malformed, only those are
+    asked for again (`repair_quiz`) rather than the whole quiz.
+
+    Args:
+        api_key (str): OpenAI API key.
+        transcript_text (str): Full transcript text.
+        question_count (int): Number of questions wanted.
+        source_id (str): Id used to name the saved responses.
+        input_type (str): 'youtube' or 'text', stored with the raw response.
+        use_cache (bool): Serve identical requests from the response cache.
+        max_chunk_tokens (int): Token budget per chunk.
+        overlap_tokens (int): Tokens shared between neighbouring chunks.
+        max_workers (int): Chunks quizzed concurrently.
+        on_question (Callable, optional): Called with each quiz item as soon
+            as it is available. On the single-prompt path the completion is
+            streamed and items arrive while the model is still writing;
+            chunked transcripts report items once they are merged.
+        preprocess (bool): Clean and trim the transcript first. Off for
+            text that has already been prepared.
+
+    Returns:
+        list[dict]: Parsed quiz items.
+    """
+    if preprocess:
+        transcript_text, prepared = prepare_transcript(transcript_text, captions=input_type == "youtube")
+        token_count = prepared["tokens_after"]
+    else:
+        token_count = count_tokens(transcript_text)
+
+    if token_count <= max_chunk_tokens and on_question:
+        return _stream_quiz(
+            api_key, transcript_text, question_count, source_id, input_type, use_cache, on_question
+        )
+
+    if token_count <= max_chunk_tokens:
+        prompt = build_quiz_prompt(transcript_text, question_count)
+        response = _request_quiz(api_key, prompt, question_count, use_cache)
+        return _complete_quiz(
+            api_key, response, transcript_text, question_count, source_id, input_type, use_cache
+        )
+
+    chunks = chunk_text(transcript_text, max_chunk_tokens, overlap_tokens)
+    per_chunk = max(1, math.ceil(question_count * CHUNK_OVERSAMPLE / len(chunks)))
+    logger.info(
+        f"Transcript has {token_count} tokens; generating {per_chunk} questions "
+        f"for each of {len(chunks)} chunks"
+    )
+
+    with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(chunks)))) as executor:
+        futures = [
+            run_in_context(
+                executor, _generate_for_chunk, api_key, chunk, per_chunk, (i, len(chunks)), use_cache
+            )
+            for i, chunk in enumerate(chunks, 1)
+        ]
+        chunk_results = [future.result() for future in futures]
+
+    save_raw_open_ai_response(
+        response={"chunks": [response for response, _ in chunk_results]},
+        output_dir=RAW_OPENAI_DIR,
+        source_id=source_id,
+        input_type=input_type
+    )
+
+    from core.dedup_index import deduplicate_quiz, record_quiz
+
+    quiz_data = merge_chunk_quizzes([items for _, items in chunk_results], question_count)
+    quiz_data = deduplicate_quiz(quiz_data, source_id)
+    if not quiz_data:
+        raise ValueError("No quiz items were generated from any transcript chunk")
+
+    output_path = PROCESSED_OPENAI_DIR / f"{source_id}.json"
+    save_parsed_quiz(
+        data=quiz_data,
+        output_path=output_path
+    )
+    record_quiz(source_id, quiz_data, output_path)
+    if on_question:
+        for item in quiz_data:
+            on_question(item)
+    return quiz_data
+
+def _fan_out(api_key: str, response: dict, job: dict, use_cache: bool) -> list[dict]:
+    """Save a batch response, repair and parse it, as the single-prompt path does."""
+    return _complete_quiz(
+        api_key, response, job["transcript_text"], job["question_count"],
+        job["source_id"], job.get("input_type", "text"), use_cache
+    )
+
+def generate_quizzes_batch(
+        api_key: str,
+        jobs: list[dict],
+        use_cache: bool = True,
+        model: str = "gpt-4o",
+        temperature: float = 0.7,
+        max_chunk_tokens: int = CHUNK_MAX_TOKENS
+    ) -> dict[str, Union[list[dict], Exception]]:
+    """
+    Generate quizzes for many sources with one OpenAI Batch API job (see
+    `core.openai_batch`), for backfills where latency doesn't matter.
+
+    Each answer is saved, parsed and repaired by `source_id` exactly like a
+    single call. Cached answers skip the batch, transcripts too long for
+    one prompt go through the chunked path of `generate_quiz`, and sources
+    the batch fails on, or whose quiz still can't be completed, are retried
+    one at a time with `generate_quiz`.
+
+    Args:
+        api_key (str): OpenAI API key.
+        jobs (list[dict]): Each with 'source_id', 'transcript_text',
+                           'question_count' and optionally 'input_type'.
+        use_cache (bool): Serve identical requests from the response cache.
+
+    Returns:
+        dict: {source_id: quiz items, or the exception if it failed even
+              when retried on its own}.
+    """
+    results: dict = {}
+    response_format = quiz_response_format()
+    # (job, use_cache) for the sources generated one at a time
+    individual: list[tuple[dict, bool]] = []
+    batched: dict[str, tuple[dict, str]] = {}
+
+    for job in jobs:
+        text, prepared = prepare_transcript(
+            job["transcript_text"], captions=job.get("input_type", "text") == "youtube"
+        )
+        job = {**job, "transcript_text": text}
+        if prepared["tokens_after"] > max_chunk_tokens:
+            individual.append((job, use_cache))
+            continue
+        prompt = build_quiz_prompt(job["transcript_text"], job["question_count"])
+        key = make_cache_key(prompt, model, temperature, job["question_count"], response_format)
+        cached = get_cached_response(key) if use_cache and OPENAI_CACHE_ENABLED else None
+        if cached is not None:
+            try:
+                results[job["source_id"]] = _fan_out(api_key, cached, job, use_cache)
+                continue
+            except Exception as e:
+                logger.warning(f"Cached answer for {job['source_id']} could not be used: {e}")
+        batched[job["source_id"]] = (job, key)
+
+    requests = [
+        build_batch_request(
+            source_id, build_quiz_prompt(job["transcript_text"], job["question_count"]),
+            model, temperature, response_format
+        )
+        for source_id, (job, _) in batched.items()
+    ]
+    for source_id, outcome in run_batch(api_key, requests).items():
+        job, key = batched[source_id]
+        if outcome["error"]:
+            logger.warning(f"Batch request for {source_id} failed: {outcome['error']}")
+            individual.append((job, False))
+            continue
+        response = outcome["response"]
+        record_openai_usage(response.get("usage"), model, price_factor=OPENAI_BATCH_PRICE_FACTOR)
+        if OPENAI_CACHE_ENABLED:
+            store_response(key, response)
+        try:
+            results[source_id] = _fan_out(api_key, response, job, use_cache)
+        except Exception as e:
+            logger.warning(f"Batch answer for {source_id} could not be completed: {e}")
+            individual.append((job, False))
+
+    if individual:
+        logger.info(f"Generating {len(individual)} quizzes one at a time")
+    for job, job_use_cache in individual:
+        try:
+            results[job["source_id"]] = generate_quiz(
+                api_key=api_key,
+                transcript_text=job["transcript_text"],
+                question_count=job["question_count"],
+                source_id=job["source_id"],
+                input_type=job.get("input_type", "text"),
+                use_cache=job_use_cache,
+                max_chunk_tokens=max_chunk_tokens,
+                preprocess=False
+            )
+        except Exception as e:
+            logger.error(f"Quiz for {job['source_id']} failed: {e}")
+            results[job["source_id"]] = e
+    return results
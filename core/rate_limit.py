@@ -0,0 +1,82 @@
+# Base libraries
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict
+
+# Local modules
+from utils.logger import get_logger
+from config.variable import BACKEND_RATE_LIMITS
+
+logger = get_logger(__name__)
+
+_limiters: Dict[str, "RateLimiter"] = {}
+_limiters_lock = threading.Lock()
+
+
+class RateLimiter:
+    """
+    Thread-safe limiter that caps concurrent calls to a backend and spaces
+    out the start of consecutive calls by a minimum interval.
+
+    Args:
+        name (str): Backend name, used for logging only.
+        max_concurrent (int): Maximum number of calls in flight at once.
+        min_interval (float): Minimum number of seconds between call starts.
+    """
+
+    def __init__(self, name: str, max_concurrent: int = 1, min_interval: float = 0.0):
+        self.name = name
+        self.max_concurrent = max(1, int(max_concurrent))
+        self.min_interval = max(0.0, float(min_interval))
+        self._semaphore = threading.BoundedSemaphore(self.max_concurrent)
+        self._lock = threading.Lock()
+        self._next_start = 0.0
+
+    def _wait_for_interval(self) -> None:
+        with self._lock:
+            now = time.monotonic()
+            start_at = max(now, self._next_start)
+            self._next_start = start_at + self.min_interval
+        delay = start_at - now
+        if delay > 0:
+            time.sleep(delay)
+
+    @contextmanager
+    def slot(self):
+        """Hold one of the backend's slots for the duration of the block."""
+        self._semaphore.acquire()
+        try:
+            self._wait_for_interval()
+            yield
+        finally:
+            self._semaphore.release()
+
+
+def get_rate_limiter(backend: str) -> RateLimiter:
+    """
+    Return the shared limiter for a backend, creating it on first use from
+    the limits configured in `BACKEND_RATE_LIMITS`.
+
+    Args:
+        backend (str): Backend name (e.g. 'youtube', 'openai', 'anki').
+
+    Returns:
+        RateLimiter: The process-wide limiter for that backend.
+    """
+    with _limiters_lock:
+        limiter = _limiters.get(backend)
+        if limiter is None:
+            limits = BACKEND_RATE_LIMITS.get(backend, {})
+            limiter = RateLimiter(backend, **limits)
+            _limiters[backend] = limiter
+            logger.info(
+                f"Created rate limiter for {backend}: "
+                f"max_concurrent={limiter.max_concurrent}, min_interval={limiter.min_interval}s"
+            )
+        return limiter
+
+
+def backend_slot(backend: str):
+    """Shortcut for `get_rate_limiter(backend).slot()`."""
+    return get_rate_limiter(backend).slot()
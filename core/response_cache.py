@@ -0,0 +1,224 @@
+# Base libraries
+import hashlib
+import json
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Optional
+
+# Local modules
+from utils.logger import get_logger
+from config.paths import OPENAI_CACHE_DIR
+from config.variable import (
+    OPENAI_CACHE_MAX_ENTRIES,
+    OPENAI_CACHE_MAX_BYTES,
+    OPENAI_CACHE_MAX_AGE_DAYS,
+    OPENAI_CACHE_EVICT_INTERVAL
+)
+
+logger = get_logger(__name__)
+
+_stats = {"hits": 0, "misses": 0, "stores": 0, "evictions": 0, "bypassed": 0}
+_stats_lock = threading.Lock()
+
+# Running size of each cache directory since its last scan, so a store only
+# scans the directory when a limit is crossed or the scan is stale:
+# {cache_dir: {'entries', 'bytes', 'scanned_at' (monotonic)}}
+_usage: dict[str, dict] = {}
+_usage_lock = threading.Lock()
+# Evicting after a store goes down to this share of the limits, so the next
+# stores don't each trigger another scan
+EVICT_LOW_WATERMARK = 0.9
+
+def _bump(counter: str, amount: int = 1) -> None:
+    with _stats_lock:
+        _stats[counter] += amount
+
+def make_cache_key(
+        prompt: str,
+        model: str,
+        temperature: float,
+        question_count: Optional[int] = None,
+        response_format: Optional[dict] = None
+    ) -> str:
+    """
+    Build a content-addressed cache key for an OpenAI completion.
+
+    Args:
+        prompt (str): The full prompt from `build_quiz_prompt`.
+        model (str): Model name, e.g. 'gpt-4o'.
+        temperature (float): Sampling temperature.
+        question_count (int, optional): Number of questions requested.
+        response_format (dict, optional): Structured output format, if any.
+            Left out of the key when unset, so older entries stay valid.
+
+    Returns:
+        str: Hex SHA-256 digest identifying the request.
+    """
+    request = {
+        "prompt": prompt,
+        "model": model,
+        "temperature": temperature,
+        "question_count": question_count,
+    }
+    if response_format:
+        request["response_format"] = response_format
+    payload = json.dumps(
+        request,
+        sort_keys=True,
+        ensure_ascii=False,
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+def _cache_path(key: str, cache_dir: Path) -> Path:
+    return Path(cache_dir) / f"{key}.json"
+
+def get_cached_response(
+        key: str,
+        cache_dir: Path = OPENAI_CACHE_DIR,
+        max_age_days: float = OPENAI_CACHE_MAX_AGE_DAYS
+    ) -> Optional[dict]:
+    """
+    Return the cached response dict for a key, or None on a miss.
+
+    Entries older than `max_age_days` count as misses and are removed.
+    A hit refreshes the entry's mtime so eviction is least-recently-used.
+    """
+    path = _cache_path(key, cache_dir)
+    try:
+        stat = path.stat()
+    except FileNotFoundError:
+        _bump("misses")
+        return None
+
+    if max_age_days and time.time() - stat.st_mtime > max_age_days * 86400:
+        path.unlink(missing_ok=True)
+        _bump("evictions")
+        _bump("misses")
+        logger.info(f"OpenAI cache entry expired: {key[:12]}")
+        return None
+
+    try:
+        with open(path, "r", encoding="utf-8") as file:
+            response_dict = json.load(file)
+    except (OSError, json.JSONDecodeError) as e:
+        logger.warning(f"Discarding unreadable OpenAI cache entry {key[:12]}: {e}")
+        path.unlink(missing_ok=True)
+        _bump("misses")
+        return None
+
+    os.utime(path, None)
+    _bump("hits")
+    logger.info(f"OpenAI cache hit: {key[:12]}")
+    return response_dict
+
+def store_response(
+        key: str,
+        response_dict: dict,
+        cache_dir: Path = OPENAI_CACHE_DIR
+    ) -> Path:
+    """
+    Persist a response dict under its key, then enforce the size limits.
+    The write goes through a temporary file so readers never see partial JSON.
+
+    The directory is only scanned (`evict_cache`) when the running total
+    crosses a limit, or every OPENAI_CACHE_EVICT_INTERVAL seconds to catch
+    expired entries and other processes' writes.
+    """
+    cache_dir = Path(cache_dir)
+    cache_dir.mkdir(parents=True, exist_ok=True)
+    path = _cache_path(key, cache_dir)
+    tmp_path = path.with_suffix(f".{os.getpid()}.{threading.get_ident()}.tmp")
+    try:
+        replaced_size = path.stat().st_size
+    except FileNotFoundError:
+        replaced_size = None
+
+    with open(tmp_path, "w", encoding="utf-8") as file:
+        json.dump(response_dict, file)
+    size = tmp_path.stat().st_size
+    os.replace(tmp_path, path)
+
+    _bump("stores")
+    logger.info(f"Stored OpenAI response in cache: {key[:12]}")
+    if replaced_size is None:
+        scan_due = _add_usage(cache_dir, 1, size)
+    else:
+        scan_due = _add_usage(cache_dir, 0, size - replaced_size)
+    if scan_due:
+        evict_cache(
+            cache_dir=cache_dir,
+            max_entries=int(OPENAI_CACHE_MAX_ENTRIES * EVICT_LOW_WATERMARK),
+            max_bytes=int(OPENAI_CACHE_MAX_BYTES * EVICT_LOW_WATERMARK),
+        )
+    return path
+
+def _add_usage(cache_dir: Path, entries: int, size: int) -> bool:
+    """Add a store to the running usage; True when `evict_cache` should scan."""
+    with _usage_lock:
+        usage = _usage.get(str(cache_dir))
+        if usage is None or time.monotonic() - usage["scanned_at"] > OPENAI_CACHE_EVICT_INTERVAL:
+            return True
+        usage["entries"] += entries
+        usage["bytes"] += size
+        return usage["entries"] > OPENAI_CACHE_MAX_ENTRIES or usage["bytes"] > OPENAI_CACHE_MAX_BYTES
+
+def evict_cache(
+        cache_dir: Path = OPENAI_CACHE_DIR,
+        max_entries: int = OPENAI_CACHE_MAX_ENTRIES,
+        max_bytes: int = OPENAI_CACHE_MAX_BYTES,
+        max_age_days: float = OPENAI_CACHE_MAX_AGE_DAYS
+    ) -> int:
+    """
+    Remove expired entries, then the least recently used ones until the
+    cache is within `max_entries` and `max_bytes`.
+
+    Returns:
+        int: Number of entries removed.
+    """
+    cache_dir = Path(cache_dir)
+    if not cache_dir.exists():
+        return 0
+
+    now = time.time()
+    entries = []
+    removed = 0
+    for path in cache_dir.glob("*.json"):
+        try:
+            stat = path.stat()
+        except FileNotFoundError:
+            continue
+        if max_age_days and now - stat.st_mtime > max_age_days * 86400:
+            path.unlink(missing_ok=True)
+            removed += 1
+            continue
+        entries.append((stat.st_mtime, stat.st_size, path))
+
+    entries.sort()  # oldest access first
+    total_bytes = sum(size for _, size, _ in entries)
+    while entries and (len(entries) > max_entries or total_bytes > max_bytes):
+        _, size, path = entries.pop(0)
+        path.unlink(missing_ok=True)
+        total_bytes -= size
+        removed += 1
+
+    with _usage_lock:
+        _usage[str(cache_dir)] = {"entries": len(entries), "bytes": total_bytes, "scanned_at": time.monotonic()}
+
+    if removed:
+        _bump("evictions", removed)
+        logger.info(f"Evicted {removed} OpenAI cache entries")
+    return removed
+
+def record_bypass() -> None:
+    """Count a request that skipped the cache on purpose."""
+    _bump("bypassed")
+
+def get_cache_stats() -> dict:
+    """Return a snapshot of the hit/miss/store/eviction counters."""
+    with _stats_lock:
+        stats = dict(_stats)
+    lookups = stats["hits"] + stats["misses"]
+    stats["hit_rate"] = round(stats["hits"] / lookups, 4) if lookups else 0.0
+    return stats
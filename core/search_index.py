@@ -0,0 +1,326 @@
+"""
+Full-text search over everything the pipeline has produced.
+
+Transcripts, video metadata and quizzes are indexed in a SQLite FTS5 table,
+one row per artifact. The pipeline updates the index as each stage writes
+its output; `rebuild` re-indexes the data directory file by file, skipping
+files whose size and mtime are unchanged.
+
+Usage:
+    python -m core.search_index search "dopamine motivation"
+    python -m core.search_index rebuild [--full]
+    python -m core.search_index stats
+"""
+# Base libraries
+import argparse
+import json
+import os
+import re
+import sqlite3
+import sys
+import threading
+from contextlib import closing
+from pathlib import Path
+from typing import Iterator, Optional
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+
+# Local modules
+from utils.logger import get_logger, setup_logging
+from config.paths import SEARCH_INDEX_PATH, TRANSCRIPTS_DIR, METADATA_DIR, PROCESSED_OPENAI_DIR
+from core.transcript_store import TranscriptReader, TRANSCRIPT_SUFFIX, LEGACY_SUFFIX
+
+logger = get_logger(__name__)
+
+KINDS = ("transcript", "metadata", "quiz")
+
+# Where each kind of artifact lives on disk, and its file suffixes, for rebuilds
+ARTIFACT_DIRS = {
+    "transcript": (TRANSCRIPTS_DIR, (TRANSCRIPT_SUFFIX, LEGACY_SUFFIX)),
+    "metadata": (METADATA_DIR, (".json",)),
+    "quiz": (PROCESSED_OPENAI_DIR, (".json",)),
+}
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS documents (
+    doc_id    INTEGER PRIMARY KEY,
+    source_id TEXT NOT NULL,
+    kind      TEXT NOT NULL,
+    title     TEXT,
+    path      TEXT,
+    size      INTEGER,
+    mtime_ns  INTEGER,
+    UNIQUE (source_id, kind)
+);
+CREATE VIRTUAL TABLE IF NOT EXISTS documents_fts USING fts5(
+    title, body, tokenize = 'porter unicode61'
+);
+"""
+
+_TOKEN = re.compile(r"\w+", re.UNICODE)
+_db_lock = threading.Lock()
+
+def _connect(db_path: Path = SEARCH_INDEX_PATH) -> sqlite3.Connection:
+    db_path = Path(db_path)
+    db_path.parent.mkdir(parents=True, exist_ok=True)
+    conn = sqlite3.connect(db_path, timeout=30)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.executescript(_SCHEMA)
+    return conn
+
+def _artifact_text(kind: str, path: Path) -> tuple[Optional[str], str]:
+    """(title, body) to index for an artifact file."""
+    if kind == "transcript":
+        if path.suffix == TRANSCRIPT_SUFFIX:
+            with TranscriptReader(path) as reader:
+                return None, reader.read_text()
+        return None, path.read_text(encoding="utf-8")
+
+    data = json.loads(path.read_text(encoding="utf-8"))
+    if kind == "metadata":
+        title = data.get("title")
+        body = " ".join(str(data.get(field) or "") for field in ("title", "channel", "uploader"))
+        return title, body
+
+    # quiz
+    return None, "\n".join(
+        f"{item.get('question', '')}\n{item.get('answer', '')}\n{item.get('explanation', '')}"
+        for item in data
+    )
+
+def _upsert(
+        conn: sqlite3.Connection,
+        source_id: str,
+        kind: str,
+        title: Optional[str],
+        body: str,
+        path: Optional[Path] = None
+    ) -> None:
+    stat = path.stat() if path is not None else None
+    row = conn.execute(
+        "SELECT doc_id FROM documents WHERE source_id = ? AND kind = ?", (source_id, kind)
+    ).fetchone()
+    values = (
+        title, str(path) if path is not None else None,
+        stat.st_size if stat else None, stat.st_mtime_ns if stat else None,
+    )
+    if row:
+        doc_id = row[0]
+        conn.execute(
+            "UPDATE documents SET title = ?, path = ?, size = ?, mtime_ns = ? WHERE doc_id = ?",
+            (*values, doc_id),
+        )
+        conn.execute("DELETE FROM documents_fts WHERE rowid = ?", (doc_id,))
+    else:
+        doc_id = conn.execute(
+            "INSERT INTO documents (source_id, kind, title, path, size, mtime_ns) VALUES (?, ?, ?, ?, ?, ?)",
+            (source_id, kind, *values),
+        ).lastrowid
+    conn.execute(
+        "INSERT INTO documents_fts (rowid, title, body) VALUES (?, ?, ?)",
+        (doc_id, title or "", body),
+    )
+
+def index_artifact(
+        source_id: str,
+        kind: str,
+        path: Optional[Path] = None,
+        text: Optional[str] = None,
+        db_path: Path = SEARCH_INDEX_PATH
+    ) -> bool:
+    """
+    Index (or re-index) one artifact of a source, from its file or from text
+    that was never written to disk (e.g. a pasted transcript). Given both,
+    `text` is indexed and `path` recorded, so the file is not read back.
+
+    Errors are logged rather than raised, so a broken index never fails a
+    pipeline run.
+
+    Returns:
+        bool: True if the artifact was indexed.
+    """
+    try:
+        path = Path(path) if path is not None else None
+        if text is not None:
+            title, body = None, text
+        elif path is not None:
+            title, body = _artifact_text(kind, path)
+        else:
+            title, body = None, ""
+        with _db_lock, closing(_connect(db_path)) as conn, conn:
+            _upsert(conn, source_id, kind, title, body, path)
+        return True
+    except (OSError, ValueError, sqlite3.Error) as e:
+        logger.warning(f"Could not index {kind} for {source_id}: {e}")
+        return False
+
+def _fts_query(query: str) -> str:
+    """Turn free text into an FTS5 query that matches all of its words."""
+    return " ".join(f'"{token}"' for token in _TOKEN.findall(query))
+
+def search(
+        query: str,
+        limit: int = 20,
+        kind: Optional[str] = None,
+        raw: bool = False,
+        db_path: Path = SEARCH_INDEX_PATH
+    ) -> list[dict]:
+    """
+    Find the artifacts that best match a query (BM25 ranking).
+
+    Args:
+        query (str): Words to look for. All must match, in any order.
+        limit (int): Maximum number of results.
+        kind (str, optional): Only search 'transcript', 'metadata' or 'quiz'.
+        raw (bool): Pass `query` to FTS5 unchanged (phrases, OR, NEAR, prefix*).
+
+    Returns:
+        list[dict]: Best first, each with 'source_id', 'kind', 'title'
+                    (the video title when known), 'snippet' and 'score'.
+
+    Raises:
+        ValueError: If a raw query isn't valid FTS5 syntax.
+    """
+    match = query if raw else _fts_query(query)
+    if not match:
+        return []
+
+    sql = """
+        SELECT d.source_id, d.kind, COALESCE(m.title, d.source_id),
+               snippet(documents_fts, 1, '**', '**', ' … ', 16), bm25(documents_fts)
+        FROM documents_fts
+        JOIN documents d ON d.doc_id = documents_fts.rowid
+        LEFT JOIN documents m ON m.source_id = d.source_id AND m.kind = 'metadata'
+        WHERE documents_fts MATCH ?
+    """
+    params: list = [match]
+    if kind:
+        sql += " AND d.kind = ?"
+        params.append(kind)
+    sql += " ORDER BY bm25(documents_fts) LIMIT ?"
+    params.append(limit)
+
+    with closing(_connect(db_path)) as conn:
+        try:
+            rows = conn.execute(sql, params).fetchall()
+        except sqlite3.OperationalError as e:
+            if not raw:
+                raise
+            raise ValueError(f"Invalid search query {query!r}: {e}") from e
+    return [
+        {"source_id": source_id, "kind": doc_kind, "title": title, "snippet": snippet, "score": round(-score, 4)}
+        for source_id, doc_kind, title, snippet, score in rows
+    ]
+
+def _iter_artifact_files() -> Iterator[tuple[str, str, os.DirEntry]]:
+    """Yield (source_id, kind, entry) for every artifact file, one directory at a time."""
+    for kind, (directory, suffixes) in ARTIFACT_DIRS.items():
+        if not Path(directory).exists():
+            continue
+        with os.scandir(directory) as entries:
+            for entry in entries:
+                suffix = next((s for s in suffixes if entry.name.endswith(s)), None)
+                if suffix and entry.is_file():
+                    yield entry.name[: -len(suffix)], kind, entry
+
+def rebuild(full: bool = False, db_path: Path = SEARCH_INDEX_PATH, commit_every: int = 200) -> dict:
+    """
+    Bring the index in line with the files on disk.
+
+    Files are read and indexed one at a time and committed in batches, so
+    memory use does not grow with the size of the data directory. Unless
+    `full` is set, files whose size and mtime match the index are skipped.
+    Entries whose file has been deleted are removed.
+
+    Returns:
+        dict: Counts of 'indexed', 'unchanged', 'removed' and 'failed' files.
+    """
+    summary = {"indexed": 0, "unchanged": 0, "removed": 0, "failed": 0}
+
+    with _db_lock, closing(_connect(db_path)) as conn, conn:
+        if full:
+            conn.execute(
+                "DELETE FROM documents_fts WHERE rowid IN (SELECT doc_id FROM documents WHERE path IS NOT NULL)"
+            )
+            conn.execute("DELETE FROM documents WHERE path IS NOT NULL")
+        known = {
+            (source_id, kind): (size, mtime_ns)
+            for source_id, kind, size, mtime_ns in conn.execute(
+                "SELECT source_id, kind, size, mtime_ns FROM documents WHERE path IS NOT NULL"
+            )
+        }
+
+        seen = set()
+        pending = 0
+        for source_id, kind, entry in _iter_artifact_files():
+            seen.add((source_id, kind))
+            stat = entry.stat()
+            if known.get((source_id, kind)) == (stat.st_size, stat.st_mtime_ns):
+                summary["unchanged"] += 1
+                continue
+            try:
+                path = Path(entry.path)
+                title, body = _artifact_text(kind, path)
+                _upsert(conn, source_id, kind, title, body, path)
+                summary["indexed"] += 1
+            except (OSError, ValueError) as e:
+                logger.warning(f"Could not index {entry.path}: {e}")
+                summary["failed"] += 1
+                continue
+            pending += 1
+            if pending >= commit_every:
+                conn.commit()
+                pending = 0
+
+        for source_id, kind in set(known) - seen:
+            doc_id = conn.execute(
+                "SELECT doc_id FROM documents WHERE source_id = ? AND kind = ?", (source_id, kind)
+            ).fetchone()[0]
+            conn.execute("DELETE FROM documents_fts WHERE rowid = ?", (doc_id,))
+            conn.execute("DELETE FROM documents WHERE doc_id = ?", (doc_id,))
+            summary["removed"] += 1
+
+        conn.execute("INSERT INTO documents_fts (documents_fts) VALUES ('optimize')")
+
+    logger.info(
+        f"Search index rebuilt: {summary['indexed']} indexed, {summary['unchanged']} unchanged, "
+        f"{summary['removed']} removed, {summary['failed']} failed"
+    )
+    return summary
+
+def index_stats(db_path: Path = SEARCH_INDEX_PATH) -> dict:
+    """Number of indexed artifacts per kind, and of distinct sources."""
+    with closing(_connect(db_path)) as conn:
+        counts = dict(conn.execute("SELECT kind, COUNT(*) FROM documents GROUP BY kind").fetchall())
+        sources = conn.execute("SELECT COUNT(DISTINCT source_id) FROM documents").fetchone()[0]
+    return {"sources": sources, **{kind: counts.get(kind, 0) for kind in KINDS}}
+
+def main(argv: Optional[list] = None) -> int:
+    parser = argparse.ArgumentParser(description="Search or rebuild the full-text index.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    search_parser = subparsers.add_parser("search", help="Search transcripts, metadata and quizzes")
+    search_parser.add_argument("query")
+    search_parser.add_argument("--limit", type=int, default=20)
+    search_parser.add_argument("--kind", choices=KINDS)
+    search_parser.add_argument("--raw", action="store_true", help="Use FTS5 query syntax")
+
+    rebuild_parser = subparsers.add_parser("rebuild", help="Index new and changed files")
+    rebuild_parser.add_argument("--full", action="store_true", help="Re-index every file")
+
+    subparsers.add_parser("stats", help="Show what is indexed")
+    args = parser.parse_args(argv)
+    setup_logging()
+
+    if args.command == "search":
+        try:
+            print(json.dumps(search(args.query, limit=args.limit, kind=args.kind, raw=args.raw), indent=2))
+        except ValueError as e:
+            parser.error(str(e))
+    elif args.command == "rebuild":
+        print(json.dumps(rebuild(full=args.full)))
+    else:
+        print(json.dumps(index_stats()))
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,15 +1,28 @@
-from pathlib import Path
+import threading
+
 from utils.logger import get_logger
+from config.paths import DATA_DIRECTORIES
 
-BASE_DIR = Path(__file__).resolve().parents[1]
 logger = get_logger(__name__)
 
+_created = False
+_created_lock = threading.Lock()
+
 def create_directories() -> None:
-    """Creates directories for each path in dir_paths if they do not already exist"""
-    dir_paths = ['data/raw/openai_responses', 'data/raw/transcripts', 'data/intermediate/metadata', 'data/processed/openai_responses']
-
-    for path_str in dir_paths:
-        path = BASE_DIR / path_str
-        if not path.exists():
-            path.mkdir(parents=True, exist_ok=True)
-            logger.info("Created directory:", path)
\ No newline at end of file
+    """
+    Create the data directories if they do not already exist.
+
+    Runs once per process; entry points (the pipeline, CLI, API and app)
+    call it at startup, and later calls return immediately.
+    """
+    global _created
+    if _created:
+        return
+    with _created_lock:
+        if _created:
+            return
+        for path in DATA_DIRECTORIES:
+            if not path.exists():
+                path.mkdir(parents=True, exist_ok=True)
+                logger.info(f"Created directory: {path}")
+        _created = True
@@ -0,0 +1,169 @@
+# Base libraries
+import hashlib
+import json
+import re
+from pathlib import Path
+from urllib.parse import urlparse, parse_qs
+from typing import Iterable, Iterator, Optional, Union
+
+# Local modules
+from utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+# Bare YouTube playlist IDs: user playlists, uploads, likes and mixes
+_PLAYLIST_ID = re.compile(r"^(PL|UU|LL|FL|OL|RD)[\w-]{10,}$")
+_CHANNEL_PATH = re.compile(r"^/(@[^/]+|channel/[^/]+|c/[^/]+|user/[^/]+)(/(videos|shorts|streams|featured))?/?$")
+
+def make_text_source_id(transcript_text: str) -> str:
+    """
+    Build a stable source id for pasted text from a hash of its content,
+    so different texts in one batch never overwrite each other's outputs.
+    """
+    digest = hashlib.sha1(transcript_text.encode("utf-8")).hexdigest()[:12]
+    return f"text_{digest}"
+
+def is_playlist(value: str) -> bool:
+    """True for a bare playlist ID or a playlist URL (not a video within one)."""
+    if _PLAYLIST_ID.match(value):
+        return True
+    parsed = urlparse(value)
+    query = parse_qs(parsed.query)
+    return bool(parsed.hostname) and "list" in query and "v" not in query
+
+def is_channel(value: str) -> bool:
+    """True for a YouTube channel URL (/@handle, /channel/<id>, /c/, /user/)."""
+    parsed = urlparse(value)
+    return (parsed.hostname or "").endswith("youtube.com") and bool(_CHANNEL_PATH.match(parsed.path))
+
+def is_collection(value: str) -> bool:
+    """True for anything that expands to many videos: a playlist or a channel."""
+    return is_playlist(value) or is_channel(value)
+
+def expand_sources(entries: Iterable[Union[str, dict]]) -> Iterator[Union[str, dict]]:
+    """
+    Yield batch entries with every playlist and channel replaced by its
+    videos, as they are listed. Videos already yielded (e.g. in two
+    playlists) are skipped. Dict entries keep their other keys.
+
+    A collection that can't be listed (private, deleted, network error)
+    is logged and yielded as {'url': ..., 'listing_error': ...}, which
+    `normalize_source` rejects, so the batch reports it as a failure and
+    carries on with the other sources.
+    """
+    seen = set()
+    for entry in entries:
+        url = entry if isinstance(entry, str) else entry.get("url") or entry.get("youtube_url")
+        if not url or not is_collection(url):
+            yield entry
+            continue
+
+        from core.transcript_service import iter_collection_videos
+        try:
+            for video_url in iter_collection_videos(url):
+                if video_url in seen:
+                    continue
+                seen.add(video_url)
+                if isinstance(entry, str):
+                    yield video_url
+                else:
+                    yield {**{k: v for k, v in entry.items() if k not in ("url", "youtube_url", "source_id")}, "url": video_url}
+        except Exception as e:
+            logger.error(f"Could not list the videos of {url}: {e}")
+            yield {"url": url, "listing_error": f"{type(e).__name__}: {e}"}
+
+def normalize_source(entry: Union[str, dict]) -> dict:
+    """
+    Normalize a batch entry into the keyword arguments used by
+    `run_learning_pipeline`.
+
+    Accepted forms:
+        - "https://www.youtube.com/watch?v=<id>" (any http(s) URL)
+        - {"url": ...} / {"youtube_url": ...}
+        - {"text": ...} / {"transcript_text": ...}
+        - {"text_file": "path/to/file.txt"}
+
+    Dict entries may also carry "source_id" and "question_count".
+
+    Args:
+        entry (str | dict): A single source from a list or manifest.
+
+    Returns:
+        dict: Keys 'input_type', 'youtube_url', 'transcript_text',
+              'source_id' and optionally 'question_count'.
+    """
+    if isinstance(entry, str):
+        entry = entry.strip()
+        if entry.startswith(("http://", "https://")):
+            entry = {"url": entry}
+        else:
+            entry = {"text": entry}
+
+    if not isinstance(entry, dict):
+        raise TypeError(f"Unsupported source entry: {entry!r}")
+    if entry.get("listing_error"):
+        raise ValueError(f"Could not list the videos of {entry.get('url')}: {entry['listing_error']}")
+
+    youtube_url = entry.get("youtube_url") or entry.get("url")
+    transcript_text = entry.get("transcript_text") or entry.get("text")
+
+    if entry.get("text_file"):
+        transcript_text = Path(entry["text_file"]).read_text(encoding="utf-8")
+
+    if youtube_url:
+        source = {
+            "input_type": "youtube",
+            "youtube_url": youtube_url,
+            "transcript_text": None,
+            "source_id": entry.get("source_id"),
+        }
+    elif transcript_text:
+        source = {
+            "input_type": "text",
+            "youtube_url": None,
+            "transcript_text": transcript_text,
+            "source_id": entry.get("source_id") or make_text_source_id(transcript_text),
+        }
+    else:
+        raise ValueError(f"Source entry has neither a URL nor text: {entry!r}")
+
+    if entry.get("question_count") is not None:
+        source["question_count"] = int(entry["question_count"])
+
+    return source
+
+def load_manifest(manifest_path: Union[str, Path]) -> list[dict]:
+    """
+    Read a JSONL manifest of sources, one JSON object (or bare URL string)
+    per line. Blank lines and lines starting with '#' are ignored.
+
+    Args:
+        manifest_path (str | Path): Path to the manifest file.
+
+    Returns:
+        list[dict]: The raw entries, ready for `normalize_source`.
+    """
+    entries = []
+    with open(manifest_path, "r", encoding="utf-8") as file:
+        for line_no, line in enumerate(file, 1):
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            try:
+                entries.append(json.loads(line))
+            except json.JSONDecodeError:
+                if line.startswith(("http://", "https://")):
+                    entries.append(line)
+                else:
+                    raise ValueError(f"Invalid manifest line {line_no} in {manifest_path}")
+
+    logger.info(f"Loaded {len(entries)} sources from manifest {manifest_path}")
+    return entries
+
+def describe_source(entry: Union[str, dict], source: Optional[dict] = None) -> str:
+    """Return a short human-readable label for a source, used in batch results."""
+    if source:
+        return source.get("youtube_url") or source.get("source_id") or "text"
+    if isinstance(entry, dict):
+        return entry.get("url") or entry.get("youtube_url") or entry.get("source_id") or entry.get("text_file") or "text"
+    return entry[:80]
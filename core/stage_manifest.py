@@ -0,0 +1,131 @@
+# Base libraries
+import hashlib
+import json
+import os
+import threading
+from datetime import datetime
+from pathlib import Path
+from typing import Iterable, Optional
+
+# Local modules
+from utils.logger import get_logger
+from config.paths import MANIFESTS_DIR
+
+logger = get_logger(__name__)
+
+# Pipeline stages in dependency order
+STAGES = ("transcript", "metadata", "quiz", "pdf", "anki")
+
+def fingerprint(*parts) -> str:
+    """Hash a stage's inputs (any JSON-serializable values) into a fingerprint."""
+    payload = json.dumps(parts, sort_keys=True, default=str, ensure_ascii=False)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+def text_digest(text: str) -> str:
+    """SHA-256 of a string, used to fingerprint transcripts."""
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+def file_digest(path: Path) -> Optional[str]:
+    """SHA-256 of a file's contents, or None if it doesn't exist."""
+    sha = hashlib.sha256()
+    try:
+        with open(path, "rb") as file:
+            for block in iter(lambda: file.read(1 << 20), b""):
+                sha.update(block)
+    except FileNotFoundError:
+        return None
+    return sha.hexdigest()
+
+def forced_stages(force: bool = False, from_stage: Optional[str] = None) -> set:
+    """
+    Stages that must run regardless of their manifest entry.
+
+    Args:
+        force (bool): Re-run every stage.
+        from_stage (str, optional): Re-run this stage and every stage after it.
+    """
+    if force:
+        return set(STAGES)
+    if from_stage is None:
+        return set()
+    if from_stage not in STAGES:
+        raise ValueError(f"Unknown stage '{from_stage}'. Expected one of: {', '.join(STAGES)}")
+    return set(STAGES[STAGES.index(from_stage):])
+
+class StageManifest:
+    """
+    Per-source record of which pipeline stages have completed, with the
+    fingerprint of the inputs each one ran on and the artifacts it wrote.
+
+    A stage is fresh when its recorded fingerprint matches the current one
+    and all of its outputs still exist; fresh stages are skipped, so a
+    crashed or repeated run resumes at the first missing or stale stage.
+
+    Args:
+        source_id (str): YouTube video ID or text source id.
+        manifest_dir (Path): Directory holding `<source_id>.json` manifests.
+    """
+
+    def __init__(self, source_id: str, manifest_dir: Path = MANIFESTS_DIR):
+        self.source_id = source_id
+        self.path = Path(manifest_dir) / f"{source_id}.json"
+        self._lock = threading.Lock()
+        self.stages: dict = {}
+
+        if self.path.exists():
+            try:
+                with open(self.path, "r", encoding="utf-8") as file:
+                    self.stages = json.load(file).get("stages", {})
+            except (OSError, json.JSONDecodeError) as e:
+                logger.warning(f"Ignoring unreadable manifest {self.path}: {e}")
+
+    def is_fresh(self, stage: str, stage_fingerprint: str) -> bool:
+        """True if the stage already ran on these inputs and its outputs exist."""
+        entry = self.stages.get(stage)
+        if not entry or entry.get("fingerprint") != stage_fingerprint:
+            return False
+        return all(Path(output).exists() for output in entry.get("outputs", []))
+
+    def should_run(self, stage: str, stage_fingerprint: str, forced: Iterable[str] = ()) -> bool:
+        """Decide whether a stage needs to run, logging the reason."""
+        if stage in forced:
+            logger.info(f"[{self.source_id}] Running stage '{stage}' (forced)")
+            return True
+        if self.is_fresh(stage, stage_fingerprint):
+            logger.info(f"[{self.source_id}] Skipping stage '{stage}' (up to date)")
+            return False
+        logger.info(f"[{self.source_id}] Running stage '{stage}' (missing or stale)")
+        return True
+
+    def get(self, stage: str) -> dict:
+        return self.stages.get(stage, {})
+
+    def record(
+            self,
+            stage: str,
+            stage_fingerprint: str,
+            outputs: Iterable = (),
+            **details
+        ) -> None:
+        """Mark a stage complete and write the manifest to disk."""
+        with self._lock:
+            self.stages[stage] = {
+                "fingerprint": stage_fingerprint,
+                "outputs": [str(output) for output in outputs],
+                "completed_at": datetime.now().isoformat(timespec="seconds"),
+                **details,
+            }
+            self._save()
+
+    def invalidate(self, stage: str) -> None:
+        """Forget a stage so it runs again next time."""
+        with self._lock:
+            if self.stages.pop(stage, None) is not None:
+                self._save()
+
+    def _save(self) -> None:
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.path.with_suffix(f".{os.getpid()}.{threading.get_ident()}.tmp")
+        with open(tmp_path, "w", encoding="utf-8") as file:
+            json.dump({"source_id": self.source_id, "stages": self.stages}, file, indent=2)
+        os.replace(tmp_path, self.path)
@@ -0,0 +1,101 @@
+# Base libraries
+import json
+from typing import Iterable, Iterator
+
+# Local modules
+from utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+class IncrementalQuizParser:
+    """
+    Incremental parser for a JSON array of quiz objects arriving in pieces.
+
+    Text before the first '[' (such as a ```json fence or a sentence of
+    preamble) is skipped. Each top-level object of the array is decoded and
+    returned as soon as its closing brace arrives, so callers can act on
+    early questions while the model is still writing later ones.
+    """
+
+    def __init__(self):
+        self._in_array = False
+        self._done = False
+        self._depth = 0          # nesting depth inside the current element
+        self._in_string = False
+        self._escaped = False
+        self._buffer: list[str] = []
+        self.items_parsed = 0
+        self.items_skipped = 0
+
+    def feed(self, text: str) -> list[dict]:
+        """
+        Consume the next piece of text.
+
+        Returns:
+            list[dict]: Objects completed by this piece, in order.
+        """
+        completed = []
+        for char in text:
+            if self._done:
+                break
+
+            if not self._in_array:
+                if char == "[":
+                    self._in_array = True
+                continue
+
+            if self._depth == 0:
+                # Between elements: only an opening brace or the closing bracket matter
+                if char == "{":
+                    self._depth = 1
+                    self._buffer = [char]
+                elif char == "]":
+                    self._done = True
+                continue
+
+            self._buffer.append(char)
+            if self._in_string:
+                if self._escaped:
+                    self._escaped = False
+                elif char == "\\":
+                    self._escaped = True
+                elif char == '"':
+                    self._in_string = False
+                continue
+
+            if char == '"':
+                self._in_string = True
+            elif char in "{[":
+                self._depth += 1
+            elif char in "}]":
+                self._depth -= 1
+                if self._depth == 0:
+                    item = self._decode("".join(self._buffer))
+                    self._buffer = []
+                    if item is not None:
+                        completed.append(item)
+        return completed
+
+    def _decode(self, raw: str):
+        try:
+            item = json.loads(raw)
+        except json.JSONDecodeError as e:
+            self.items_skipped += 1
+            logger.warning(f"Skipping malformed streamed quiz item: {e}")
+            return None
+        if not isinstance(item, dict):
+            self.items_skipped += 1
+            return None
+        self.items_parsed += 1
+        return item
+
+    @property
+    def finished(self) -> bool:
+        """True once the closing bracket of the array has been seen."""
+        return self._done
+
+def iter_quiz_items(deltas: Iterable[str]) -> Iterator[dict]:
+    """Yield quiz objects from a stream of text deltas as each one closes."""
+    parser = IncrementalQuizParser()
+    for delta in deltas:
+        yield from parser.feed(delta)
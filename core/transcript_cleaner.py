@@ -0,0 +1,268 @@
+"""
+Transcript preprocessing before quiz prompts.
+
+Auto-generated YouTube captions arrive as short rolling lines that repeat
+the end of the previous line, with `[Music]`-style markers, `>>` speaker
+changes and filler words. `clean_transcript` merges them back into one
+sentence per line, without the repeats, markers and fillers; plain text
+sources only get their whitespace normalized.
+
+When a transcript is still over the token budget, `trim_to_budget` keeps
+the most informative sentences (SumBasic-style word frequency scoring)
+from every part of the transcript, in their original order, instead of
+cutting it off at the end.
+
+Stored transcripts are left verbatim; only the prompt text is cleaned.
+
+Usage:
+    python -m core.transcript_cleaner VIDEO_ID [--budget 8000]
+"""
+# Base libraries
+import argparse
+import html
+import json
+import re
+import sys
+from collections import Counter
+from pathlib import Path
+from typing import Optional
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+
+# Local modules
+from utils.logger import get_logger, setup_logging
+from utils.metrics import add_to_span
+from config.variable import TRANSCRIPT_PREPROCESS, TRANSCRIPT_TOKEN_BUDGET
+from core.chunker import count_tokens, truncate_to_tokens
+
+logger = get_logger(__name__)
+
+# Bump when cleaning or trimming changes, so quiz stages re-run (see core.pipeline.quiz_fingerprint)
+PREPROCESS_VERSION = 3
+
+# [Music], [Applause], (laughter), ♪ ... ♪ and the >> speaker-change marker
+_MARKER = re.compile(
+    r"\[[^\[\]]{1,40}\]|\((?:music|applause|laughter|laughs|inaudible|silence|cheering)\)|\u266a+|>>",
+    re.IGNORECASE,
+)
+_INVISIBLE = re.compile(r"[\u200b\u200c\u200d\u2060\ufeff]")
+_SPACES = re.compile(r"[ \t\u00a0]+")
+_SENTENCE_END = re.compile(r"[.!?][\"')\]]*$")
+_SENTENCE_SPLIT = re.compile(r"(?<=[.!?])\s+")
+_WORD = re.compile(r"[a-z0-9']+")
+
+FILLER_WORDS = frozenset({"um", "umm", "uh", "uhh", "uh-huh", "er", "erm", "hmm", "mm", "mhm"})
+_STOPWORDS = frozenset(
+    "the a an and or but if of to in on at for with as by is are was were be been it its this that "
+    "these those we you they he she i me my our your their them so do does did not no yes can will "
+    "just like what which who how when where there here then than from about into out up down all "
+    "have has had would could should very really going get got know think thing things kind sort".split()
+)
+
+# Words a caption line may repeat from the end of the previous one. Shorter
+# overlaps are real speech ("I said no" / "no way") unless they are the whole
+# previous line
+MIN_OVERLAP_WORDS = 2
+MAX_OVERLAP_WORDS = 30
+# Unpunctuated captions are cut into units at the first line break after this many words
+UNPUNCTUATED_UNIT_WORDS = 30
+MAX_UNIT_WORDS = 80
+# Sentences per section when trimming; each section keeps its share of the budget
+TRIM_SECTION_UNITS = 20
+
+def _strip_markers(line: str) -> str:
+    if "&" in line:
+        line = html.unescape(line)
+    line = _INVISIBLE.sub("", _MARKER.sub(" ", line))
+    return _SPACES.sub(" ", line).strip()
+
+def _overlap(previous: list[str], words: list[str], previous_line: int) -> int:
+    """
+    Length of the longest run at the end of `previous` that `words` starts
+    with: at least MIN_OVERLAP_WORDS words, or the whole previous line
+    (`previous_line` words long).
+    """
+    if not previous or not words:
+        return 0
+    first = words[0].lower()
+    for k in range(min(len(words), len(previous), MAX_OVERLAP_WORDS), 0, -1):
+        if k < MIN_OVERLAP_WORDS and k != previous_line:
+            break
+        if previous[-k].lower() == first and all(
+            a.lower() == b.lower() for a, b in zip(previous[-k:], words[:k])
+        ):
+            return k
+    return 0
+
+def _drop_fillers(words: list[str], kept: list[str]) -> list[str]:
+    """Remove filler words, moving any sentence punctuation they carried onto the word before."""
+    result = []
+    for word in words:
+        if word.lower().rstrip(",.!?") not in FILLER_WORDS:
+            result.append(word)
+            continue
+        end = word[-1] if word[-1] in ".!?" else ""
+        target = result if result else kept
+        if end and target and not _SENTENCE_END.search(target[-1]):
+            target[-1] = target[-1].rstrip(",") + end
+    return result
+
+def clean_captions(text: str) -> str:
+    """
+    Merge caption fragments (one per line) into sentences, one per line,
+    without rolling-caption repeats, markers, fillers or extra whitespace.
+
+    Captions without punctuation are cut at the first line break after
+    UNPUNCTUATED_UNIT_WORDS words instead.
+    """
+    # (word, whether a caption line ends after it)
+    words: list[str] = []
+    line_ends: list[bool] = []
+    previous_line = 0
+    for line in text.splitlines():
+        line_words = _drop_fillers(_strip_markers(line).split(), words)
+        if not line_words:
+            continue
+        overlap = _overlap(words, line_words, previous_line)
+        previous_line = len(line_words)
+        line_words = line_words[overlap:]
+        if not line_words:
+            continue
+        words.extend(line_words)
+        line_ends.extend([False] * (len(line_words) - 1) + [True])
+
+    units, current = [], []
+    for word, line_end in zip(words, line_ends):
+        current.append(word)
+        if (
+            _SENTENCE_END.search(word)
+            or (line_end and len(current) >= UNPUNCTUATED_UNIT_WORDS)
+            or len(current) >= MAX_UNIT_WORDS
+        ):
+            units.append(" ".join(current))
+            current = []
+    if current:
+        units.append(" ".join(current))
+    return "\n".join(units)
+
+def normalize_whitespace(text: str) -> str:
+    """Collapse runs of spaces and blank lines, keeping the line structure of plain text."""
+    lines = [_SPACES.sub(" ", _INVISIBLE.sub("", line)).strip() for line in text.splitlines()]
+    return re.sub(r"\n{3,}", "\n\n", "\n".join(lines)).strip()
+
+def clean_transcript(text: str, captions: bool = True) -> str:
+    """Clean caption text (`clean_captions`), or just the whitespace of plain text."""
+    return clean_captions(text) if captions else normalize_whitespace(text)
+
+def _content_words(unit: str) -> list[str]:
+    return [w for w in _WORD.findall(unit.lower()) if len(w) > 2 and w not in _STOPWORDS]
+
+def trim_to_budget(text: str, max_tokens: int, model: str = "gpt-4o") -> str:
+    """
+    Keep the most informative sentences of a text within `max_tokens`.
+
+    Sentences are scored by the average frequency of their content words
+    across the whole text (SumBasic), so sentences about the recurring
+    topics win over asides. The text is split into sections of
+    TRIM_SECTION_UNITS sentences, and each section keeps its share of the
+    budget (plus whatever earlier sections left unused), so the result
+    still covers the whole transcript. Kept sentences stay in order.
+
+    If no sentence fits its section's share (e.g. unpunctuated text that is
+    one long sentence, or a tiny budget), the top-scoring sentence is kept,
+    cut to `max_tokens`, so the result is never empty.
+    """
+    units = [
+        sentence
+        for line in text.splitlines() if line.strip()
+        for sentence in _SENTENCE_SPLIT.split(line.strip())
+    ]
+    # +1 for the line break each kept sentence is joined with
+    costs = [count_tokens(unit, model) + 1 for unit in units]
+    total = sum(costs)
+    if total <= max_tokens:
+        return "\n".join(units)
+
+    unit_words = [_content_words(unit) for unit in units]
+    frequencies = Counter(word for words in unit_words for word in words)
+    scores = [
+        sum(frequencies[word] for word in words) / len(words) if words else 0.0
+        for words in unit_words
+    ]
+
+    ratio = max_tokens / total
+    keep = [False] * len(units)
+    spare = 0.0
+    for start in range(0, len(units), TRIM_SECTION_UNITS):
+        section = range(start, min(start + TRIM_SECTION_UNITS, len(units)))
+        allowance = sum(costs[i] for i in section) * ratio + spare
+        for i in sorted(section, key=lambda i: scores[i], reverse=True):
+            if costs[i] <= allowance:
+                keep[i] = True
+                allowance -= costs[i]
+        spare = allowance
+
+    if not any(keep):
+        best = max(range(len(units)), key=lambda i: scores[i])
+        logger.info(f"No sentence fits {max_tokens} tokens; keeping the top-scoring one, cut to the budget")
+        return truncate_to_tokens(units[best], max_tokens, model)
+
+    logger.info(f"Kept {sum(keep)} of {len(units)} sentences to fit {max_tokens} tokens")
+    return "\n".join(unit for unit, kept in zip(units, keep) if kept)
+
+def preprocess_fingerprint() -> list:
+    """The settings that change the prompt text, for stage fingerprints."""
+    return [PREPROCESS_VERSION, TRANSCRIPT_PREPROCESS, TRANSCRIPT_TOKEN_BUDGET]
+
+def prepare_transcript(
+        text: str,
+        captions: bool = True,
+        max_tokens: int = TRANSCRIPT_TOKEN_BUDGET,
+        model: str = "gpt-4o"
+    ) -> tuple[str, dict]:
+    """
+    The transcript text to put in quiz prompts: cleaned (when
+    TRANSCRIPT_PREPROCESS is on) and trimmed to `max_tokens` (0 for no
+    budget).
+
+    Args:
+        text (str): The stored transcript text.
+        captions (bool): The text is caption lines (YouTube), not prose.
+        max_tokens (int): Token budget for the transcript.
+
+    Returns:
+        tuple: (text, {'tokens_before', 'tokens_after', 'trimmed'})
+    """
+    tokens_before = count_tokens(text, model)
+    prepared = clean_transcript(text, captions) if TRANSCRIPT_PREPROCESS else text
+    tokens_after = count_tokens(prepared, model)
+
+    trimmed = bool(max_tokens) and tokens_after > max_tokens
+    if trimmed:
+        prepared = trim_to_budget(prepared, max_tokens, model)
+        tokens_after = count_tokens(prepared, model)
+
+    add_to_span("transcript_tokens_before", tokens_before)
+    add_to_span("transcript_tokens_after", tokens_after)
+    saved = 1 - tokens_after / tokens_before if tokens_before else 0.0
+    logger.info(
+        f"Transcript prepared: {tokens_before} -> {tokens_after} tokens ({saved:.0%} fewer)"
+        f"{', trimmed to budget' if trimmed else ''}"
+    )
+    return prepared, {"tokens_before": tokens_before, "tokens_after": tokens_after, "trimmed": trimmed}
+
+def main(argv: Optional[list] = None) -> int:
+    from core.transcript_store import read_transcript_text
+
+    parser = argparse.ArgumentParser(description="Show what preprocessing does to a stored transcript.")
+    parser.add_argument("video_id")
+    parser.add_argument("--budget", type=int, default=TRANSCRIPT_TOKEN_BUDGET, help="Token budget (0 for none)")
+    parser.add_argument("--stats", action="store_true", help="Print only the token counts")
+    args = parser.parse_args(argv)
+    setup_logging()
+
+    text, stats = prepare_transcript(read_transcript_text(args.video_id), max_tokens=args.budget)
+    print(json.dumps(stats) if args.stats else text)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,20 +1,58 @@
 # Base packages
 import json
+import random
+import threading
+import time
+from collections import OrderedDict
+from functools import lru_cache
 from pathlib import Path
+from typing import Iterator, Optional
 import sys
 sys.path.append(str(Path(__file__).resolve().parents[1]))
 
-# 3rd party packages
-import yt_dlp
-from youtube_transcript_api import YouTubeTranscriptApi
 from urllib.parse import urlparse, parse_qs
 
 # Local modules
 from utils.logger import get_logger
 from config.paths import TRANSCRIPTS_DIR, METADATA_DIR
+from config.variable import (
+    METADATA_FIELDS,
+    METADATA_EXTRACTOR_ARGS,
+    METADATA_MEMORY_CACHE_SIZE,
+    TRANSCRIPT_MAX_RETRIES,
+    TRANSCRIPT_BACKOFF_BASE
+)
+from core.rate_limit import backend_slot
+from core.transcript_store import write_transcript, transcript_path, LEGACY_SUFFIX
 
 logger = get_logger(__name__)
 
+# yt_dlp and youtube_transcript_api are imported on first use, so URL parsing
+# and cached metadata lookups don't pay for them
+
+@lru_cache(maxsize=None)
+def permanent_transcript_errors() -> tuple:
+    """
+    Errors that retrying cannot fix; anything else (network errors, YouTube
+    throttling) is retried with backoff.
+    """
+    from youtube_transcript_api import (
+        TranscriptsDisabled,
+        NoTranscriptFound,
+        VideoUnavailable,
+        VideoUnplayable,
+        InvalidVideoId,
+        AgeRestricted
+    )
+    return (
+        TranscriptsDisabled, NoTranscriptFound, VideoUnavailable,
+        VideoUnplayable, InvalidVideoId, AgeRestricted,
+    )
+
+# Compact metadata records by video id, most recently used last
+_metadata_cache: "OrderedDict[str, dict]" = OrderedDict()
+_metadata_cache_lock = threading.Lock()
+
 def extract_video_id(url: str) -> None:
     """
     Extracts the YouTube video ID from a given YouTube URL.
@@ -23,6 +61,9 @@ def extract_video_id(url: str) -> None:
         - youtu.be/<id>
         - youtube.com/watch?v=<id>
         - youtube.com/embed/<id>
+        - youtube.com/shorts/<id>
+        - youtube.com/live/<id>
+        - youtube.com/v/<id>
 
     Args:
         url (str): The full YouTube video URL.
@@ -44,109 +85,241 @@ def extract_video_id(url: str) -> None:
         logger.info("Successfully extracted video id")
         return parse_qs(parsed_url.query).get("v", [None])[0]
     
-    # Case 3: youtube.com/embed/<id>
-    if parsed_url.path.startswith("/embed/"):
+    # Case 3: youtube.com/embed/<id>, /shorts/<id>, /live/<id>, /v/<id>
+    if parsed_url.path.startswith(("/embed/", "/shorts/", "/live/", "/v/")):
         logger.info("Successfully extracted video id")
         return parsed_url.path.split("/")[2]
     
     logger.error("No video id found")
     return None
 
-def transcribe_youtube_video(video_id: str) -> list[dict]:
+def transcribe_youtube_video(video_id: str, max_retries: int = TRANSCRIPT_MAX_RETRIES) -> list[dict]:
     """
-    Fetches the transcript of a YouTube video and writes it to a text file.
+    Fetches the transcript of a YouTube video.
+
+    Each attempt holds a slot of the shared YouTube rate limiter; transient
+    failures are retried with exponential backoff (outside the slot), while
+    videos without transcripts fail at once.
 
     Args:
         video_id (str): The YouTube video ID.
+        max_retries (int): Attempts before giving up.
 
     Returns:
         list[dict]: The raw transcript data, where each entry contains text and timing information
     """
+    from youtube_transcript_api import YouTubeTranscriptApi
+
     logger.info("Transcribing Youtube Video...")
-    try:
-        # Fetch transcript and convert to raw dictionary
-        fetched = YouTubeTranscriptApi().fetch(video_id)
-        raw = fetched.to_raw_data()
-    except Exception as e:
-        logger.error(f"Error transcribing video: {str(e)}")
-        
+    permanent_errors = permanent_transcript_errors()
+    # At least one attempt, so a transcript or an error always comes back
+    max_retries = max(1, max_retries)
+    for attempt in range(1, max_retries + 1):
+        try:
+            # Fetch transcript and convert to raw dictionary
+            with backend_slot("youtube"):
+                fetched = YouTubeTranscriptApi().fetch(video_id)
+            raw = fetched.to_raw_data()
+            break
+        except permanent_errors as e:
+            logger.error(f"Error transcribing video: {str(e)}")
+            raise
+        except Exception as e:
+            if attempt == max_retries:
+                logger.error(f"Error transcribing video after {attempt} attempts: {str(e)}")
+                raise
+            logger.warning(f"Transcript fetch for {video_id} failed (attempt {attempt}): {e}")
+            time.sleep(random.uniform(0, TRANSCRIPT_BACKOFF_BASE * (2 ** (attempt - 1))))
+
     logger.info("Youtube Video Transcribed!")
 
     return raw
 
-def save_transcript(raw: list[dict], video_id: str) -> None:
+def save_transcript(raw: list[dict], video_id: str) -> str:
     """
-    Save a YouTube transcript to a text file.
+    Save a YouTube transcript in the compact transcript format.
 
-    Each transcript entry is expected to be a dictionary with a 'text' key.
-    The transcript will be written line by line into a file located in the
-    `transcripts/` directory, named after the given video ID.
+    Each transcript entry is expected to be a dictionary with 'text',
+    'start' and 'duration' keys. The text and timing are written to a
+    `.tsc` file in the `transcripts/` directory, named after the given
+    video ID (see `core.transcript_store`).
 
     Args:
         raw (list[dict]): A list of transcript entries, each containing a 'text' field.
         video_id (str): The YouTube video ID used to name the output file.
 
     Returns:
-        None
+        str: The transcript text, one line per entry.
     """
 
-    filepath = TRANSCRIPTS_DIR / f"{video_id}.txt"
+    filepath = transcript_path(video_id)
 
-    # # Create directory if it doesn't exists
-    # if not filepath.exists():
-    #     filepath.mkdir(parents=True, exist_ok=True)
-    #     logger.info(f"Created directory", filepath)
-
-    # Write to text file
     try:
-        with open(filepath, "w", encoding="utf-8") as file:
-            for entry in raw:
-                file.write(entry['text'] + "\n")
-
-            logger.info(f"Transcript saved to {filepath}")
+        text = write_transcript(raw, filepath)
+        logger.info(f"Transcript saved to {filepath}")
     except Exception as e:
         logger.error(f"Error saving Youtube transcript to {filepath}: {e}")
         raise ValueError(str(e))
 
-def save_metadata(url: str, video_id: str) -> None:
+    # A plain-text copy from before the compact format is now stale
+    (TRANSCRIPTS_DIR / f"{video_id}{LEGACY_SUFFIX}").unlink(missing_ok=True)
+    return text
+
+def _project_metadata(info: dict, fields: tuple = METADATA_FIELDS) -> dict:
+    """Keep only the metadata fields the pipeline uses."""
+    record = {field: info.get(field) for field in fields}
+    # Some extractors only fill 'uploader'
+    if not record.get("channel"):
+        record["channel"] = info.get("uploader")
+    return record
+
+def _remember_metadata(video_id: str, record: dict) -> None:
+    with _metadata_cache_lock:
+        _metadata_cache[video_id] = record
+        _metadata_cache.move_to_end(video_id)
+        while len(_metadata_cache) > METADATA_MEMORY_CACHE_SIZE:
+            _metadata_cache.popitem(last=False)
+
+def _write_metadata(video_id: str, record: dict) -> Path:
+    metadata_filepath = METADATA_DIR / f"{video_id}.json"
+    with open(metadata_filepath, 'w', encoding="utf-8") as file:
+        json.dump(record, file)
+    logger.info(f"Saved metadata to {metadata_filepath}")
+    return metadata_filepath
+
+def fetch_video_metadata(url: str, fields: tuple = METADATA_FIELDS) -> dict:
     """
-    Extract and save metadata for a YouTube video.
+    Ask yt-dlp for a video's metadata without resolving formats.
 
-    Uses yt-dlp to fetch metadata (without downloading the video)
-    and saves it as a JSON file in the `metadata/` directory, named
-    after the given video ID.
+    `process=False` skips format selection, and the extractor arguments
+    skip the DASH/HLS manifests, translated subtitles and player JS that
+    are only needed for downloading.
 
     Args:
         url (str): The full YouTube video URL.
-        video_id (str): The YouTube video ID used to name the output file.
+        fields (tuple): Metadata fields to keep.
 
     Returns:
-        None
+        dict: Compact record with just `fields`.
     """
+    import yt_dlp
+
     ydl_opts = {
         'quiet': True,
-        'skip_download': True
+        'skip_download': True,
+        'noplaylist': True,
+        'extractor_args': METADATA_EXTRACTOR_ARGS,
     }
 
     with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-        info = ydl.extract_info(url, download=False)
+        info = ydl.extract_info(url, download=False, process=False)
+
+    return _project_metadata(info, fields)
+
+def _iter_flat_entries(ydl: "yt_dlp.YoutubeDL", url: str, depth: int = 0) -> Iterator[str]:
+    info = ydl.extract_info(url, download=False, process=False)
+    # Without processing, 'entries' is a lazy generator that fetches one
+    # page of the playlist at a time
+    for entry in info.get("entries") or []:
+        if not entry:
+            continue
+        if entry.get("ie_key") == "YoutubeTab" or entry.get("_type") == "playlist":
+            # A channel's tabs (videos, shorts, live) are nested playlists
+            if depth < 2 and entry.get("url"):
+                yield from _iter_flat_entries(ydl, entry["url"], depth + 1)
+        elif entry.get("id"):
+            yield entry["id"]
+
+def iter_collection_videos(collection: str) -> Iterator[str]:
+    """
+    Yield the videos of a YouTube playlist or channel as they are listed,
+    without resolving each video, so callers can start on the first videos
+    before the whole collection has been enumerated.
 
-    metadata_filepath = METADATA_DIR / f"{video_id}.json"
+    Args:
+        collection (str): A playlist URL, bare playlist ID (e.g. 'PL...') or
+                          channel URL (/@handle, /channel/<id>, /c/, /user/,
+                          optionally with a /videos, /shorts or /streams tab).
 
-    with open(metadata_filepath, 'w') as file:
-        json.dump(info, file)
-        logger.info(f"Saved metadata to {metadata_filepath}")
+    Yields:
+        str: Watch URLs, in collection order.
+    """
+    import yt_dlp
 
-def get_yt_video_title_author(video_id: str) -> str:
-    metadata_filepath = METADATA_DIR / f"{video_id}.json"
+    url = collection if collection.startswith(("http://", "https://")) else f"https://www.youtube.com/playlist?list={collection}"
+    ydl_opts = {
+        'quiet': True,
+        'skip_download': True,
+        'extract_flat': 'in_playlist',
+        'lazy_playlist': True,
+    }
 
-    with open(metadata_filepath, 'r') as file:
-        metadata_file = json.load(file)
+    count = 0
+    with yt_dlp.YoutubeDL(ydl_opts) as ydl:
+        for video_id in _iter_flat_entries(ydl, url):
+            count += 1
+            yield f"https://www.youtube.com/watch?v={video_id}"
+    logger.info(f"Expanded {collection} to {count} videos")
+
+def get_video_metadata(url: Optional[str], video_id: str, refresh: bool = False) -> dict:
+    """
+    Return the compact metadata record for a video, from the in-process
+    cache, then the on-disk record, then yt-dlp.
 
-        video_title = metadata_file['title']
-        video_author = metadata_file['channel']
+    Args:
+        url (str, optional): Video URL, needed only when fetching.
+        video_id (str): The YouTube video ID.
+        refresh (bool): Ignore both caches and fetch again.
+
+    Returns:
+        dict: Compact metadata record (see `METADATA_FIELDS`).
+    """
+    if not refresh:
+        with _metadata_cache_lock:
+            record = _metadata_cache.get(video_id)
+        if record is not None:
+            return record
+
+        metadata_filepath = METADATA_DIR / f"{video_id}.json"
+        if metadata_filepath.exists():
+            with open(metadata_filepath, 'r', encoding="utf-8") as file:
+                stored = json.load(file)
+            record = _project_metadata(stored)
+            if len(stored) > len(record):
+                # Older runs stored the full info dict; shrink it in place
+                _write_metadata(video_id, record)
+            _remember_metadata(video_id, record)
+            return record
+
+    if not url:
+        raise ValueError(f"No cached metadata for {video_id} and no URL to fetch it")
+
+    record = fetch_video_metadata(url)
+    _write_metadata(video_id, record)
+    _remember_metadata(video_id, record)
+    return record
+
+def save_metadata(url: str, video_id: str) -> dict:
+    """
+    Extract and save metadata for a YouTube video.
+
+    Fetches a compact metadata record with yt-dlp (see
+    `fetch_video_metadata`) and saves it as a JSON file in the
+    `metadata/` directory, named after the given video ID. The record is
+    also kept in memory so later lookups don't re-read the file.
+
+    Args:
+        url (str): The full YouTube video URL.
+        video_id (str): The YouTube video ID used to name the output file.
+
+    Returns:
+        dict: The saved metadata record.
+    """
+    return get_video_metadata(url, video_id, refresh=True)
 
-        return video_title, video_author
+def get_yt_video_title_author(video_id: str) -> tuple[str, str]:
+    record = get_video_metadata(None, video_id)
+    return record['title'], record['channel']
 
 if __name__ == "__main__":
     video_id = "2_udhlFNNBk"
@@ -0,0 +1,278 @@
+"""
+Compact on-disk transcripts that keep caption timing.
+
+A `.tsc` file holds a transcript's segments as columns: start and duration
+in milliseconds, byte and character offsets into one UTF-8 text blob (all
+uint32, so 16 bytes of index per segment), and the blob itself. Each
+segment's text is followed by a newline, so the blob decodes to the same
+text the old `.txt` files held.
+
+`TranscriptReader` memory-maps the file, so opening a transcript reads only
+the small header and slices by time or character range touch just the
+segments involved. The blob can optionally be zlib-compressed in
+independent blocks; slices then decompress only the blocks they overlap.
+
+Usage:
+    python -m core.transcript_store VIDEO_ID [--start 60 --end 120]
+"""
+# Base libraries
+import argparse
+import mmap
+import os
+import struct
+import sys
+import threading
+import zlib
+from functools import lru_cache
+from pathlib import Path
+from typing import Iterator, Optional, Union
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+
+# Local modules
+from utils.logger import get_logger, setup_logging
+from config.paths import TRANSCRIPTS_DIR
+from config.variable import TRANSCRIPT_COMPRESS, TRANSCRIPT_BLOCK_SIZE
+
+logger = get_logger(__name__)
+
+TRANSCRIPT_SUFFIX = ".tsc"
+LEGACY_SUFFIX = ".txt"
+
+_MAGIC = b"LPTS"
+_VERSION = 1
+_FLAG_COMPRESSED = 1
+# magic, version, flags, segments, blocks, text bytes, text characters
+_HEADER = struct.Struct("<4sHHIIQQ")
+
+def transcript_path(video_id: str, transcripts_dir: Path = TRANSCRIPTS_DIR) -> Path:
+    return Path(transcripts_dir) / f"{video_id}{TRANSCRIPT_SUFFIX}"
+
+def write_transcript(
+        raw: list[dict],
+        path: Union[str, Path],
+        compress: bool = TRANSCRIPT_COMPRESS,
+        block_size: int = TRANSCRIPT_BLOCK_SIZE
+    ) -> str:
+    """
+    Write transcript segments to a `.tsc` file (atomically).
+
+    Args:
+        raw (list[dict]): Segments with 'text', 'start' and 'duration'
+                          (seconds), as from `FetchedTranscript.to_raw_data()`.
+        path (str | Path): Destination file.
+        compress (bool): zlib-compress the text blob in blocks.
+        block_size (int): Uncompressed bytes per compressed block.
+
+    Returns:
+        str: The transcript text (one line per segment), so callers don't
+             need to read the file back.
+    """
+    import numpy as np
+
+    texts = [f"{entry['text']}\n" for entry in raw]
+    text = "".join(texts)
+    encoded = [t.encode("utf-8") for t in texts]
+    blob = b"".join(encoded)
+
+    n = len(raw)
+    starts = np.array([round(float(e.get("start", 0)) * 1000) for e in raw], dtype=np.uint32)
+    durations = np.array([round(float(e.get("duration", 0)) * 1000) for e in raw], dtype=np.uint32)
+    byte_offsets = np.zeros(n + 1, dtype=np.uint32)
+    char_offsets = np.zeros(n + 1, dtype=np.uint32)
+    np.cumsum([len(b) for b in encoded], out=byte_offsets[1:])
+    np.cumsum([len(t) for t in texts], out=char_offsets[1:])
+
+    flags, block_table, stored = 0, b"", blob
+    n_blocks = 0
+    if compress and blob:
+        flags |= _FLAG_COMPRESSED
+        raw_starts = list(range(0, len(blob), block_size)) + [len(blob)]
+        blocks = [zlib.compress(blob[a:b], 6) for a, b in zip(raw_starts, raw_starts[1:])]
+        packed_starts = np.zeros(len(blocks) + 1, dtype=np.uint32)
+        np.cumsum([len(b) for b in blocks], out=packed_starts[1:])
+        n_blocks = len(blocks)
+        block_table = np.array(raw_starts, dtype=np.uint32).tobytes() + packed_starts.tobytes()
+        stored = b"".join(blocks)
+
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_suffix(f".{os.getpid()}.{threading.get_ident()}.tmp")
+    try:
+        with open(tmp_path, "wb") as file:
+            file.write(_HEADER.pack(_MAGIC, _VERSION, flags, n, n_blocks, len(blob), len(text)))
+            for array in (starts, durations, byte_offsets, char_offsets):
+                file.write(array.tobytes())
+            file.write(block_table)
+            file.write(stored)
+        os.replace(tmp_path, path)
+    finally:
+        tmp_path.unlink(missing_ok=True)
+    return text
+
+class TranscriptReader:
+    """
+    Memory-mapped read access to a `.tsc` transcript.
+
+    Segment columns are numpy views over the mapping, so nothing is copied
+    until text is requested. Use as a context manager, or call `close()`.
+
+    Args:
+        path (str | Path): The `.tsc` file.
+    """
+
+    def __init__(self, path: Union[str, Path]):
+        # Imported here so modules that only need paths (search, pipeline) stay cheap to import
+        import numpy as np
+
+        self.path = Path(path)
+        with open(self.path, "rb") as file:
+            self._mm = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            magic, version, flags, n, n_blocks, text_bytes, text_chars = _HEADER.unpack_from(self._mm, 0)
+            if magic != _MAGIC or version != _VERSION:
+                raise ValueError(f"{self.path} is not a version {_VERSION} transcript file")
+        except (struct.error, ValueError):
+            self._mm.close()
+            raise
+
+        self.compressed = bool(flags & _FLAG_COMPRESSED)
+        self.text_bytes = text_bytes
+        self.text_chars = text_chars
+
+        offset = _HEADER.size
+        self.starts_ms = np.frombuffer(self._mm, np.uint32, n, offset)
+        offset += 4 * n
+        self.durations_ms = np.frombuffer(self._mm, np.uint32, n, offset)
+        offset += 4 * n
+        self._byte_offsets = np.frombuffer(self._mm, np.uint32, n + 1, offset)
+        offset += 4 * (n + 1)
+        self._char_offsets = np.frombuffer(self._mm, np.uint32, n + 1, offset)
+        offset += 4 * (n + 1)
+        if self.compressed:
+            self._block_raw = np.frombuffer(self._mm, np.uint32, n_blocks + 1, offset)
+            offset += 4 * (n_blocks + 1)
+            self._block_packed = np.frombuffer(self._mm, np.uint32, n_blocks + 1, offset)
+            offset += 4 * (n_blocks + 1)
+            self._block = lru_cache(maxsize=8)(self._decompress_block)
+        self._blob_offset = offset
+
+    def __enter__(self) -> "TranscriptReader":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    def close(self) -> None:
+        # numpy views must be released before the mapping can close
+        self.starts_ms = self.durations_ms = self._byte_offsets = self._char_offsets = None
+        if self.compressed:
+            self._block_raw = self._block_packed = None
+            self._block.cache_clear()
+        self._mm.close()
+
+    def __len__(self) -> int:
+        return len(self.starts_ms)
+
+    @property
+    def duration(self) -> float:
+        """Seconds from the start to the end of the last segment."""
+        if not len(self):
+            return 0.0
+        return float(self.starts_ms[-1] + self.durations_ms[-1]) / 1000
+
+    def _decompress_block(self, index: int) -> bytes:
+        a = self._blob_offset + int(self._block_packed[index])
+        b = self._blob_offset + int(self._block_packed[index + 1])
+        return zlib.decompress(self._mm[a:b])
+
+    def _read_bytes(self, start: int, end: int) -> bytes:
+        """Bytes [start, end) of the uncompressed text blob."""
+        if end <= start:
+            return b""
+        if not self.compressed:
+            return self._mm[self._blob_offset + start:self._blob_offset + end]
+
+        first = int(self._block_raw.searchsorted(start, side="right")) - 1
+        last = int(self._block_raw.searchsorted(end, side="left"))
+        data = b"".join(self._block(i) for i in range(first, last))
+        base = int(self._block_raw[first])
+        return data[start - base:end - base]
+
+    def _segments_text(self, first: int, last: int) -> str:
+        """Text of segments [first, last), newline-terminated."""
+        return self._read_bytes(int(self._byte_offsets[first]), int(self._byte_offsets[last])).decode("utf-8")
+
+    def read_text(self) -> str:
+        """The whole transcript, one line per segment."""
+        return self._segments_text(0, len(self))
+
+    def segment(self, index: int) -> dict:
+        """One segment as {'text', 'start', 'duration'} (seconds)."""
+        return {
+            "text": self._segments_text(index, index + 1)[:-1],
+            "start": float(self.starts_ms[index]) / 1000,
+            "duration": float(self.durations_ms[index]) / 1000,
+        }
+
+    def iter_segments(self, first: int = 0, last: Optional[int] = None) -> Iterator[dict]:
+        """Segments [first, last) in order, decoded one at a time."""
+        for index in range(first, len(self) if last is None else last):
+            yield self.segment(index)
+
+    def segment_range(self, start: float, end: float) -> tuple[int, int]:
+        """Indices [first, last) of the segments overlapping [start, end) seconds."""
+        ends_ms = self.starts_ms.astype("int64") + self.durations_ms
+        first = int(ends_ms.searchsorted(start * 1000, side="right"))
+        last = int(self.starts_ms.searchsorted(end * 1000, side="left"))
+        return first, max(first, last)
+
+    def text_between(self, start: float, end: float) -> str:
+        """Text of the segments spoken between `start` and `end` seconds."""
+        return self._segments_text(*self.segment_range(start, end))
+
+    def text_slice(self, start: int, end: int) -> str:
+        """Characters [start, end) of the transcript text, decoding only the segments involved."""
+        start, end = max(0, start), min(end, self.text_chars)
+        if end <= start:
+            return ""
+        first = int(self._char_offsets.searchsorted(start, side="right")) - 1
+        last = int(self._char_offsets.searchsorted(end, side="left"))
+        base = int(self._char_offsets[first])
+        return self._segments_text(first, last)[start - base:end - base]
+
+    def time_at(self, char_offset: int) -> float:
+        """Start time (seconds) of the segment containing a character offset, e.g. for citations."""
+        if not len(self):
+            return 0.0
+        index = int(self._char_offsets.searchsorted(char_offset, side="right")) - 1
+        return float(self.starts_ms[min(max(index, 0), len(self) - 1)]) / 1000
+
+def read_transcript_text(video_id: str, transcripts_dir: Path = TRANSCRIPTS_DIR) -> str:
+    """
+    The text of a stored transcript, from its `.tsc` file or, for
+    transcripts saved before the compact format, the legacy `.txt` file.
+    """
+    path = transcript_path(video_id, transcripts_dir)
+    if path.exists():
+        with TranscriptReader(path) as reader:
+            return reader.read_text()
+    return (Path(transcripts_dir) / f"{video_id}{LEGACY_SUFFIX}").read_text(encoding="utf-8")
+
+def main(argv: Optional[list] = None) -> int:
+    parser = argparse.ArgumentParser(description="Print a stored transcript, or a time range of it.")
+    parser.add_argument("video_id")
+    parser.add_argument("--start", type=float, help="Seconds")
+    parser.add_argument("--end", type=float, help="Seconds")
+    parser.add_argument("--timestamps", action="store_true", help="Prefix each line with its start time")
+    args = parser.parse_args(argv)
+    setup_logging()
+
+    with TranscriptReader(transcript_path(args.video_id)) as reader:
+        first, last = reader.segment_range(args.start or 0, args.end if args.end is not None else reader.duration + 1)
+        for segment in reader.iter_segments(first, last):
+            prefix = f"[{segment['start']:8.2f}] " if args.timestamps else ""
+            print(f"{prefix}{segment['text']}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,298 @@
+"""
+Command-line entry point for running the pipeline without a browser.
+
+Usage:
+    python -m learning_pipeline run URL [URL ...] [options]
+    python -m learning_pipeline run PLAYLIST_ID notes.txt --manifest sources.jsonl
+    python -m learning_pipeline run --manifest nightly.jsonl --checkpoint nightly.ckpt --workers 8 --no-anki
+
+Sources can be video URLs or IDs, playlist URLs or IDs, channel URLs, text
+files, or a JSONL manifest (see `core.sources.load_manifest`). Playlists and
+channels are expanded as they are listed and their transcripts fetched ahead
+of the pipeline workers, so the first videos are processed while the rest
+are still being enumerated.
+
+Progress and throughput go to stderr; the run summary is printed to stdout
+as JSON. The exit code is 0 when every source succeeded, 1 otherwise.
+
+With `--checkpoint`, each finished source is appended to the checkpoint
+file, and sources already recorded there are skipped on the next run, so an
+interrupted nightly job resumes where it stopped.
+
+With `--openai-batch`, all quizzes are generated up front in one OpenAI
+Batch API job (cheaper, and off the interactive rate limits, but it can take
+hours), then the PDF and Anki stages run as usual.
+"""
+# Base libraries
+import argparse
+import json
+import re
+import sys
+import threading
+import time
+from pathlib import Path
+from typing import Iterable, Iterator, Optional, TextIO, Union
+
+# Local modules
+from utils.logger import get_logger, setup_logging
+from config.variable import OPENAI_API_KEY, BATCH_MAX_WORKERS, TRANSCRIPT_PREFETCH_WORKERS
+from core.sources import normalize_source, load_manifest, expand_sources, is_collection
+from core.stage_manifest import STAGES
+from core.setup import create_directories
+
+logger = get_logger(__name__)
+
+_VIDEO_ID = re.compile(r"^[\w-]{11}$")
+
+def expand_inputs(values: list[str], manifest: Optional[str] = None) -> Iterator[Union[str, dict]]:
+    """
+    Turn command-line sources into batch entries: bare video IDs become URLs,
+    files become text sources, and playlists and channels are expanded to
+    their videos lazily (see `core.sources.expand_sources`).
+
+    Raises:
+        ValueError: For an argument that is none of the accepted forms
+                    (checked up front, before anything is expanded).
+    """
+    entries: list[Union[str, dict]] = []
+    for value in values:
+        if is_collection(value) or value.startswith(("http://", "https://")):
+            entries.append(value)
+        elif Path(value).is_file():
+            entries.append({"text_file": value})
+        elif _VIDEO_ID.match(value):
+            entries.append(f"https://www.youtube.com/watch?v={value}")
+        else:
+            raise ValueError(f"Not a URL, playlist, video ID or file: {value}")
+    if manifest:
+        entries.extend(load_manifest(manifest))
+    return expand_sources(entries)
+
+def source_key(entry: Union[str, dict]) -> Optional[str]:
+    """
+    Stable key of a source for the checkpoint file, or None for an entry
+    that cannot be read (it is left to fail, and be reported, in the batch).
+    """
+    try:
+        source = normalize_source(entry)
+    except (ValueError, TypeError, OSError):
+        return None
+    return source["source_id"] or source["youtube_url"]
+
+def load_checkpoint(path: Union[str, Path]) -> set[str]:
+    """Keys of the sources recorded as finished in a checkpoint file."""
+    path = Path(path)
+    if not path.exists():
+        return set()
+    done = set()
+    with open(path, "r", encoding="utf-8") as file:
+        for line in file:
+            try:
+                done.add(json.loads(line)["key"])
+            except (ValueError, KeyError):
+                # A line cut short by an interrupted run
+                continue
+    return done
+
+class ProgressReporter:
+    """
+    Prints finished/failed counts, throughput and an ETA as sources finish.
+    On a terminal the line is redrawn in place; otherwise (cron, CI) one line
+    is written per finished source.
+
+    The total grows as sources are listed (`count`); until `listed` is
+    called it is shown as a lower bound and no ETA is given.
+    """
+
+    def __init__(self, stream: TextIO = sys.stderr, enabled: bool = True):
+        self.total = 0
+        self.complete = False
+        self.stream = stream
+        self.enabled = enabled
+        self.interactive = stream.isatty()
+        self.done = 0
+        self.failed = 0
+        self.questions = 0
+        self.started = time.perf_counter()
+        self._lock = threading.Lock()
+
+    def count(self, entries: Iterable) -> Iterator:
+        """Pass entries through, counting them towards the total."""
+        for entry in entries:
+            with self._lock:
+                self.total += 1
+            yield entry
+        with self._lock:
+            self.complete = True
+
+    def update(self, outcome: dict) -> None:
+        with self._lock:
+            self.done += 1
+            if "error" in outcome:
+                self.failed += 1
+            else:
+                self.questions += len(outcome["quiz_data"])
+            if not self.enabled:
+                return
+
+            elapsed = time.perf_counter() - self.started
+            rate = self.done / elapsed if elapsed else 0.0
+            if self.complete:
+                total = str(self.total)
+                eta = f"ETA {(self.total - self.done) / rate if rate else 0.0:.0f}s"
+            else:
+                total, eta = f"{self.total}+", "listing sources"
+            label = outcome.get("source_id") or outcome.get("source")
+            line = (
+                f"[{self.done}/{total}] {self.failed} failed · {rate * 60:.1f} sources/min · "
+                f"{self.questions / elapsed if elapsed else 0.0:.1f} questions/s · {eta} · {label}"
+            )
+            if self.interactive:
+                self.stream.write(f"\r\033[K{line}")
+                if self.complete and self.done == self.total:
+                    self.stream.write("\n")
+            else:
+                self.stream.write(f"{line}\n")
+            self.stream.flush()
+
+def run_command(args: argparse.Namespace, entries: Iterable[Union[str, dict]]) -> int:
+    """Run the batch over `entries` (from `expand_inputs`) and print the JSON summary."""
+    from core.batch import run_batch_pipeline, prefetch_transcripts, generate_quizzes_with_batch_api
+
+    create_directories()
+    force, from_stage = args.force, args.from_stage
+
+    skipped = []
+    keys = {}
+    checkpoint_file = None
+    if args.checkpoint:
+        done = load_checkpoint(args.checkpoint)
+        checkpoint_file = open(args.checkpoint, "a", encoding="utf-8")
+
+        def unfinished(entries):
+            for entry in entries:
+                key = source_key(entry)
+                if key is not None and key in done:
+                    skipped.append(key)
+                    continue
+                yield entry
+
+        entries = unfinished(entries)
+
+    openai_batch = None
+    if args.openai_batch:
+        entries = list(entries)
+        openai_batch = generate_quizzes_with_batch_api(
+            OPENAI_API_KEY, entries, question_count=args.question_count, use_cache=not args.no_cache,
+            force=force, from_stage=from_stage, prefetch_workers=args.prefetch_workers,
+        )
+        # Transcripts and quizzes are current now; only the later stages are still forced.
+        # Quizzes of a batch that didn't finish are still generated (one at a time) below.
+        if force or (from_stage and STAGES.index(from_stage) <= STAGES.index("quiz")):
+            force, from_stage = False, "quiz" if openai_batch["deferred"] else "pdf"
+    elif not force and from_stage != "transcript":
+        # Forced transcript runs would fetch every transcript twice
+        entries = prefetch_transcripts(entries, max_workers=args.prefetch_workers)
+
+    progress = ProgressReporter(enabled=not args.quiet)
+
+    def numbered(entries):
+        # Batch indexes follow the order entries reach the batch
+        for index, entry in enumerate(entries):
+            keys[index] = source_key(entry) if checkpoint_file else None
+            yield entry
+
+    def on_complete(outcome: dict) -> None:
+        progress.update(outcome)
+        if checkpoint_file and "error" not in outcome:
+            record = {"key": keys[outcome["index"]], "source_id": outcome["source_id"]}
+            checkpoint_file.write(json.dumps(record) + "\n")
+            checkpoint_file.flush()
+
+    try:
+        summary = run_batch_pipeline(
+            api_key=OPENAI_API_KEY,
+            sources=numbered(progress.count(entries)),
+            question_count=args.question_count,
+            max_workers=args.workers,
+            use_cache=not args.no_cache,
+            force=force,
+            from_stage=from_stage,
+            make_pdf=not args.no_pdf,
+            make_anki=not args.no_anki,
+            on_complete=on_complete,
+        )
+    finally:
+        if checkpoint_file:
+            checkpoint_file.close()
+    if skipped:
+        logger.info(f"Skipped {len(skipped)} sources already finished in {args.checkpoint}")
+
+    elapsed = summary["elapsed_seconds"]
+    report = {
+        "total": progress.total + len(skipped),
+        "succeeded": len(summary["results"]),
+        "failed": len(summary["failures"]),
+        "skipped": len(skipped),
+        "questions": progress.questions,
+        "elapsed_seconds": elapsed,
+        "sources_per_minute": round(progress.total / elapsed * 60, 2) if elapsed else None,
+        **({"openai_batch": openai_batch} if openai_batch is not None else {}),
+        "results": [
+            {"source_id": r["source_id"], "questions": len(r["quiz_data"]),
+             "stages_run": r["stages_run"], "elapsed_seconds": r["elapsed_seconds"]}
+            for r in summary["results"]
+        ],
+        "failures": [{"source": f["source"], "error": f["error"]} for f in summary["failures"]],
+    }
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        Path(args.output).write_text(output, encoding="utf-8")
+    print(output)
+    return 1 if summary["failures"] else 0
+
+def main(argv: Optional[list] = None) -> int:
+    parser = argparse.ArgumentParser(prog="learning_pipeline", description="Learning pipeline command line.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    run_parser = subparsers.add_parser("run", help="Run the pipeline over many sources")
+    run_parser.add_argument(
+        "sources", nargs="*", help="Video URLs or IDs, playlist URLs or IDs, channel URLs, or text files"
+    )
+    run_parser.add_argument("--manifest", help="JSONL manifest with one source per line")
+    run_parser.add_argument("--question-count", type=int, default=20)
+    run_parser.add_argument("--workers", type=int, default=BATCH_MAX_WORKERS)
+    run_parser.add_argument("--no-pdf", action="store_true", help="Skip PDF export")
+    run_parser.add_argument("--no-anki", action="store_true", help="Skip pushing to Anki")
+    run_parser.add_argument(
+        "--prefetch-workers", type=int, default=TRANSCRIPT_PREFETCH_WORKERS,
+        help="Transcripts fetched ahead of the pipeline workers (0 disables prefetching)"
+    )
+    run_parser.add_argument("--checkpoint", help="Record finished sources here and skip them on the next run")
+    run_parser.add_argument("--output", help="Also write the JSON summary to this file")
+    run_parser.add_argument("--quiet", action="store_true", help="No progress output")
+    run_parser.add_argument("--no-cache", action="store_true", help="Bypass the OpenAI response cache")
+    run_parser.add_argument("--force", action="store_true", help="Re-run every stage")
+    run_parser.add_argument("--from-stage", choices=STAGES, help="Re-run this stage and all later ones")
+    run_parser.add_argument(
+        "--openai-batch", action="store_true",
+        help="Generate all quizzes in one OpenAI Batch API job first (cheaper, but may take hours)"
+    )
+
+    args = parser.parse_args(argv)
+    setup_logging()
+    if args.command == "run":
+        if not args.sources and not args.manifest:
+            parser.error("Provide at least one source or a --manifest")
+        # Only bad arguments are usage errors; failures during the run are
+        # reported in the summary (exit code 1) or raised
+        try:
+            entries = expand_inputs(args.sources, args.manifest)
+        except (ValueError, OSError) as e:
+            parser.error(str(e))
+        return run_command(args, entries)
+    return 2
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,7 +1,8 @@
 import os
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, Callable
 
-from core.pipeline import run_learning_pipeline
+from core.jobs import get_job_runner
+from core.sources import make_text_source_id
 from config.variable import OPENAI_API_KEY
 from utils.logger import get_logger
 
@@ -11,13 +12,20 @@ def run_app_pipeline(
     youtube_url: Optional[str] = None,
     transcript_text: Optional[str] = None,
     question_count: int = 20,
-    input_type: str = "youtube"
+    input_type: str = "youtube",
+    on_question: Optional[Callable[[dict], None]] = None
 ) -> Dict[str, Any]:
     """
     Wrapper that loads environment variables, runs pipeline,
     and returns generated artifacts for Streamlit display.
+
+    When `on_question` is given the completion is streamed and the callback
+    receives each question as soon as it is parsed.
     """
 
+    # Imported here so the app page loads without the pipeline's backends
+    from core.pipeline import run_learning_pipeline
+
     logger.info("Running app pipeline...")
 
     result = run_learning_pipeline(
@@ -25,8 +33,33 @@ def run_app_pipeline(
         youtube_url=youtube_url,
         transcript_text=transcript_text,
         question_count=question_count,
-        input_type=input_type
+        input_type=input_type,
+        on_question=on_question
     )
 
     logger.info("Pipeline finished, returning results.")
-    return result
\ No newline at end of file
+    return result
+
+def submit_app_pipeline(
+    youtube_url: Optional[str] = None,
+    transcript_text: Optional[str] = None,
+    question_count: int = 20,
+    input_type: str = "youtube"
+) -> str:
+    """
+    Queue a pipeline run on the background job runner and return its job id
+    without waiting. Poll it with `core.jobs.get_job`.
+    """
+    params = {
+        "input_type": input_type,
+        "youtube_url": youtube_url,
+        "transcript_text": transcript_text,
+        "question_count": question_count,
+    }
+    if input_type == "text":
+        # Identical text maps to the same source, so its artifacts are reused
+        params["source_id"] = make_text_source_id(transcript_text)
+
+    job_id = get_job_runner().submit(**params)
+    logger.info(f"Queued app pipeline job {job_id}")
+    return job_id
@@ -0,0 +1,140 @@
+"""
+Minimal in-memory stand-in for the AnkiConnect add-on, for local testing
+and benchmarks without Anki Desktop.
+
+Run it directly (`python -m utils.fake_anki_connect --port 8765`) and point
+ANKI_CONNECT_URL at it, or start it in-process with `start_fake_anki_connect`.
+"""
+# Base libraries
+import argparse
+import itertools
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Optional
+
+
+class FakeAnkiState:
+    """Decks and notes held by the fake server, plus a per-action call count."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.decks = {"Default"}
+        self.notes: dict[int, dict] = {}
+        self.calls: dict[str, int] = {}
+        self._ids = itertools.count(1_000_000_000_000)
+
+    def _is_duplicate(self, note: dict) -> bool:
+        front = note["fields"].get("Front")
+        return any(
+            n["deckName"] == note["deckName"] and n["fields"].get("Front") == front
+            for n in self.notes.values()
+        )
+
+    def _check(self, note: dict) -> Optional[str]:
+        """Why the note can't be added (AnkiConnect's wording), or None."""
+        if note.get("deckName") not in self.decks:
+            return "deck was not found"
+        if not str(note.get("fields", {}).get("Front", "")).strip():
+            return "cannot create note because it is empty"
+        if not note.get("options", {}).get("allowDuplicate") and self._is_duplicate(note):
+            return "cannot create note because it is a duplicate"
+        return None
+
+    def _can_add(self, note: dict) -> bool:
+        return self._check(note) is None
+
+    def _add(self, note: dict) -> Optional[int]:
+        if not self._can_add(note):
+            return None
+        note_id = next(self._ids)
+        self.notes[note_id] = note
+        return note_id
+
+    def handle(self, action: str, params: dict):
+        with self.lock:
+            self.calls[action] = self.calls.get(action, 0) + 1
+
+            if action == "version":
+                return 6
+            if action == "deckNames":
+                return sorted(self.decks)
+            if action == "createDeck":
+                self.decks.add(params["deck"])
+                return len(self.decks)
+            if action == "canAddNotes":
+                return [self._can_add(note) for note in params["notes"]]
+            if action == "canAddNotesWithErrorDetail":
+                return [
+                    {"canAdd": False, "error": error} if error else {"canAdd": True}
+                    for error in map(self._check, params["notes"])
+                ]
+            if action == "addNote":
+                note_id = self._add(params["note"])
+                if note_id is None:
+                    raise ValueError("cannot create note because it is a duplicate")
+                return note_id
+            if action == "addNotes":
+                return [self._add(note) for note in params["notes"]]
+            if action == "findNotes":
+                return sorted(self.notes)
+
+        if action == "multi":
+            results = []
+            for sub in params["actions"]:
+                try:
+                    results.append({"result": self.handle(sub["action"], sub.get("params", {})), "error": None})
+                except Exception as e:
+                    results.append({"result": None, "error": str(e)})
+            return results
+
+        raise ValueError("unsupported action")
+
+
+def _make_handler(state: FakeAnkiState):
+    class Handler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            length = int(self.headers.get("Content-Length", 0))
+            request = json.loads(self.rfile.read(length) or b"{}")
+            try:
+                body = {"result": state.handle(request.get("action"), request.get("params", {})), "error": None}
+            except Exception as e:
+                body = {"result": None, "error": str(e)}
+
+            payload = json.dumps(body).encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def log_message(self, format, *args):
+            pass
+
+    return Handler
+
+
+def start_fake_anki_connect(host: str = "127.0.0.1", port: int = 0):
+    """
+    Start the fake server on a background thread.
+
+    Returns:
+        tuple: (server, url, state). Call `server.shutdown()` to stop it.
+    """
+    state = FakeAnkiState()
+    server = ThreadingHTTPServer((host, port), _make_handler(state))
+    thread = threading.Thread(target=server.serve_forever, name="fake-anki-connect", daemon=True)
+    thread.start()
+    url = f"http://{host}:{server.server_address[1]}"
+    return server, url, state
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run a fake AnkiConnect server.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    args = parser.parse_args()
+
+    server = ThreadingHTTPServer((args.host, args.port), _make_handler(FakeAnkiState()))
+    print(f"Fake AnkiConnect listening on http://{args.host}:{args.port}")
+    server.serve_forever()
@@ -0,0 +1,378 @@
+"""
+Minimal stand-in for the OpenAI chat completions endpoint, for offline
+benchmarks and local testing.
+
+Completions are synthesized deterministically from the prompt: the number
+of questions is read from the quiz prompt and each answer has the same
+shape (fenced JSON array, `usage` block) as a recorded gpt-4o response, or
+is a bare `{"items": [...]}` object when a `json_schema` response_format
+is requested. Both plain and streamed (`stream=True`) requests are
+supported. With `malformed_every=N`, every Nth item is sent without its
+answer, to exercise item-level repairs.
+
+The Files and Batch APIs are emulated too (upload, create, retrieve,
+cancel, download output and error files), enough for `core.openai_batch`.
+A batch completes `batch_latency` seconds after it is created, on the next
+retrieve; requests whose custom_id is in `state.failing_custom_ids` come
+back in the error file.
+
+Run it directly (`python -m utils.fake_openai --port 8700`) and set
+OPENAI_BASE_URL=http://127.0.0.1:8700/v1, or start it in-process with
+`start_fake_openai`.
+"""
+# Base libraries
+import argparse
+import hashlib
+import json
+import re
+import threading
+import time
+import uuid
+from email.parser import BytesParser
+from email.policy import HTTP
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+QUESTION_COUNT = re.compile(r"Generate (\d+) well-written")
+WORD = re.compile(r"[A-Za-z]{5,}")
+AVOIDED_QUESTION = re.compile(r"^ {8}- ", re.MULTILINE)
+
+
+class FakeOpenAIState:
+    """Request counters and the simulated per-request latency."""
+
+    def __init__(
+            self,
+            latency: float = 0.0,
+            chars_per_chunk: int = 64,
+            batch_latency: float = 0.0,
+            malformed_every: int = 0
+        ):
+        self.latency = latency
+        self.chars_per_chunk = chars_per_chunk
+        self.batch_latency = batch_latency
+        self.malformed_every = malformed_every
+        # Re-entrant: advancing a batch stores files and counts requests under it
+        self.lock = threading.RLock()
+        self.calls: dict[str, int] = {}
+        # Files API and Batch API objects by id; file contents are kept separately
+        self.files: dict[str, dict] = {}
+        self.file_contents: dict[str, bytes] = {}
+        self.batches: dict[str, dict] = {}
+        self.batch_started: dict[str, float] = {}
+        self.failing_custom_ids: set = set()
+
+    def count(self, endpoint: str) -> None:
+        with self.lock:
+            self.calls[endpoint] = self.calls.get(endpoint, 0) + 1
+
+
+def synthesize_quiz(prompt: str) -> list[dict]:
+    """Build a deterministic quiz for a prompt, using words from its transcript."""
+    match = QUESTION_COUNT.search(prompt)
+    count = int(match.group(1)) if match else 5
+    transcript = prompt.split("Transcript:", 1)[-1]
+    words = WORD.findall(transcript) or ["topic"]
+    seed = hashlib.sha1(prompt.encode("utf-8")).hexdigest()[:6]
+    # Follow-up prompts list the questions already written; continue after them
+    written = len(AVOIDED_QUESTION.findall(prompt.split("Transcript:", 1)[0]))
+
+    quiz = []
+    for i in range(written, written + count):
+        first = words[(i * 7) % len(words)]
+        second = words[(i * 13 + 3) % len(words)]
+        quiz.append({
+            "question": f"How does {first} relate to {second} in example {seed}-{i + 1}?",
+            "answer": f"{first.capitalize()} shapes {second} through the mechanism described in the transcript.",
+            "explanation": f"The transcript connects {first} and {second} when discussing point {i + 1}.",
+        })
+    return quiz
+
+
+def build_completion(body: dict, malformed_every: int = 0) -> dict:
+    """Build a full chat.completion object for a request body."""
+    prompt = body["messages"][-1]["content"]
+    quiz = synthesize_quiz(prompt)
+    if malformed_every > 0:
+        for item in quiz[malformed_every - 1::malformed_every]:
+            del item["answer"]
+    if (body.get("response_format") or {}).get("type") == "json_schema":
+        content = json.dumps({"items": quiz})
+    else:
+        content = "```json\n" + json.dumps(quiz, indent=2) + "\n```"
+    prompt_tokens = sum(len(m["content"]) for m in body["messages"]) // 4
+    completion_tokens = len(content) // 4
+    return {
+        "id": "chatcmpl-fake-" + hashlib.sha1(prompt.encode("utf-8")).hexdigest()[:12],
+        "object": "chat.completion",
+        "created": int(time.time()),
+        "model": body.get("model", "gpt-4o"),
+        "choices": [{
+            "index": 0,
+            "message": {"role": "assistant", "content": content, "refusal": None},
+            "logprobs": None,
+            "finish_reason": "stop",
+        }],
+        "usage": {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "total_tokens": prompt_tokens + completion_tokens,
+        },
+    }
+
+
+def _new_id(prefix: str) -> str:
+    return f"{prefix}{uuid.uuid4().hex[:24]}"
+
+def _store_file(state: FakeOpenAIState, content: bytes, filename: str, purpose: str) -> dict:
+    file_object = {
+        "id": _new_id("file-"),
+        "object": "file",
+        "bytes": len(content),
+        "created_at": int(time.time()),
+        "filename": filename,
+        "purpose": purpose,
+        "status": "processed",
+    }
+    with state.lock:
+        state.files[file_object["id"]] = file_object
+        state.file_contents[file_object["id"]] = content
+    return file_object
+
+def _run_batch(state: FakeOpenAIState, batch: dict) -> None:
+    """Answer every request of a batch and attach its output and error files."""
+    lines = state.file_contents[batch["input_file_id"]].decode("utf-8").splitlines()
+    outputs, errors = [], []
+    for line in filter(str.strip, lines):
+        request = json.loads(line)
+        if request["custom_id"] in state.failing_custom_ids:
+            errors.append({
+                "id": _new_id("batch_req_"), "custom_id": request["custom_id"], "response": None,
+                "error": {"code": "server_error", "message": "Simulated batch request failure"},
+            })
+            continue
+        outputs.append({
+            "id": _new_id("batch_req_"), "custom_id": request["custom_id"], "error": None,
+            "response": {"status_code": 200, "request_id": _new_id("req_"), "body": build_completion(request["body"], state.malformed_every)},
+        })
+        state.count("batch.requests")
+
+    def jsonl(records: list[dict]) -> bytes:
+        return "".join(json.dumps(record) + "\n" for record in records).encode("utf-8")
+
+    now = int(time.time())
+    batch.update({
+        "status": "completed",
+        "in_progress_at": batch["in_progress_at"] or now,
+        "finalizing_at": now,
+        "completed_at": now,
+        "output_file_id": _store_file(state, jsonl(outputs), f"{batch['id']}_output.jsonl", "batch_output")["id"] if outputs else None,
+        "error_file_id": _store_file(state, jsonl(errors), f"{batch['id']}_error.jsonl", "batch_output")["id"] if errors else None,
+        "request_counts": {"total": len(outputs) + len(errors), "completed": len(outputs), "failed": len(errors)},
+    })
+
+def _advance_batch(state: FakeOpenAIState, batch: dict) -> dict:
+    """Move a batch along: in progress once created, completed after `batch_latency`."""
+    if batch["status"] in ("validating", "in_progress"):
+        if time.monotonic() - state.batch_started[batch["id"]] >= state.batch_latency:
+            _run_batch(state, batch)
+        elif batch["status"] == "validating":
+            batch.update({"status": "in_progress", "in_progress_at": int(time.time())})
+    return batch
+
+def _make_handler(state: FakeOpenAIState):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def _send_json(self, status: int, body: dict) -> None:
+            payload = json.dumps(body).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def _read_json(self) -> dict:
+            length = int(self.headers.get("Content-Length", 0))
+            return json.loads(self.rfile.read(length) or b"{}")
+
+        def _stream(self, completion: dict) -> None:
+            self.send_response(200)
+            self.send_header("Content-Type", "text/event-stream")
+            self.send_header("Transfer-Encoding", "chunked")
+            self.end_headers()
+
+            def send_event(data: str) -> None:
+                event = f"data: {data}\n\n".encode("utf-8")
+                self.wfile.write(f"{len(event):X}\r\n".encode() + event + b"\r\n")
+                self.wfile.flush()
+
+            content = completion["choices"][0]["message"]["content"]
+            base = {k: completion[k] for k in ("id", "created", "model")}
+            step = max(1, state.chars_per_chunk)
+            for start in range(0, len(content), step):
+                send_event(json.dumps({
+                    **base, "object": "chat.completion.chunk",
+                    "choices": [{"index": 0, "delta": {"content": content[start:start + step]}, "finish_reason": None}],
+                }))
+            send_event(json.dumps({
+                **base, "object": "chat.completion.chunk",
+                "choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}],
+            }))
+            send_event(json.dumps({
+                **base, "object": "chat.completion.chunk", "choices": [], "usage": completion["usage"],
+            }))
+            send_event("[DONE]")
+            self.wfile.write(b"0\r\n\r\n")
+
+        def _send_error(self, status: int, message: str) -> None:
+            self._send_json(status, {"error": {"message": message, "type": "invalid_request_error"}})
+
+        def _upload_file(self) -> None:
+            length = int(self.headers.get("Content-Length", 0))
+            raw = f"Content-Type: {self.headers['Content-Type']}\r\n\r\n".encode() + self.rfile.read(length)
+            form = {}
+            for part in BytesParser(policy=HTTP).parsebytes(raw).iter_parts():
+                name = part.get_param("name", header="content-disposition")
+                form[name] = (part.get_filename(), part.get_payload(decode=True))
+            if "file" not in form:
+                self._send_error(400, "Missing file")
+                return
+            filename, content = form["file"]
+            purpose = form.get("purpose", (None, b"batch"))[1].decode("utf-8")
+            state.count("files.create")
+            self._send_json(200, _store_file(state, content, filename or "upload.jsonl", purpose))
+
+        def _create_batch(self, body: dict) -> None:
+            if body.get("input_file_id") not in state.files:
+                self._send_error(400, f"No such file: {body.get('input_file_id')}")
+                return
+            state.count("batches.create")
+            created = int(time.time())
+            batch = {
+                "id": _new_id("batch_"),
+                "object": "batch",
+                "endpoint": body.get("endpoint", "/v1/chat/completions"),
+                "errors": None,
+                "input_file_id": body["input_file_id"],
+                "completion_window": body.get("completion_window", "24h"),
+                "status": "validating",
+                "output_file_id": None,
+                "error_file_id": None,
+                "created_at": created,
+                "in_progress_at": None,
+                "expires_at": created + 24 * 3600,
+                "finalizing_at": None,
+                "completed_at": None,
+                "failed_at": None,
+                "expired_at": None,
+                "cancelling_at": None,
+                "cancelled_at": None,
+                "request_counts": {"total": 0, "completed": 0, "failed": 0},
+                "metadata": body.get("metadata"),
+            }
+            with state.lock:
+                state.batches[batch["id"]] = batch
+                state.batch_started[batch["id"]] = time.monotonic()
+            self._send_json(200, batch)
+
+        def do_GET(self):
+            parts = self.path.split("?", 1)[0].rstrip("/").split("/")
+            if len(parts) >= 2 and parts[-2] == "batches":
+                batch = state.batches.get(parts[-1])
+                if batch is None:
+                    self._send_error(404, f"No such batch: {parts[-1]}")
+                    return
+                state.count("batches.retrieve")
+                with state.lock:
+                    batch = dict(_advance_batch(state, batch))
+                self._send_json(200, batch)
+                return
+            if len(parts) >= 3 and parts[-3] == "files" and parts[-1] == "content":
+                content = state.file_contents.get(parts[-2])
+                if content is None:
+                    self._send_error(404, f"No such file: {parts[-2]}")
+                    return
+                state.count("files.content")
+                self.send_response(200)
+                self.send_header("Content-Type", "application/octet-stream")
+                self.send_header("Content-Length", str(len(content)))
+                self.end_headers()
+                self.wfile.write(content)
+                return
+            if len(parts) >= 2 and parts[-2] == "files" and parts[-1] in state.files:
+                self._send_json(200, state.files[parts[-1]])
+                return
+            self._send_error(404, f"Unknown endpoint {self.path}")
+
+        def do_POST(self):
+            path = self.path.split("?", 1)[0].rstrip("/")
+            if path.endswith("/files"):
+                self._upload_file()
+                return
+            body = self._read_json()
+            if path.endswith("/batches"):
+                self._create_batch(body)
+                return
+            if path.endswith("/cancel") and "/batches/" in path:
+                batch = state.batches.get(path.split("/")[-2])
+                if batch is None:
+                    self._send_error(404, f"No such batch: {path.split('/')[-2]}")
+                    return
+                with state.lock:
+                    if batch["status"] not in ("completed", "failed", "expired", "cancelled"):
+                        batch.update({"status": "cancelled", "cancelled_at": int(time.time())})
+                    batch = dict(batch)
+                self._send_json(200, batch)
+                return
+            if path.endswith("/chat/completions"):
+                state.count("chat.completions")
+                if state.latency:
+                    time.sleep(state.latency)
+                completion = build_completion(body, state.malformed_every)
+                if body.get("stream"):
+                    self._stream(completion)
+                else:
+                    self._send_json(200, completion)
+                return
+            self._send_error(404, f"Unknown endpoint {self.path}")
+
+        def log_message(self, format, *args):
+            pass
+
+    return Handler
+
+
+def start_fake_openai(
+        host: str = "127.0.0.1",
+        port: int = 0,
+        latency: float = 0.0,
+        batch_latency: float = 0.0,
+        malformed_every: int = 0
+    ):
+    """
+    Start the fake server on a background thread.
+
+    Returns:
+        tuple: (server, base_url, state). `base_url` ends in '/v1' and can be
+               used as OPENAI_BASE_URL. Call `server.shutdown()` to stop it.
+    """
+    state = FakeOpenAIState(latency=latency, batch_latency=batch_latency, malformed_every=malformed_every)
+    server = ThreadingHTTPServer((host, port), _make_handler(state))
+    thread = threading.Thread(target=server.serve_forever, name="fake-openai", daemon=True)
+    thread.start()
+    return server, f"http://{host}:{server.server_address[1]}/v1", state
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run a fake OpenAI chat completions and batch server.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8700)
+    parser.add_argument("--latency", type=float, default=0.0, help="Seconds to wait before each completion")
+    parser.add_argument("--batch-latency", type=float, default=0.0, help="Seconds before a batch completes")
+    parser.add_argument("--malformed-every", type=int, default=0, help="Drop the answer of every Nth quiz item")
+    args = parser.parse_args()
+
+    state = FakeOpenAIState(args.latency, batch_latency=args.batch_latency, malformed_every=args.malformed_every)
+    server = ThreadingHTTPServer((args.host, args.port), _make_handler(state))
+    print(f"Fake OpenAI listening on http://{args.host}:{args.port}/v1")
+    server.serve_forever()
@@ -0,0 +1,40 @@
+"""
+Exclusive locks on a file, shared by every process on the machine.
+
+Used for on-disk state that the app, the API and command-line runs all
+update (e.g. the dedup index), where a threading lock only covers one
+process.
+"""
+# Base libraries
+import os
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Union
+
+@contextmanager
+def file_lock(path: Union[str, Path]):
+    """
+    Hold an exclusive lock on `path` (created if missing) for the block,
+    waiting for other processes that hold it.
+    """
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, "a+b") as file:
+        if os.name == "nt":
+            import msvcrt
+
+            file.seek(0)
+            msvcrt.locking(file.fileno(), msvcrt.LK_LOCK, 1)
+            try:
+                yield
+            finally:
+                file.seek(0)
+                msvcrt.locking(file.fileno(), msvcrt.LK_UNLCK, 1)
+        else:
+            import fcntl
+
+            fcntl.flock(file.fileno(), fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(file.fileno(), fcntl.LOCK_UN)
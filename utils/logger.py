@@ -1,17 +1,167 @@
+"""
+Process-wide logging setup.
+
+Records are handed to a `QueueHandler` on the calling thread and written by
+a single `QueueListener` thread, so pipeline workers never wait on the log
+file's lock or disk I/O. Lines are JSON objects (one per line) tagged with
+the current context, e.g. the run, source and job ids (see `log_context`),
+and the file is rotated by size.
+
+Per-item debug lines in hot loops should be guarded with `sampled`, so only
+a fraction of them (LOG_SAMPLE_RATE) is formatted and written.
+
+Modules only get their logger at import; the entry points (the CLIs, the
+API and the app) call `setup_logging`, so importing a module never creates
+the logs directory or starts the listener thread.
+"""
+# Base libraries
+import atexit
+import contextvars
+import json
 import logging
+import queue
+import random
+import threading
+from contextlib import contextmanager
 from datetime import datetime
-from pathlib import Path
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+from typing import Optional
 
-def get_logger(name: str="learning_pipeline") -> logging.Logger:
-    log_dir = Path(__file__).resolve().parents[1] / "logs"
-    log_dir.mkdir(parents=True, exist_ok=True)
-    log_file = log_dir / f"pipeline_{datetime.now():%Y%m%d}.log"
-
-    logging.basicConfig(
-        filename=log_file,
-        level=logging.INFO,
-        format="%(asctime)s [%(levelname)s] %(name)s: %(message)s",
-        filemode="a",
+# Local modules
+from config.paths import LOGS_DIR
+from config.variable import LOG_LEVEL, LOG_FORMAT, LOG_MAX_BYTES, LOG_BACKUP_COUNT, LOG_SAMPLE_RATE
+
+LOG_PATH = LOGS_DIR / "pipeline.log"
+TEXT_FORMAT = "%(asctime)s [%(levelname)s] %(name)s: %(message)s"
+
+_configured = False
+_configure_lock = threading.Lock()
+_listener: Optional[QueueListener] = None
+
+# Fields added to every record logged in the current context
+_log_context: contextvars.ContextVar = contextvars.ContextVar("log_context", default=None)
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per record, with the context fields at the top level."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": datetime.fromtimestamp(record.created).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+            "thread": record.threadName,
+            **getattr(record, "context", {}),
+        }
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            entry["exc"] = record.exc_text
+        if record.stack_info:
+            entry["stack"] = record.stack_info
+        return json.dumps(entry, default=str, ensure_ascii=False)
+
+class TextFormatter(logging.Formatter):
+    """The plain format, with context fields appended as key=value pairs."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        line = super().format(record)
+        context = getattr(record, "context", None)
+        if context:
+            line += " " + " ".join(f"{key}={value}" for key, value in context.items())
+        return line
+
+class ContextQueueHandler(QueueHandler):
+    """
+    Queue handler that tags records with the log context of the calling
+    thread, leaving all formatting and I/O to the listener thread.
+
+    Records are queued as they are (the queue never leaves the process), so
+    the caller pays neither a copy nor a traceback format. Messages with
+    %-style arguments are rendered first, as the arguments may change once
+    the caller moves on.
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        if record.args:
+            record.msg = record.getMessage()
+            record.args = None
+        context = _log_context.get()
+        record.context = dict(context) if context else {}
+        return record
+
+def _file_handler() -> logging.Handler:
+    LOGS_DIR.mkdir(parents=True, exist_ok=True)
+    handler = RotatingFileHandler(
+        LOG_PATH, maxBytes=LOG_MAX_BYTES, backupCount=LOG_BACKUP_COUNT, encoding="utf-8"
     )
+    handler.setFormatter(JsonFormatter() if LOG_FORMAT == "json" else TextFormatter(TEXT_FORMAT))
+    return handler
+
+def setup_logging() -> None:
+    """
+    Route log records through a queue to the rotating log file.
+
+    Runs once per process, from the entry points, so every module shares
+    the same listener. Until it runs, records go to Python's default
+    handling (warnings and above on stderr). The queue is flushed when the
+    process exits.
+    """
+    global _configured, _listener
+    if _configured:
+        return
+    with _configure_lock:
+        if _configured:
+            return
+        log_queue: "queue.SimpleQueue" = queue.SimpleQueue()
+        _listener = QueueListener(log_queue, _file_handler(), respect_handler_level=True)
+        _listener.start()
+        atexit.register(shutdown_logging)
+
+        root = logging.getLogger()
+        root.setLevel(LOG_LEVEL)
+        root.addHandler(ContextQueueHandler(log_queue))
+        _configured = True
+
+def shutdown_logging() -> None:
+    """Write out queued records and stop the listener thread."""
+    global _listener
+    listener, _listener = _listener, None
+    if listener is not None:
+        listener.stop()
+
+def get_logger(name: str="learning_pipeline") -> logging.Logger:
+    """The named logger; records reach the log file once `setup_logging` has run."""
+    return logging.getLogger(name)
+
+@contextmanager
+def log_context(**fields):
+    """
+    Tag every record logged inside the block (and in threads started with
+    `utils.metrics.run_in_context`) with `fields`, e.g. run_id=...
+    """
+    current = _log_context.get()
+    token = _log_context.set({**(current or {}), **fields})
+    try:
+        yield
+    finally:
+        _log_context.reset(token)
+
+def bind_log_context(**fields) -> None:
+    """
+    Add fields to the innermost `log_context`, e.g. the source id once a
+    run has worked it out. Does nothing outside a `log_context` block.
+    """
+    current = _log_context.get()
+    if current is not None:
+        current.update(fields)
 
-    return logging.getLogger(name)
\ No newline at end of file
+def sampled(logger: logging.Logger, level: int = logging.DEBUG) -> bool:
+    """
+    Whether to emit a per-item line: True for about LOG_SAMPLE_RATE of the
+    calls when `logger` is enabled for `level`. Check it before building the
+    message, e.g. `if sampled(logger): logger.debug(f"...")`.
+    """
+    if LOG_SAMPLE_RATE <= 0 or not logger.isEnabledFor(level):
+        return False
+    return LOG_SAMPLE_RATE >= 1 or random.random() < LOG_SAMPLE_RATE
@@ -0,0 +1,301 @@
+# Base libraries
+import contextvars
+import json
+import os
+import sys
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+from typing import Callable, Optional
+
+# Local modules
+from config.paths import LOGS_DIR
+from config.variable import OPENAI_PRICING
+from utils.logger import get_logger, log_context
+
+logger = get_logger(__name__)
+
+METRICS_PREFIX = "learning_pipeline"
+PROMETHEUS_PATH = LOGS_DIR / "metrics.prom"
+
+_current_run: contextvars.ContextVar = contextvars.ContextVar("metrics_run", default=None)
+_current_span: contextvars.ContextVar = contextvars.ContextVar("metrics_span", default=None)
+_span_listener: contextvars.ContextVar = contextvars.ContextVar("metrics_span_listener", default=None)
+
+# Process-wide totals for the Prometheus export: {(metric, stage): value}
+_totals: dict = {}
+_totals_lock = threading.Lock()
+_write_lock = threading.Lock()
+
+# Span counters that are summed into the Prometheus totals
+COUNTER_FIELDS = (
+    "bytes_in", "bytes_out", "prompt_tokens", "completion_tokens",
+    "cost_usd", "retries", "cache_hits", "cache_misses", "items",
+    "rejected_items", "repaired_items", "transcript_tokens_before", "transcript_tokens_after",
+)
+
+
+class Span:
+    """Timing and counters for one stage of a run."""
+
+    def __init__(self, name: str, attrs: dict):
+        self.name = name
+        self.attrs = dict(attrs)
+        self.counters: dict = {}
+        self.status = "ok"
+        self.started_at = time.time()
+        self.duration = 0.0
+        self._lock = threading.Lock()
+
+    def set(self, **attrs) -> None:
+        """Attach descriptive attributes (e.g. skipped=True)."""
+        self.attrs.update(attrs)
+
+    def add(self, counter: str, amount: float = 1) -> None:
+        """Add to a numeric counter such as bytes_out or retries."""
+        with self._lock:
+            self.counters[counter] = self.counters.get(counter, 0) + amount
+
+    def to_dict(self) -> dict:
+        return {
+            "span": self.name,
+            "status": self.status,
+            "duration_seconds": round(self.duration, 4),
+            **self.attrs,
+            **{k: round(v, 6) if isinstance(v, float) else v for k, v in self.counters.items()},
+        }
+
+
+class RunMetrics:
+    """All spans recorded during one pipeline run."""
+
+    def __init__(self, run_id: str, attrs: dict):
+        self.run_id = run_id
+        self.attrs = dict(attrs)
+        self.spans: list[Span] = []
+        self.started_at = time.time()
+        self.duration = 0.0
+        self._lock = threading.Lock()
+
+    def add_span(self, span: Span) -> None:
+        with self._lock:
+            self.spans.append(span)
+
+    def summary(self) -> dict:
+        """Per-stage durations and counters plus run totals."""
+        with self._lock:
+            spans = list(self.spans)
+
+        totals: dict = {}
+        stages: dict = {}
+        for span in spans:
+            stage = stages.setdefault(span.name, {"duration_seconds": 0.0, "status": span.status})
+            stage["duration_seconds"] = round(stage["duration_seconds"] + span.duration, 4)
+            if span.status != "ok":
+                stage["status"] = span.status
+            if span.attrs.get("skipped"):
+                stage["skipped"] = True
+            for counter, value in span.counters.items():
+                stage[counter] = stage.get(counter, 0) + value
+                totals[counter] = totals.get(counter, 0) + value
+
+        if "cost_usd" in totals:
+            totals["cost_usd"] = round(totals["cost_usd"], 6)
+        return {
+            "run_id": self.run_id,
+            **self.attrs,
+            "duration_seconds": round(self.duration or time.time() - self.started_at, 4),
+            "stages": stages,
+            "totals": totals,
+        }
+
+
+def _metrics_log_path() -> Path:
+    return LOGS_DIR / f"metrics_{datetime.now():%Y%m%d}.jsonl"
+
+def _write_jsonl(records: list[dict]) -> None:
+    path = _metrics_log_path()
+    path.parent.mkdir(parents=True, exist_ok=True)
+    lines = "".join(json.dumps(record, default=str) + "\n" for record in records)
+    with _write_lock, open(path, "a", encoding="utf-8") as file:
+        file.write(lines)
+
+def _accumulate(span: Span) -> None:
+    with _totals_lock:
+        for metric, value in (
+            ("stage_duration_seconds_sum", span.duration),
+            ("stage_duration_seconds_count", 1),
+            (f"stage_{span.status}_total", 1),
+        ):
+            key = (metric, span.name)
+            _totals[key] = _totals.get(key, 0) + value
+        for counter in COUNTER_FIELDS:
+            if counter in span.counters:
+                key = (f"{counter}_total", span.name)
+                _totals[key] = _totals.get(key, 0) + span.counters[counter]
+
+@contextmanager
+def start_run(run_id: Optional[str] = None, **attrs):
+    """
+    Collect spans for one pipeline run.
+
+    On exit the run summary is appended to the metrics JSONL file and the
+    Prometheus text file is refreshed.
+
+    Yields:
+        RunMetrics: The run. Set `run.attrs["source_id"]` once it is known
+                    so later spans are tagged with it.
+    """
+    run = RunMetrics(run_id or uuid.uuid4().hex[:12], attrs)
+    token = _current_run.set(run)
+    try:
+        with log_context(run_id=run.run_id):
+            yield run
+    except Exception as e:
+        run.attrs["error"] = type(e).__name__
+        raise
+    finally:
+        run.duration = time.time() - run.started_at
+        _current_run.reset(token)
+        try:
+            _write_jsonl([{"type": "run", "timestamp": datetime.now().isoformat(), **run.summary()}])
+            write_prometheus()
+        except OSError as e:
+            logger.warning(f"Could not write metrics: {e}")
+
+@contextmanager
+def span(name: str, **attrs):
+    """
+    Time a block as a named stage span, attached to the current run.
+
+    Yields:
+        Span: Use `.add(counter, n)` and `.set(**attrs)` inside the block.
+    """
+    current = Span(name, attrs)
+    run = _current_run.get()
+    if run is not None:
+        current.attrs.setdefault("run_id", run.run_id)
+        if run.attrs.get("source_id"):
+            current.attrs.setdefault("source_id", run.attrs["source_id"])
+
+    listener = _span_listener.get()
+    _notify(listener, "start", current)
+
+    token = _current_span.set(current)
+    started = time.perf_counter()
+    try:
+        yield current
+    except Exception as e:
+        current.status = "error"
+        current.attrs["error"] = type(e).__name__
+        raise
+    finally:
+        current.duration = time.perf_counter() - started
+        _current_span.reset(token)
+        _notify(listener, "end", current)
+        if run is not None:
+            run.add_span(current)
+        _accumulate(current)
+        try:
+            _write_jsonl([{"type": "span", "timestamp": datetime.now().isoformat(), **current.to_dict()}])
+        except OSError as e:
+            logger.warning(f"Could not write span metrics: {e}")
+
+def _notify(listener: Optional[Callable], event: str, current: Span) -> None:
+    if listener is None:
+        return
+    try:
+        listener(event, current)
+    except Exception as e:
+        logger.warning(f"Span listener failed on {event} of {current.name}: {e}")
+
+@contextmanager
+def observe_spans(listener: Callable[[str, Span], None]):
+    """
+    Call `listener(event, span)` with event 'start' and 'end' for every span
+    opened in this context, including in tasks started with `run_in_context`.
+    Used to report per-stage progress of a run while it is in flight.
+    """
+    token = _span_listener.set(listener)
+    try:
+        yield
+    finally:
+        _span_listener.reset(token)
+
+def current_run() -> Optional[RunMetrics]:
+    return _current_run.get()
+
+def add_to_span(counter: str, amount: float = 1) -> None:
+    """Add to a counter on the innermost active span, if there is one."""
+    current = _current_span.get()
+    if current is not None:
+        current.add(counter, amount)
+
+def record_openai_usage(usage: Optional[dict], model: str, price_factor: float = 1.0) -> None:
+    """
+    Record prompt/completion tokens and their estimated cost on the current
+    span, from the `usage` field of an OpenAI response.
+
+    Args:
+        price_factor (float): Multiplier on list prices, e.g. the Batch API discount.
+    """
+    if not usage:
+        return
+    prompt_tokens = usage.get("prompt_tokens") or 0
+    completion_tokens = usage.get("completion_tokens") or 0
+    add_to_span("prompt_tokens", prompt_tokens)
+    add_to_span("completion_tokens", completion_tokens)
+
+    pricing = OPENAI_PRICING.get(model)
+    if pricing:
+        cost = (prompt_tokens * pricing["input"] + completion_tokens * pricing["output"]) / 1_000_000 * price_factor
+        add_to_span("cost_usd", cost)
+
+def render_prometheus() -> str:
+    """Render the process-wide totals in the Prometheus text format."""
+    with _totals_lock:
+        items = sorted(_totals.items())
+
+    lines = []
+    declared = set()
+    for (metric, stage), value in items:
+        name = f"{METRICS_PREFIX}_{metric}"
+        if metric.startswith("stage_duration_seconds_"):
+            family, kind = f"{METRICS_PREFIX}_stage_duration_seconds", "summary"
+        else:
+            family, kind = name, "counter"
+        if family not in declared:
+            declared.add(family)
+            lines.append(f"# TYPE {family} {kind}")
+        lines.append(f'{name}{{stage="{stage}"}} {value}')
+    return "\n".join(lines) + "\n"
+
+def write_prometheus(path: Path = PROMETHEUS_PATH) -> Path:
+    """Atomically write the Prometheus text file (for a textfile collector)."""
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_suffix(f".{os.getpid()}.{threading.get_ident()}.tmp")
+    with _write_lock:
+        tmp_path.write_text(render_prometheus(), encoding="utf-8")
+        os.replace(tmp_path, path)
+    return path
+
+def peak_rss_mb(children: bool = False) -> Optional[float]:
+    """
+    Peak resident memory of this process, or of its finished child
+    processes, in MB. None where `resource` is unavailable (Windows).
+    """
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_CHILDREN if children else resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes
+    return round(peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024, 1)
+
+def run_in_context(executor, fn, *args, **kwargs):
+    """Submit to an executor so the task records spans into the caller's run."""
+    return executor.submit(contextvars.copy_context().run, fn, *args, **kwargs)